@@ -2,17 +2,26 @@
 Defines all the slash commands that the bot makes available to users.
 '''
 
-import os
 import asyncio
 import random
-from typing import List, Dict
+import time
+from typing import List, Dict, Tuple, Callable, Awaitable, Optional
 
-from interactions import Extension, Message, GuildVoice, Member
+from interactions import Extension, GuildVoice, Member
 from interactions import SlashContext, slash_command, OptionType, slash_option
-from interactions import check, is_owner, DMChannel
-from interactions.client.errors import HTTPException
+from interactions import check, is_owner, Embed, AutocompleteContext, Permissions
+from interactions.client.const import EMBED_MAX_DESC_LENGTH
+from interactions.ext.paginators import Paginator
 # import interactions as its
 
+from src.MessageBuilder import MESSAGE_MAX_LEN, fit_lines, paginate_lines
+from src.ProgressReporter import ProgressReporter
+from src.RolePresetStore import RolePreset
+from src.RoleSetup import RoleSpec, assign_roles, format_roles, parse_roles, role_DMs
+from src.StructuredLogger import get_logger
+
+logger = get_logger('commands')
+
 
 class GNCommands(Extension):
     """
@@ -21,19 +30,39 @@ class GNCommands(Extension):
 
     @slash_command(name='help',
                    description='Provides info about the bot\'s commands')
+    @slash_option(name='command',
+                  description='Only show the help of this command',
+                  opt_type=OptionType.STRING,
+                  required=False,
+                  argument_name='command'
+                  )
     async def help(self,
-                   ctx: SlashContext):
+                   ctx: SlashContext,
+                   command: str = None):
         """
         Displays the help text 
         """
-        await ctx.respond(self.bot.helpFileContents())
+        if command is not None:
+            command_help = self.bot.help_file.command_help(command)
+            if command_help is None:
+                await ctx.respond(f"Error: There is no help for `{command}`. Use `/help` to list every command.")
+            else:
+                await self.__respondWithEmbeds(ctx, [Embed(description=page) for page in command_help])
+            return
+
+        pages = self.bot.help_file.pages
+        if len(pages) == 0:
+            await ctx.respond("No help is available.")
+            return
+        await self.__respondWithEmbeds(ctx, [Embed(title="Help", description=page) for page in pages])
 
     @slash_command(name='test')
     async def test(self, ctx: SlashContext):
         """
         Basic slash command to test that the bot is online 
         """
-        await ctx.respond('I successfully responded to your test', delete_after=self.bot.delete_after_time_secs)
+        await ctx.respond('I successfully responded to your test',
+                          delete_after=self.bot.guild_config(ctx.guild_id).delete_after_time_secs)
 
     @slash_command(
         name='sync',
@@ -60,11 +89,52 @@ class GNCommands(Extension):
         Updates the bot's event listeners, commands, and any other extensions
         '''
         if is_owner():
-            for ext_fp in os.listdir('ext'):
-                if ext_fp.endswith('.py'):
-                    ext = f'ext.{ext_fp[:-3]}'
-                    self.bot.reload_extension(ext)
-            await ctx.respond("Bot updated!", delete_after=self.bot.delete_after_time_secs)
+            # Only extensions whose source changed are reloaded
+            timings, synced = await self.bot.extension_reloader.reload_changed()
+            if len(timings) == 0:
+                response_msg = "Bot updated! No extensions changed."
+            else:
+                response_msg = "Bot updated! Reloaded:\n"
+                for ext, secs in timings:
+                    response_msg += f"- `{ext}` ({secs * 1000:.0f} ms)\n"
+                response_msg += "Slash commands were synced with Discord." if synced else "No slash commands changed."
+            await ctx.respond(response_msg, delete_after=self.bot.guild_config(ctx.guild_id).delete_after_time_secs)
+
+    @slash_command(
+        name='dm-cache-stats',
+        description='Shows hit/miss counters of the DM channel cache (Bot owner only)'
+    )
+    @check(is_owner())
+    async def dmCacheStats(self, ctx: SlashContext):
+        """
+        Shows hit/miss counters of the DM channel cache
+        """
+        stats = self.bot.dm_channel_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups if lookups else 0
+        response_msg = "DM channel cache:\n"
+        response_msg += f"- Size: {stats['size']}/{stats['max_size']}\n"
+        response_msg += f"- Hits: {stats['hits']}\n"
+        response_msg += f"- Misses: {stats['misses']}\n"
+        response_msg += f"- Evictions: {stats['evictions']}\n"
+        response_msg += f"- Hit rate: {hit_rate:.1%}"
+        await ctx.respond(response_msg, ephemeral=True)
+
+    @slash_command(
+        name='stats',
+        description='Shows latency, error and API-call metrics of every command and listener (Bot owner only)'
+    )
+    @check(is_owner())
+    async def stats(self, ctx: SlashContext):
+        """
+        Shows latency, error and API-call metrics of every command and listener
+        """
+        lines = self.bot.metrics.render_text()
+        header = "Metrics of every command and listener:" if lines else "No metrics have been recorded yet."
+        if self.bot.restart_report is not None:
+            lines.append(f"Last restart: ready after {self.bot.restart_report['restart_to_ready_secs']:.1f} s, "
+                         f"{self.bot.restart_report['dropped_commands']} commands dropped")
+        await self.__respondWithLines(ctx, header, lines, ephemeral=True)
 
     @slash_command(
         name='shutdown',
@@ -73,11 +143,13 @@ class GNCommands(Extension):
     @check(is_owner())
     async def shutdown(self, ctx: SlashContext):
         """
-        Shuts down the bot
+        Shuts down the bot once the commands that are still running finish
         """
-        await ctx.respond("Shutting down bot", delete_after=self.bot.delete_after_time_secs)
-        await asyncio.sleep(self.bot.delete_after_time_secs+1)
-        await self.bot.stop()
+        inflight = self.bot.shutdown_coordinator.inflight - 1
+        await ctx.respond(f"Shutting down bot, waiting for {inflight} running commands" if inflight > 0 else "Shutting down bot")
+        # Runs in the background, otherwise this command would be waiting on itself to drain.
+        # The response is deleted right before disconnecting instead of after a fixed delay.
+        self.bot.shutdown_task = asyncio.create_task(self.bot.graceful_shutdown(before_stop=ctx.delete))
 
     async def __memberIsInVoiceChannel(self, ctx) -> bool:
         if ctx.member.voice:
@@ -86,7 +158,89 @@ class GNCommands(Extension):
             await ctx.respond("Error: You need to be in a voice channel to use this command!")
             return False
 
-    def __getCandidatePool(self, ctx: SlashContext) -> List[Member]:
+    async def __respondWithEmbeds(self, ctx: SlashContext, embeds: List[Embed]) -> None:
+        '''
+        Responds with a single embed, or with a paginator to flip through them if there are several
+        '''
+
+        if len(embeds) == 1:
+            await ctx.respond(embed=embeds[0])
+        else:
+            paginator = Paginator.create_from_embeds(self.bot, *embeds, timeout=self.bot.guild_config(ctx.guild_id).timeout_mins * 60)
+            await paginator.send(ctx)
+
+    async def __respondWithLines(self, ctx: SlashContext, header: str, lines: List[str], ephemeral: bool = False) -> None:
+        '''
+        Responds with `header` followed by `lines`, in a single message if they fit.
+        Otherwise they are split into embed pages that the caller flips through, so only viewed pages cost an API call.
+
+        Args:
+            ctx (SlashContext): The slash context that called this function
+            header (str): The first line of the response
+            lines (List[str]): The lines to list, e.g. one per member
+            ephemeral (bool): Whether only the caller sees the response
+        '''
+
+        pages = paginate_lines(lines, MESSAGE_MAX_LEN, header)
+        if len(pages) == 1:
+            await ctx.respond(pages[0], ephemeral=ephemeral)
+            return
+
+        embeds = [Embed(description=page) for page in paginate_lines(lines, EMBED_MAX_DESC_LENGTH, header)]
+        if len(embeds) == 1:
+            await ctx.respond(embed=embeds[0], ephemeral=ephemeral)
+        else:
+            # The pages only live in memory until the paginator times out
+            paginator = Paginator.create_from_embeds(self.bot, *embeds,
+                                                     timeout=self.bot.guild_config(ctx.guild_id).timeout_mins * 60)
+            await paginator.send(ctx, ephemeral=ephemeral)
+
+    async def __runSerializedPerChannel(self,
+                                        ctx: SlashContext,
+                                        request_key: Tuple,
+                                        request: Callable[[], Awaitable[None]]) -> Optional[float]:
+        '''
+        Runs a command that reads or changes the candidate pool while holding the lock of the caller's voice channel.
+        An identical request that is already in flight for the same channel is not run a second time.
+
+        The interaction is deferred before waiting for the lock, since another command of the channel
+        (e.g. an /imposter fan-out) can hold it for longer than the 3 second interaction window.
+
+        Args:
+            ctx (SlashContext): The slash context that called this function
+            request_key (Tuple): The command name and its options
+            request (Callable[[], Awaitable[None]]): Runs the command
+
+        Returns:
+            Optional[float]: The `time.perf_counter()` at which the interaction was acknowledged,
+            or None if the command responded by itself
+        '''
+
+        # The command itself responds with the "not in a voice channel" error
+        if ctx.member.voice is None:
+            await request()
+            return None
+
+        channel_id = ctx.member.voice.channel.id
+        # Checked before anything is awaited, so the skip can still be the private first response
+        if self.bot.channel_locks.is_inflight(channel_id, request_key):
+            logger.info("Skipped an identical in-flight request", extra={"channel_id": channel_id})
+            await ctx.respond("An identical request for your voice channel was already being handled, so I skipped this one.",
+                              ephemeral=True)
+            return time.perf_counter()
+
+        acked_at = None
+
+        async def acknowledge():
+            nonlocal acked_at
+            if not ctx.deferred and not ctx.responded:
+                await ctx.defer()
+            acked_at = time.perf_counter()
+
+        await self.bot.channel_locks.run(channel_id, request_key, request, on_queued=acknowledge)
+        return acked_at
+
+    async def __getCandidatePool(self, ctx: SlashContext) -> Tuple[Member, ...]:
         '''
         Generates the candidate pool of the user's voice channel
 
@@ -94,36 +248,27 @@ class GNCommands(Extension):
             ctx (SlashContext): The slash context that called this function
 
         Returns:
-            List[Member]: The candidate pool
+            Tuple[Member, ...]: A snapshot of the candidate pool
         '''
 
         if ctx.member.voice is not None:
 
-            # Detect who is in the voice channel of the caller
+            # The index already excludes anyone in the removed_candidates_pool
             voice_channel: GuildVoice = ctx.member.voice.channel
-            voice_members: List[Member] = voice_channel.voice_members
-
-            # Generate candidate pool
-            # Remove any candidates that are in the removed_candidates_pool
-            candidate_pool: List[Member] = []
-            if (voice_channel.id in self.bot.removed_candidates):
-                for member in voice_members:
-                    if (member.id not in self.bot.removed_candidates[voice_channel.id]):
-                        candidate_pool.append(member)
-            else:
-                candidate_pool = voice_members
-
-            return candidate_pool
+            await self.bot.fetch_uncached_voice_members(voice_channel)
+            return self.bot.candidate_index.snapshot(voice_channel)
 
         else:
-            return []
+            return ()
 
     async def __randomlySelectPeopleBaseImplementation(
         self,
         ctx: SlashContext,
         # role_name: str = "Superstar",
         n: int = 1,
-        remove_from_candidate_pool: bool = False
+        remove_from_candidate_pool: bool = False,
+        candidate_pool: Tuple[Member, ...] = None,
+        fair: bool = False
     ) -> List[Member]:
         '''
         Randomly selects `n` people, assigns them a role name `role_name` (textually, not a Discord role).
@@ -135,12 +280,15 @@ class GNCommands(Extension):
             role_name (str): The name of the role.
             n (int): The number of people to assign the role to.
             remove_from_candidate_pool (bool): If true, removes members with the role from the candidate pool for future selections.
+            candidate_pool (Tuple[Member, ...]): A snapshot of the candidate pool the caller already took. Defaults to a fresh snapshot.
+            fair (bool): If true, people who were selected recently in this voice channel are less likely to be selected.
         '''
 
         # Enforce that user is in a voice channel
         if await self.__memberIsInVoiceChannel(ctx):
 
-            candidate_pool = self.__getCandidatePool(ctx)
+            if candidate_pool is None:
+                candidate_pool = await self.__getCandidatePool(ctx)
 
             # Respond with an error message if n is greater than the number of people in the voice call
             if len(candidate_pool) < n:
@@ -153,7 +301,15 @@ class GNCommands(Extension):
                 return []
             # Select N candidates and assign roleName to them
             else:
-                selected_members = random.sample(candidate_pool, n)
+                voice_channel: GuildVoice = ctx.member.voice.channel
+                if fair:
+                    selected_members = self.bot.selection_history.weighted_sample(voice_channel.id, candidate_pool, n)
+                else:
+                    selected_members = random.sample(candidate_pool, n)
+                self.bot.selection_history.record_selected(voice_channel.id, [member.id for member in selected_members])
+                logger.info("Members selected", extra={"channel_id": ctx.member.voice.channel.id,
+                                                       "pool_size": len(candidate_pool),
+                                                       "selected_ids": [member.id for member in selected_members]})
 
                 # Remove the selected members from the future candidate pool if requested
                 if remove_from_candidate_pool:
@@ -168,7 +324,8 @@ class GNCommands(Extension):
                                                            ctx: SlashContext,
                                                            role_name: str = "Superstar",
                                                            n: int = 1,
-                                                           remove_from_candidate_pool: bool = False) -> None:
+                                                           remove_from_candidate_pool: bool = False,
+                                                           fair: bool = False) -> None:
         '''
         Randomly selects `n` people, assigns them a role name `role_name` (textually, not a Discord role), 
         and posts their roles publicly in a text channel reply.
@@ -180,6 +337,7 @@ class GNCommands(Extension):
             role_name (str): The name of the role.
             n (int): The number of people to assign the role to.
             remove_from_candidate_pool (bool): If true, removes members with the role from the candidate pool for future selections.
+            fair (bool): If true, people who were selected recently are less likely to be selected.
         '''
 
         # Extract selected members
@@ -187,7 +345,8 @@ class GNCommands(Extension):
             ctx=ctx,
             # role_name=role_name,
             n=n,
-            remove_from_candidate_pool=remove_from_candidate_pool
+            remove_from_candidate_pool=remove_from_candidate_pool,
+            fair=fair
         )
 
         # Only reply if there are selected_members. BaseImplementation handles error cases
@@ -199,10 +358,9 @@ class GNCommands(Extension):
             else:
                 vowel = 'n' if (role_name[0].lower() in [
                                 'a', 'e', 'i', 'o', 'u']) else ''
-                response_text = f"Congrats! The following people have been selected to be a{vowel} {role_name}:\n"
-                for selected in selected_members:
-                    response_text += f"- {selected.mention}\n"
-                await ctx.respond(response_text)
+                await self.__respondWithLines(ctx,
+                                              f"Congrats! The following people have been selected to be a{vowel} {role_name}:",
+                                              [f"- {selected.mention}" for selected in selected_members])
 
     @slash_command(
         name='select',
@@ -228,19 +386,31 @@ class GNCommands(Extension):
                   required=False,
                   argument_name='remove_from_candidate_pool'
                   )
+    @slash_option(name='fair',
+                  description='Whether people selected recently are less likely to be selected again. Default = False',
+                  opt_type=OptionType.BOOLEAN,
+                  required=False,
+                  argument_name='fair'
+                  )
     async def select(self,
                      ctx: SlashContext,
                      role_name: str = "Superstar",
                      n: int = 1,
-                     remove_from_candidate_pool: bool = False) -> None:
+                     remove_from_candidate_pool: bool = False,
+                     fair: bool = False) -> None:
         """
         Randomly selects n people to be publicly assigned a role. 
         """
 
-        await self.__randomlySelectPeoplePubliclyImplementation(ctx=ctx,
-                                                                role_name=role_name,
-                                                                n=n,
-                                                                remove_from_candidate_pool=remove_from_candidate_pool)
+        await self.__runSerializedPerChannel(
+            ctx,
+            ('select', role_name, n, remove_from_candidate_pool, fair),
+            lambda: self.__randomlySelectPeoplePubliclyImplementation(ctx=ctx,
+                                                                      role_name=role_name,
+                                                                      n=n,
+                                                                      remove_from_candidate_pool=remove_from_candidate_pool,
+                                                                      fair=fair)
+        )
 
     async def __resetCandidatePoolImpl(self, ctx: SlashContext):
         voice_channel: GuildVoice = ctx.member.voice.channel
@@ -253,7 +423,7 @@ class GNCommands(Extension):
         """
         Resets the candidate pool for your voice channel. 
         """
-        await self.__resetCandidatePoolImpl(ctx)
+        await self.__runSerializedPerChannel(ctx, ('reset-candidate-pool',), lambda: self.__resetCandidatePoolImpl(ctx))
 
     async def __viewCandidatePool(self, ctx: SlashContext) -> None:
         '''
@@ -261,18 +431,14 @@ class GNCommands(Extension):
         '''
 
         if await self.__memberIsInVoiceChannel(ctx):
-            candidate_pool = self.__getCandidatePool(ctx)
+            candidate_pool = await self.__getCandidatePool(ctx)
             if len(candidate_pool) > 1:
-                response_msg = f"There are {len(candidate_pool)} candidates in the pool for {ctx.member.voice.channel.mention}:\n"
-                for member in candidate_pool:
-                    response_msg += f"- {member.mention}\n"
+                header = f"There are {len(candidate_pool)} candidates in the pool for {ctx.member.voice.channel.mention}:"
             elif len(candidate_pool) == 1:
-                response_msg = f"There is {len(candidate_pool)} candidate in the pool for {ctx.member.voice.channel.mention}:\n"
-                for member in candidate_pool:
-                    response_msg += f"- {member.mention}\n"
+                header = f"There is {len(candidate_pool)} candidate in the pool for {ctx.member.voice.channel.mention}:"
             else:
-                response_msg = f"There are no valid candidates in the pool for {ctx.member.voice.channel.mention}"
-            await ctx.respond(response_msg)
+                header = f"There are no valid candidates in the pool for {ctx.member.voice.channel.mention}"
+            await self.__respondWithLines(ctx, header, [f"- {member.mention}" for member in candidate_pool])
 
     @slash_command(name='view-candidate-pool',
                    description='View the pool of valid candidates for your voice channel.')
@@ -301,38 +467,46 @@ class GNCommands(Extension):
             }
         '''
 
-        failed_to_send_DM: List[int] = []
-        successful_DMs: List[Message] = []
-        for memKey in msgDict:
-
-            # Extract the member's DM channel
-            member: Member = msgDict[memKey]["member_obj"]
-            dm_channel: DMChannel = await member.user.fetch_dm()
-
-            # Send the DM
-            try:
-                resultingMessage = await dm_channel.send(msgDict[memKey]["message_to_send"])
-                successful_DMs.append(resultingMessage)
-            except HTTPException as err:
-                if 'Cannot send messages to this user' == err.text:
-                    failed_to_send_DM.append(memKey)
-                else:
-                    raise err
+        if ctx:
+            async with ProgressReporter(ctx, total=len(msgDict), label="DMs delivered") as progress:
+                delivery = await self.bot.dm_dispatcher.send_all(msgDict, on_sent=progress.advance)
+        else:
+            delivery = await self.bot.dm_dispatcher.send_all(msgDict)
+        successful_DMs, failed_to_send_DM = delivery.sent, delivery.dms_closed
+
+        # Discord kept failing for some members even after retrying, so nobody keeps a role from this game
+        if len(delivery.failed) > 0:
+            logger.warning("Rolling back sent DMs after failed deliveries", extra={"rolled_back": len(successful_DMs),
+                                                                                   "failed_ids": delivery.failed})
+            await self.bot.dm_dispatcher.delete_all(successful_DMs)
+            if ctx:
+                footer = "\nAll other DMs have been deleted, please call this command again in a bit."
+                await ctx.respond(fit_lines([f"- {msgDict[member_id]['member_obj'].mention}" for member_id in delivery.failed],
+                                            max_len=MESSAGE_MAX_LEN - len(footer),
+                                            header="Discord wouldn't let me deliver DMs to:") + footer)
+            return False
 
         # Deal with case if there are users that don't allow server DMs
         if ctx and (len(failed_to_send_DM) > 0):
-            response_msg = ""
-            for member_id in failed_to_send_DM:
-                member = msgDict[member_id]["member_obj"]
-                response_msg += f"{member.mention} "
-            response_msg += ", please adjust your privacy settings for this server so that I can send you a DM.\n"
-            response_msg += "All other DMs have been deleted, please call this command again after everyone allows DMs.\n\n"
-            response_msg += "## Instructions:\n"
-
-            await ctx.respond(response_msg, files=self.bot.bot_config["allowDmsInstructionsFilePaths"])
-
-            for msg in successful_DMs:
-                await msg.delete()
+            footer = "\nAll other DMs have been deleted, please call this command again after everyone allows DMs.\n\n"
+            footer += "## Instructions:\n"
+            response_msg = fit_lines([f"- {msgDict[member_id]['member_obj'].mention}" for member_id in failed_to_send_DM],
+                                     max_len=MESSAGE_MAX_LEN - len(footer),
+                                     header="Please adjust your privacy settings for this server so that I can send you a DM:")
+            response_msg += footer
+
+            # Withdraw the roles before anyone is told to look at their DMs
+            logger.info("Rolling back sent DMs", extra={"rolled_back": len(successful_DMs),
+                                                        "dms_closed_ids": failed_to_send_DM})
+            await self.bot.dm_dispatcher.delete_all(successful_DMs)
+
+            # Embed the images uploaded by an earlier failure if their CDN URLs are still good, otherwise upload them
+            instructions = self.bot.allow_dms_instructions
+            embeds = instructions.embeds()
+            if embeds is not None:
+                await ctx.respond(response_msg, embeds=embeds)
+            else:
+                instructions.remember_upload(await ctx.respond(response_msg, files=instructions.files()))
 
             return False
         else:
@@ -344,7 +518,8 @@ class GNCommands(Extension):
                                                             safe_role_name: str = "",
                                                             n: int = 1,
                                                             remove_from_candidate_pool: bool = False,
-                                                            imposter_knowledge: bool = True
+                                                            imposter_knowledge: bool = True,
+                                                            fair: bool = False
                                                             ) -> None:
         '''
         Randomly selects `n` people, assigns them a role name `role_name` (textually, not a Discord role), 
@@ -358,17 +533,21 @@ class GNCommands(Extension):
             safe_role_name (str): The name of the safe role. Defaults to telling people that they are "Not the imposter"
             n (int): The number of people to assign the role to.
             remove_from_candidate_pool (bool): If true, removes members with the role from the candidate pool for future selections.
+            imposter_knowledge (bool): If true, imposters are told who the other imposters are.
+            fair (bool): If true, people who were selected recently are less likely to be selected.
         '''
 
         # Extract the candidate pool
-        candidate_pool = self.__getCandidatePool(ctx)
+        candidate_pool = await self.__getCandidatePool(ctx)
 
         # Select the imposters
         imposters = await self.__randomlySelectPeopleBaseImplementation(
             ctx=ctx,
             # role_name=imposter_name,
             n=n,
-            remove_from_candidate_pool=remove_from_candidate_pool
+            remove_from_candidate_pool=remove_from_candidate_pool,
+            candidate_pool=candidate_pool,
+            fair=fair
         )
 
         if imposters != []:
@@ -392,11 +571,10 @@ class GNCommands(Extension):
                     safe_DM = f":relieved: Phew! You are NOT a{imp_vowel} {imposter_name}!"
                 else:
                     safe_DM = f":relieved: Phew! You're a{safe_vowel} {safe_role_name}!"
-                imposter_DM = f":smiling_imp: Yikes! You're a{imp_vowel} {imposter_name}!\n"
+                imposter_DM = f":smiling_imp: Yikes! You're a{imp_vowel} {imposter_name}!"
                 if imposter_knowledge:
-                    imposter_DM += f"Your fellow {imposter_name}s are:\n"
-                    for imp in imposters:
-                        imposter_DM += f"- {imp.mention}\n"
+                    imposter_DM = fit_lines([f"- {imp.mention}" for imp in imposters],
+                                            header=f"{imposter_DM}\nYour fellow {imposter_name}s are:")
             else:
                 raise ValueError(f"n must be strictly positive: {n=}")
 
@@ -458,23 +636,228 @@ class GNCommands(Extension):
                   required=False,
                   argument_name='imposter_knowledge'
                   )
+    @slash_option(name='fair',
+                  description='Whether people selected recently are less likely to be selected again. Default = False',
+                  opt_type=OptionType.BOOLEAN,
+                  required=False,
+                  argument_name='fair'
+                  )
     async def imposter(self,
                        ctx: SlashContext,
                        imposter_name: str = "Imposter",
                        safe_role_name: str = "",
                        n: int = 1,
                        remove_from_candidate_pool: bool = False,
-                       imposter_knowledge: bool = True
+                       imposter_knowledge: bool = True,
+                       fair: bool = False
                        ) -> None:
         """
         Randomly selects n people to assign and privately distribute the `imposter-name` role via DMs. 
         """
 
-        await self.__randomlySelectPeoplePrivatelyImplementation(
-            ctx=ctx,
-            imposter_name=imposter_name,
-            safe_role_name=safe_role_name,
-            n=n,
-            remove_from_candidate_pool=remove_from_candidate_pool,
-            imposter_knowledge=imposter_knowledge
+        # Acknowledged before waiting for the channel, sending every DM can outlast the 3 second interaction window
+        start_time = time.perf_counter()
+        acked_at = await self.__runSerializedPerChannel(
+            ctx,
+            ('imposter', imposter_name, safe_role_name, n, remove_from_candidate_pool, imposter_knowledge, fair),
+            lambda: self.__randomlySelectPeoplePrivatelyImplementation(
+                ctx=ctx,
+                imposter_name=imposter_name,
+                safe_role_name=safe_role_name,
+                n=n,
+                remove_from_candidate_pool=remove_from_candidate_pool,
+                imposter_knowledge=imposter_knowledge,
+                fair=fair
+            )
         )
+        total_secs = time.perf_counter() - start_time
+        ack_secs = (acked_at if acked_at is not None else time.perf_counter()) - start_time
+        logger.info(f"/imposter: acknowledged after {ack_secs * 1000:.0f} ms, completed after {total_secs * 1000:.0f} ms",
+                    extra={"ack_secs": ack_secs, "total_secs": total_secs})
+
+    async def __setupRolesImplementation(self,
+                                         ctx: SlashContext,
+                                         specs: Tuple[RoleSpec, ...],
+                                         rest_role: str,
+                                         save_as: Optional[str] = None) -> None:
+        '''
+        Assigns every role of a setup with one shuffle of the candidate pool, then DMs each member once with their role.
+
+        Args:
+            ctx (SlashContext): The slash command context that called this function.
+            specs (Tuple[RoleSpec, ...]): The roles to hand out and how many people get each.
+            rest_role (str): The role of everyone left over.
+            save_as (Optional[str]): The preset to save the setup as, once every role was sent.
+        '''
+
+        if await self.__memberIsInVoiceChannel(ctx):
+            candidate_pool = await self.__getCandidatePool(ctx)
+
+            # Respond with an error message if the setup needs more people than there are candidates
+            assigned = sum(spec.count for spec in specs)
+            if len(candidate_pool) < assigned:
+                err_msg = f"ERROR: This setup needs at least {assigned} people, "
+                err_msg += f"but there are only {len(candidate_pool)} in the candidate pool!\n"
+                err_msg += "To view the candidate pool, use the following command:\n"
+                err_msg += "```/view-candidate-pool```\n"
+                await ctx.respond(err_msg)
+                return
+
+            assignment = assign_roles(candidate_pool, specs, rest_role)
+            logger.info("Roles assigned", extra={"channel_id": ctx.member.voice.channel.id,
+                                                 "pool_size": len(candidate_pool),
+                                                 "roles": {role_name: [member.id for member in members]
+                                                           for role_name, members in assignment.items()}})
+
+            # One combined DM per member
+            if await self.__sendMassDM(msgDict=role_DMs(assignment, specs),
+                                       ctx=ctx):
+                lines = [f"- {len(members)} {role_name}" for role_name, members in assignment.items()]
+                if save_as is not None:
+                    try:
+                        self.bot.role_presets.put(ctx.guild_id, RolePreset(name=save_as,
+                                                                           roles=format_roles(specs),
+                                                                           rest_role=rest_role))
+                        lines.append(f"Saved this setup as the `{save_as}` preset.")
+                    except ValueError as err:
+                        lines.append(f"Error: This setup wasn't saved as a preset. {err}.")
+                await self.__respondWithLines(ctx, "All roles have been sent, check your DMs! This game has:", lines)
+
+    @slash_command(
+        name='setup-roles',
+        description='Randomly assigns several roles at once and privately distributes them via DMs.',
+    )
+    @slash_option(name='roles',
+                  description='Roles with counts, e.g. "2 Werewolf+, 1 Seer". A trailing + reveals teammates to each other',
+                  opt_type=OptionType.STRING,
+                  required=False,
+                  argument_name='roles',
+                  min_length=1
+                  )
+    @slash_option(name='rest-role',
+                  description='The role of everyone not given one of `roles`. Default = Villager',
+                  opt_type=OptionType.STRING,
+                  required=False,
+                  argument_name='rest_role',
+                  min_length=1
+                  )
+    @slash_option(name='preset',
+                  description='A saved setup to use. `roles` and `rest-role` override its values',
+                  opt_type=OptionType.STRING,
+                  required=False,
+                  argument_name='preset',
+                  autocomplete=True
+                  )
+    @slash_option(name='save-as',
+                  description='Saves this setup as a preset for this server under the given name',
+                  opt_type=OptionType.STRING,
+                  required=False,
+                  argument_name='save_as',
+                  min_length=1,
+                  max_length=100
+                  )
+    async def setupRoles(self,
+                         ctx: SlashContext,
+                         roles: str = None,
+                         rest_role: str = None,
+                         preset: str = None,
+                         save_as: str = None
+                         ) -> None:
+        """
+        Randomly assigns several roles at once and privately distributes them via DMs.
+        """
+
+        # Sending every DM can outlast the 3 second interaction window, so the interaction is
+        # acknowledged before waiting for the channel. The checks below answer right away.
+        if (preset is not None or save_as is not None) and ctx.guild_id is None:
+            await ctx.respond("Error: Presets can only be used in a server.")
+            return
+
+        if preset is not None:
+            saved = self.bot.role_presets.get(ctx.guild_id, preset)
+            if saved is None:
+                await ctx.respond(f"Error: This server has no preset called `{preset}`. Use `/role-presets` to list them.")
+                return
+            roles = roles if roles is not None else saved.roles
+            rest_role = rest_role if rest_role is not None else saved.rest_role
+
+        if roles is None:
+            await ctx.respond("Error: Give either `roles` or `preset`, e.g. `roles: 2 Werewolf+, 1 Seer, 1 Doctor`")
+            return
+        rest_role = (rest_role if rest_role is not None else "Villager").strip()
+
+        try:
+            specs = parse_roles(roles, name_max_len=self.bot.guild_config(ctx.guild_id).label_max_len)
+        except ValueError as err:
+            await ctx.respond(f"Error: {err}")
+            return
+        if rest_role.lower() in {spec.name.lower() for spec in specs}:
+            await ctx.respond(f"Error: `{rest_role}` can't be both a listed role and the `rest-role`")
+            return
+
+        if save_as is not None:
+            save_as = save_as.strip()
+            if self.bot.role_presets.get(ctx.guild_id, save_as) is not None and not await self.__canManagePresets(ctx):
+                await ctx.respond(f"Error: Only members who can manage roles can overwrite the `{save_as}` preset.")
+                return
+
+        # The preset is only saved once the setup went through, and reported in the same response
+        await self.__runSerializedPerChannel(
+            ctx,
+            ('setup-roles', format_roles(specs), rest_role),
+            lambda: self.__setupRolesImplementation(ctx=ctx, specs=specs, rest_role=rest_role, save_as=save_as)
+        )
+
+    async def __canManagePresets(self, ctx: SlashContext) -> bool:
+        '''
+        Whether the author may overwrite or delete this server's presets, i.e. can manage roles or owns the bot
+        '''
+        if isinstance(ctx.author, Member) and ctx.author.has_permission(Permissions.MANAGE_ROLES):
+            return True
+        return await is_owner()(ctx)
+
+    @setupRoles.autocomplete('preset')
+    async def setupRolesPresetAutocomplete(self, ctx: AutocompleteContext) -> None:
+        """
+        Suggests this server's saved presets
+        """
+        typed = ctx.input_text.lower()
+        presets = self.bot.role_presets.guild(ctx.guild_id).values() if ctx.guild_id else []
+        await ctx.send(choices=[{"name": saved.name, "value": saved.name}
+                                for saved in presets if typed in saved.name.lower()][:25])
+
+    @slash_command(name='role-presets',
+                   description='Lists the role setups saved on this server.')
+    async def rolePresets(self, ctx: SlashContext) -> None:
+        """
+        Lists the role setups saved on this server. 
+        """
+        presets = self.bot.role_presets.guild(ctx.guild_id).values() if ctx.guild_id else []
+        if len(presets) == 0:
+            await ctx.respond("There are no saved role presets. Save one with `/setup-roles save-as:`")
+            return
+
+        await self.__respondWithLines(ctx,
+                                      "Saved role presets:",
+                                      [f"- **{saved.name}**: {saved.roles}, rest {saved.rest_role}"
+                                       for saved in sorted(presets, key=lambda saved: saved.name.lower())])
+
+    @slash_command(name='delete-role-preset',
+                   description='Deletes a role setup saved on this server.')
+    @slash_option(name='preset',
+                  description='The name of the preset to delete',
+                  opt_type=OptionType.STRING,
+                  required=True,
+                  argument_name='preset'
+                  )
+    async def deleteRolePreset(self, ctx: SlashContext, preset: str) -> None:
+        """
+        Deletes a role setup saved on this server. 
+        """
+        if ctx.guild_id is not None and self.bot.role_presets.get(ctx.guild_id, preset) is not None \
+                and not await self.__canManagePresets(ctx):
+            await ctx.respond(f"Error: Only members who can manage roles can delete the `{preset}` preset.")
+        elif ctx.guild_id is not None and self.bot.role_presets.delete(ctx.guild_id, preset):
+            await ctx.respond(f"Deleted the `{preset}` preset.")
+        else:
+            await ctx.respond(f"Error: This server has no preset called `{preset}`.")
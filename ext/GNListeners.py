@@ -3,7 +3,11 @@ Defines most of the event listeners of the bot
 '''
 
 from interactions import Extension, listen
-from interactions.api.events import VoiceUserLeave
+from interactions.api.events import Startup, VoiceUserJoin, VoiceUserLeave, VoiceUserMove
+
+from src.StructuredLogger import get_logger
+
+logger = get_logger('listeners')
 
 
 class GNListeners(Extension):
@@ -17,8 +21,20 @@ class GNListeners(Extension):
         Message to print to terminal once the bot is ready
         """
 
-        print("Bot is ready!")
-        print(f"This bot is owned by {self.bot.owner}")
+        logger.info("Bot is ready!")
+        logger.info(f"This bot is owned by {self.bot.owner}")
+        await self.bot.start_metrics_endpoint()
+        self.bot.config_watcher.start()
+        self.bot.finish_resume()
+        self.bot.schedule_idle_channels()
+
+    @listen(Startup)
+    async def on_startup(self):
+        """
+        Starts the outbound DM workers. Unlike Ready, Startup doesn't fire again when the gateway reconnects.
+        """
+
+        self.bot.dm_dispatcher.start()
 
     @listen(VoiceUserLeave, delay_until_ready=True)
     async def on_VoiceUserLeave(self, event: VoiceUserLeave):
@@ -30,3 +46,35 @@ class GNListeners(Extension):
         channel = event.channel
 
         self.bot.remove_member_from_removed_candidates(channel, user)
+        self.bot.candidate_index.member_removed(channel.id, user.id)
+
+        # Start the idle countdown once the channel empties
+        if len(channel.voice_members) == 0:
+            self.bot.channel_expiry.schedule(channel.id, self.bot.guild_config(channel.guild.id).timeout_mins * 60)
+
+    @listen(VoiceUserJoin, delay_until_ready=True)
+    async def on_VoiceUserJoin(self, event: VoiceUserJoin):
+        '''
+        Adds the user to the candidate pool of the joined channel, and keeps it from expiring
+        '''
+
+        self.bot.candidate_index.member_joined(event.channel.id, event.author)
+        self.bot.channel_expiry.cancel(event.channel.id)
+
+    @listen(VoiceUserMove, delay_until_ready=True)
+    async def on_VoiceUserMove(self, event: VoiceUserMove):
+        '''
+        Moves the user from the candidate pool of the channel that was left to the one that was joined.
+        Starts the idle countdown of the channel that was left if it's now empty,
+        and keeps the channel that was joined from expiring
+        '''
+
+        user = event.author
+        self.bot.remove_member_from_removed_candidates(event.previous_channel, user)
+        self.bot.candidate_index.member_removed(event.previous_channel.id, user.id)
+        self.bot.candidate_index.member_joined(event.new_channel.id, user)
+
+        if len(event.previous_channel.voice_members) == 0:
+            self.bot.channel_expiry.schedule(event.previous_channel.id,
+                                             self.bot.guild_config(event.previous_channel.guild.id).timeout_mins * 60)
+        self.bot.channel_expiry.cancel(event.new_channel.id)
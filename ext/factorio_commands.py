@@ -4,12 +4,23 @@ Defines slash commands relevant to Factorio gaming
 # import os
 # import asyncio
 # from typing import List, Dict
+import io
+import math
 from enum import StrEnum, auto
+from functools import cache
+from typing import List
 
-import numpy as np
 import interactions as its
 
+from src.myUtils import LazyModule
+
+# NumPy is only imported once a Factorio command is used
+np = LazyModule("numpy")
+
 THRUSTER_WIDTH = 4
+MAX_SWEEP_CELLS = 100_000
+# Bounds the sweep's options, so a range's length can't overflow before it's checked against MAX_SWEEP_CELLS
+MAX_SWEEP_MASS = 1_000_000
 
 
 class Quality(StrEnum):
@@ -28,6 +39,25 @@ class Quality(StrEnum):
     LEGENDARY = auto()
 
 
+# Thrust of a single thruster in mega-newtons
+F_PER_THRUSTER = {
+    Quality.COMMON: 102,
+    Quality.UNCOMMON: 132,
+    Quality.RARE: 163,
+    Quality.EPIC: 193,
+    Quality.LEGENDARY: 254,
+}
+
+
+@cache
+def F_per_thruster_table() -> "np.ndarray":
+    """
+    Returns:
+        np.ndarray: The thrust of a single thruster of each `Quality`, in declaration order
+    """
+    return np.array([F_PER_THRUSTER[quality] for quality in Quality], dtype=float)
+
+
 def v_max(F_thrust_MN: float, mass: float, width: int) -> float:
     """
     Calculates the max speed of the space platform
@@ -58,18 +88,129 @@ def F_thrust_max(num_of_thrusters: int, quality_of_thrusters: Quality) -> float:
         float: The max thrust of all the thrusters on your space platform
     """
 
-    F_per_thruster_dict = {
-        Quality.COMMON: 102,
-        Quality.UNCOMMON: 132,
-        Quality.RARE: 163,
-        Quality.EPIC: 193,
-        Quality.LEGENDARY: 254,
-    }
-
-    F_per_thruster = F_per_thruster_dict[quality_of_thrusters]
+    F_per_thruster = F_PER_THRUSTER[quality_of_thrusters]
     return F_per_thruster * num_of_thrusters
 
 
+def v_max_grid(
+    thruster_counts: "np.ndarray",
+    masses: "np.ndarray",
+    qualities: List[Quality],
+    width: int,
+) -> "np.ndarray":
+    """
+    Calculates the max speed of every (quality, num_of_thrusters, mass) combination in one vectorized pass
+
+    Args:
+        thruster_counts (np.ndarray): The numbers of thrusters to try
+        masses (np.ndarray): The masses to try, in tonnes
+        qualities (List[Quality]): The thruster qualities to try
+        width (int): The max width of the space platform in tiles
+
+    Returns:
+        np.ndarray: Max speeds of shape (len(qualities), len(thruster_counts), len(masses)).
+        NaN where the thrusters don't fit within the width, or can't move the platform.
+    """
+
+    F_per_thruster = np.array([F_PER_THRUSTER[quality] for quality in qualities], dtype=float)
+    F_thrust_MN = F_per_thruster[:, None, None] * thruster_counts[None, :, None]
+    with np.errstate(invalid="ignore"):
+        grid = v_max(F_thrust_MN=F_thrust_MN, mass=masses[None, None, :], width=width)
+    grid[:, THRUSTER_WIDTH * thruster_counts > width, :] = np.nan
+    return grid
+
+
+def v_max_grid_to_csv(
+    grid: "np.ndarray",
+    thruster_counts: "np.ndarray",
+    masses: "np.ndarray",
+    qualities: List[Quality],
+) -> bytes:
+    """
+    Formats the output of `v_max_grid` as CSV, with blank speeds for infeasible designs
+
+    Returns:
+        bytes: The UTF-8 encoded CSV
+    """
+
+    buffer = io.StringIO()
+    buffer.write("quality,num_of_thrusters,mass,max_speed_departure,max_speed_arrival\n")
+    n_grid, mass_grid = np.meshgrid(thruster_counts, masses, indexing="ij")
+    for quality, v in zip(qualities, grid):
+        rows = np.column_stack((n_grid.ravel(), mass_grid.ravel(), v.ravel() - 10, v.ravel() + 10))
+        np.savetxt(buffer, rows, fmt=f"{quality},%d,%.2f,%.2f,%.2f")
+    return buffer.getvalue().replace("nan", "").encode("utf-8")
+
+
+def F_thrust_required(v: float, mass: float, width: int) -> float:
+    """
+    Calculates the thrust needed to reach a max speed. This is the closed-form inverse of `v_max`.
+
+    Args:
+        v (float): The max speed of the space platform, as returned by `v_max`
+        mass (float): The mass of the space platform in tonnes
+        width (int): The max width of the space platform in tiles
+
+    Returns:
+        float: The thrust force of all thrusters in mega-newtons
+    """
+
+    inner = ((v + 30) / 10) ** 2
+    return ((inner - 9) * width + 480) * (mass + 10000) / 480000
+
+
+def mass_max(v: float, F_thrust_MN: float, width: int) -> float:
+    """
+    Calculates the heaviest platform that still reaches a max speed. This is the closed-form inverse of `v_max`.
+
+    Args:
+        v (float): The max speed of the space platform, as returned by `v_max`
+        F_thrust_MN (float): The thrust force of all thrusters in mega-newtons
+        width (int): The max width of the space platform in tiles
+
+    Returns:
+        float: The mass of the space platform in tonnes. Not positive if no platform can reach `v`.
+    """
+
+    inner = ((v + 30) / 10) ** 2
+    return 480000 * F_thrust_MN / ((inner - 9) * width + 480) - 10000
+
+
+def min_thrusters_per_quality(v_departure: float, mass: float, width: int) -> "np.ndarray":
+    """
+    Calculates the fewest thrusters of each quality needed to reach a max speed after departure
+
+    Args:
+        v_departure (float): The target max speed after departure, in km/s
+        mass (float): The mass of the space platform in tonnes
+        width (int): The max width of the space platform in tiles
+
+    Returns:
+        np.ndarray: The number of thrusters for each `Quality`, in declaration order.
+        Counts may not fit within `width`, check them against THRUSTER_WIDTH.
+    """
+
+    F_needed = F_thrust_required(v=v_departure + 10, mass=mass, width=width)
+    return np.maximum(np.ceil(F_needed / F_per_thruster_table()), 1).astype(int)
+
+
+def max_mass_per_quality(v_departure: float, num_of_thrusters: int, width: int) -> "np.ndarray":
+    """
+    Calculates the heaviest platform that reaches a max speed after departure, for thrusters of each quality
+
+    Args:
+        v_departure (float): The target max speed after departure, in km/s
+        num_of_thrusters (int): The number of thrusters on the space platform
+        width (int): The max width of the space platform in tiles
+
+    Returns:
+        np.ndarray: The mass in tonnes for each `Quality`, in declaration order. Not positive where
+        the target can't be reached.
+    """
+
+    return mass_max(v=v_departure + 10, F_thrust_MN=F_per_thruster_table() * num_of_thrusters, width=width)
+
+
 class FactorioCommands(its.Extension):
     """
     A class for Factorio related commands
@@ -143,3 +284,229 @@ class FactorioCommands(its.Extension):
             response  = f"The max speed of your space platform after departure is: {max_v - 10:.2f} km/s\n"
             response += f"The max speed of your space platform upon arrival is: {max_v + 10:.2f} km/s"
             await ctx.respond(response)
+
+    @its.slash_command(
+        name="space_platform_max_speed_sweep",
+        description="Calculates the max speed of many platform designs at once, as a CSV."
+    )
+    @its.slash_option(
+        name="max_width",
+        description="The max width of your platform in tiles.",
+        opt_type=its.OptionType.INTEGER,
+        required=True,
+        min_value=1,
+    )
+    @its.slash_option(
+        name="max_num_of_thrusters",
+        description="The largest number of thrusters to try.",
+        opt_type=its.OptionType.INTEGER,
+        required=True,
+        min_value=1,
+        max_value=MAX_SWEEP_CELLS,
+    )
+    @its.slash_option(
+        name="min_mass",
+        description="The smallest mass to try, in tonnes.",
+        opt_type=its.OptionType.NUMBER,
+        required=True,
+        min_value=0.1,
+        max_value=MAX_SWEEP_MASS,
+    )
+    @its.slash_option(
+        name="max_mass",
+        description="The largest mass to try, in tonnes.",
+        opt_type=its.OptionType.NUMBER,
+        required=True,
+        min_value=0.1,
+        max_value=MAX_SWEEP_MASS,
+    )
+    @its.slash_option(
+        name="mass_step",
+        description="The step between masses, in tonnes.",
+        opt_type=its.OptionType.NUMBER,
+        required=True,
+        min_value=0.1,
+        max_value=MAX_SWEEP_MASS,
+    )
+    @its.slash_option(
+        name="min_num_of_thrusters",
+        description="The smallest number of thrusters to try. Default = 1",
+        opt_type=its.OptionType.INTEGER,
+        required=False,
+        min_value=1,
+        max_value=MAX_SWEEP_CELLS,
+    )
+    @its.slash_option(
+        name="quality_of_thrusters",
+        description="Only try thrusters of this quality. Default = all qualities",
+        required=False,
+        opt_type=its.OptionType.STRING,
+        choices=[
+            its.SlashCommandChoice(name=quality, value=quality)
+            for quality in Quality
+        ],
+    )
+    async def space_platform_max_speed_sweep(
+        self,
+        ctx: its.SlashContext,
+        max_width: int,
+        max_num_of_thrusters: int,
+        min_mass: float,
+        max_mass: float,
+        mass_step: float,
+        min_num_of_thrusters: int = 1,
+        quality_of_thrusters: str = None,
+    ):
+        """
+        Calculates the max speed of every combination of thruster count, mass and quality in the given ranges
+
+        Args:
+            ctx (its.SlashContext): _description_
+            max_width (int): The max width of your platform in tiles.
+            max_num_of_thrusters (int): The largest number of thrusters to try.
+            min_mass (float): The smallest mass to try, in tonnes.
+            max_mass (float): The largest mass to try, in tonnes.
+            mass_step (float): The step between masses, in tonnes.
+            min_num_of_thrusters (int): The smallest number of thrusters to try.
+            quality_of_thrusters (str): Only try thrusters of this quality. Tries all qualities if omitted.
+        """
+
+        if min_num_of_thrusters > max_num_of_thrusters or min_mass > max_mass:
+            await ctx.respond("Error: Each range's minimum must be less than or equal to its maximum.")
+            return
+
+        qualities = list(Quality) if quality_of_thrusters is None else [Quality(quality_of_thrusters)]
+        # Sized arithmetically, so an oversized sweep is turned down before anything is allocated.
+        # The small slack keeps max_mass in the range when (max - min) / step lands just under a whole number.
+        num_of_thruster_counts = max_num_of_thrusters - min_num_of_thrusters + 1
+        num_of_masses = math.floor((max_mass - min_mass) / mass_step + 1e-9) + 1
+
+        num_of_cells = len(qualities) * num_of_thruster_counts * num_of_masses
+        if num_of_cells > MAX_SWEEP_CELLS:
+            response = f"Error: That sweep has {num_of_cells:,} designs, but at most {MAX_SWEEP_CELLS:,} fit in one CSV.\n"
+            response += "Please narrow the ranges or increase `mass_step`."
+            await ctx.respond(response)
+            return
+
+        thruster_counts = np.arange(min_num_of_thrusters, max_num_of_thrusters + 1)
+        masses = min_mass + mass_step * np.arange(num_of_masses)
+
+        grid = v_max_grid(thruster_counts=thruster_counts, masses=masses, qualities=qualities, width=max_width)
+        csv = v_max_grid_to_csv(grid=grid, thruster_counts=thruster_counts, masses=masses, qualities=qualities)
+
+        num_of_feasible = int(np.count_nonzero(~np.isnan(grid)))
+        response = f"Calculated {num_of_cells:,} designs, {num_of_feasible:,} of which are feasible.\n"
+        if num_of_feasible > 0:
+            best_quality, best_n, best_mass = np.unravel_index(np.nanargmax(grid), grid.shape)
+            response += f"The fastest is {thruster_counts[best_n]} {qualities[best_quality]} thrusters at {masses[best_mass]:.1f} t, "
+            response += f"reaching {grid[best_quality, best_n, best_mass] - 10:.2f} km/s after departure."
+        await ctx.respond(response, file=its.File(io.BytesIO(csv), file_name="space_platform_sweep.csv"))
+
+    @its.slash_command(
+        name="space_platform_min_thrusters",
+        description="Calculates the fewest thrusters of each quality needed to reach a target speed."
+    )
+    @its.slash_option(
+        name="max_width",
+        description="The max width of your platform in tiles.",
+        opt_type=its.OptionType.INTEGER,
+        required=True,
+        min_value=1,
+    )
+    @its.slash_option(
+        name="mass",
+        description="The mass of your platform in tonnes.",
+        opt_type=its.OptionType.NUMBER,
+        required=True,
+        min_value=0.1,
+    )
+    @its.slash_option(
+        name="target_speed",
+        description="The max speed you want after departure, in km/s.",
+        opt_type=its.OptionType.NUMBER,
+        required=True,
+        min_value=0,
+    )
+    async def space_platform_min_thrusters(
+        self,
+        ctx: its.SlashContext,
+        max_width: int,
+        mass: float,
+        target_speed: float,
+    ):
+        """
+        Calculates the fewest thrusters of each quality needed to reach a target speed
+
+        Args:
+            ctx (its.SlashContext): _description_
+            max_width (int): The max width of your platform in tiles.
+            mass (float): The mass of your platform in tonnes.
+            target_speed (float): The max speed you want after departure, in km/s.
+        """
+
+        thruster_counts = min_thrusters_per_quality(v_departure=target_speed, mass=mass, width=max_width)
+        response = f"To reach {target_speed:.2f} km/s after departure with {mass:.1f} t and max width = {max_width}, you need:\n"
+        for quality, num_of_thrusters in zip(Quality, thruster_counts):
+            if THRUSTER_WIDTH * num_of_thrusters > max_width:
+                response += f"- {quality}: {num_of_thrusters} thrusters, which don't fit within the max width\n"
+            else:
+                response += f"- {quality}: {num_of_thrusters} thrusters\n"
+        await ctx.respond(response)
+
+    @its.slash_command(
+        name="space_platform_max_mass_calc",
+        description="Calculates the heaviest platform that still reaches a target speed."
+    )
+    @its.slash_option(
+        name="max_width",
+        description="The max width of your platform in tiles.",
+        opt_type=its.OptionType.INTEGER,
+        required=True,
+        min_value=1,
+    )
+    @its.slash_option(
+        name="num_of_thrusters",
+        description="The number of thrusters on your platform.",
+        opt_type=its.OptionType.INTEGER,
+        required=True,
+        min_value=1,
+    )
+    @its.slash_option(
+        name="target_speed",
+        description="The max speed you want after departure, in km/s.",
+        opt_type=its.OptionType.NUMBER,
+        required=True,
+        min_value=0,
+    )
+    async def space_platform_max_mass_calc(
+        self,
+        ctx: its.SlashContext,
+        max_width: int,
+        num_of_thrusters: int,
+        target_speed: float,
+    ):
+        """
+        Calculates the heaviest platform that still reaches a target speed, for thrusters of each quality
+
+        Args:
+            ctx (its.SlashContext): _description_
+            max_width (int): The max width of your platform in tiles.
+            num_of_thrusters (int): The number of thrusters on your platform.
+            target_speed (float): The max speed you want after departure, in km/s.
+        """
+
+        if THRUSTER_WIDTH * num_of_thrusters > max_width:
+            response = f"Error: It's impossible to fit {num_of_thrusters} thrusters on a space platform with max width = {max_width}.\n"
+            response += "Each thruster has width = 4, thus, we require that 4 * num_of_thrusters <= max_width."
+            await ctx.respond(response)
+            return
+
+        masses = max_mass_per_quality(v_departure=target_speed, num_of_thrusters=num_of_thrusters, width=max_width)
+        response = f"The heaviest platform with {num_of_thrusters} thrusters and max width = {max_width} "
+        response += f"that reaches {target_speed:.2f} km/s after departure is:\n"
+        for quality, mass in zip(Quality, masses):
+            if mass <= 0:
+                response += f"- {quality}: unreachable\n"
+            else:
+                response += f"- {quality}: {mass:.1f} t\n"
+        await ctx.respond(response)
@@ -3,18 +3,48 @@
 Runs the Game Night Discord Bot
 """
 
+import multiprocessing
 import os
+import time
 
-from interactions import Intents
+from src.BotConfig import BotConfig
 from src.GNClient import GNClient
 
-def main():
+BOT_CONFIG_PATH = 'data/bot_config_template.json'
+
+# Discord only lets a bot identify one shard every 5 seconds
+SHARD_START_INTERVAL_SECS = 5.5
+
+def run_shard(shard_id: int, total_shards: int):
     """
-    Entry point for running the Game Night Discord Bot
+    Runs one gateway shard of the Game Night Discord Bot in the current process
     """
     token = os.getenv('GNB_CLIENT_SECRET')
-    intents = Intents(Intents.DEFAULT + Intents.new(message_content=True))
-    GNClient(bot_config_path='data/bot_config_template.json', token=token, intents=intents)
+    # The intents follow the `cache_profile` of the bot config
+    GNClient(bot_config_path=BOT_CONFIG_PATH, token=token,
+             shard_id=shard_id, total_shards=total_shards)
+
+def main():
+    """
+    Entry point for running the Game Night Discord Bot.
+    With `total_shards` > 1, every shard runs in its own process.
+    """
+    total_shards = BotConfig.from_file(BOT_CONFIG_PATH).total_shards
+    if total_shards == 1:
+        run_shard(0, 1)
+        return
+
+    # Spawned rather than forked, so no process inherits another's event loop or database connections
+    mp_context = multiprocessing.get_context('spawn')
+    processes = []
+    for shard_id in range(total_shards):
+        if shard_id > 0:
+            time.sleep(SHARD_START_INTERVAL_SECS)
+        process = mp_context.Process(target=run_shard, args=(shard_id, total_shards), name=f'shard-{shard_id}')
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
 
 if __name__ == "__main__":
     main()
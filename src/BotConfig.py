@@ -0,0 +1,195 @@
+'''
+Typed, validated bot configuration
+'''
+
+import types
+import typing
+from dataclasses import dataclass, field, fields
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from src.CacheProfile import CACHE_PROFILES
+from src.myUtils import load_bot_config
+
+# Changing these in the config file only takes effect after a restart
+RESTART_REQUIRED_KEYS = (
+    'bot_owner_id', 'debug_scope', 'removed_candidates_db_path', 'role_presets_db_path', 'selection_history_db_path',
+    'lazy_extension_imports', 'startup_report_path', 'api_base_url', 'metrics_port',
+    'log_path', 'log_max_bytes', 'log_backup_count', 'log_to_stdout', 'config_reload_interval_secs', 'total_shards',
+    'shutdown_snapshot_path', 'cache_profile', 'lean_cache_max_size', 'outbound_queue_db_path',
+)
+
+
+@dataclass(frozen=True, slots=True)
+class GuildSettings:
+    '''
+    The settings a guild can override under `guild_overrides`
+    '''
+    delete_after_time_secs: int = field(metadata={'min': 0})
+    timeout_mins: int = field(metadata={'min': 1})
+    label_max_len: int = field(metadata={'min': 1})
+
+
+@dataclass(frozen=True, slots=True)
+class BotConfig:
+    '''
+    The contents of the bot config file, checked against the field types and bounds below when loaded.
+
+    Instances are immutable, so a reloaded config is swapped in by replacing the reference to it.
+    `guild_overrides` is resolved once at load into complete GuildSettings per guild, so `for_guild`
+    is a single dict lookup.
+    '''
+    bot_owner_id: str
+    timeout_mins: int = field(metadata={'min': 1})
+    delete_after_time_secs: int = field(metadata={'min': 0})
+    debug_scope: int
+    label_max_len: int = field(metadata={'min': 1})
+    dm_max_concurrency: int = field(metadata={'min': 1})
+    dm_max_retries: int = field(metadata={'min': 0})
+    dm_retry_base_secs: float = field(metadata={'min': 0})
+    dm_retry_max_secs: float = field(metadata={'min': 0})
+    dm_cache_max_size: int = field(metadata={'min': 1})
+    dm_cache_ttl_mins: float = field(metadata={'min': 0})
+    allowDmsInstructionsFilePaths: Tuple[str, ...]
+    helpFilePath: str
+    removed_candidates_db_path: str
+    role_presets_db_path: str
+    selection_history_db_path: str
+    outbound_queue_db_path: str
+    fairness_half_life_hours: float = field(metadata={'min': 0.001})
+    lazy_extension_imports: bool
+    startup_report_path: str
+    api_base_url: Optional[str]
+    metrics_port: Optional[int] = field(metadata={'min': 1})
+    log_path: str
+    log_max_bytes: int = field(metadata={'min': 1})
+    log_backup_count: int = field(metadata={'min': 0})
+    log_to_stdout: bool
+    config_reload_interval_secs: float = field(metadata={'min': 0})
+    total_shards: int = field(metadata={'min': 1})
+    shutdown_snapshot_path: str
+    shutdown_drain_timeout_secs: float = field(metadata={'min': 0})
+    cache_profile: str = field(metadata={'choices': CACHE_PROFILES})
+    lean_cache_max_size: int = field(metadata={'min': 1})
+    guild_overrides: Mapping[int, GuildSettings] = field(default_factory=lambda: MappingProxyType({}))
+    default_guild_settings: GuildSettings = field(init=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, 'default_guild_settings', GuildSettings(
+            delete_after_time_secs=self.delete_after_time_secs,
+            timeout_mins=self.timeout_mins,
+            label_max_len=self.label_max_len,
+        ))
+
+    def for_guild(self, guild_id: Optional[int]) -> GuildSettings:
+        '''
+        Returns the settings of `guild_id`, i.e. the top-level values with its overrides applied
+        '''
+        if guild_id is None:
+            return self.default_guild_settings
+        return self.guild_overrides.get(int(guild_id), self.default_guild_settings)
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any]) -> "BotConfig":
+        '''
+        Raises:
+            ValueError: Listing every missing, unknown or invalid key
+        '''
+        problems: List[str] = []
+        values = _validated(cls, raw, problems, allow_missing=('guild_overrides',))
+
+        guild_overrides: Dict[int, GuildSettings] = {}
+        raw_overrides = raw.get('guild_overrides', {})
+        if not isinstance(raw_overrides, dict):
+            problems.append("guild_overrides: must be an object keyed by guild id")
+            raw_overrides = {}
+        # Overrides are layered on the top-level values, so they can only be checked once those are valid
+        settings_names = [settings_field.name for settings_field in fields(GuildSettings)]
+        if any(name not in values for name in settings_names):
+            raw_overrides = {}
+        for guild_id, overrides in raw_overrides.items():
+            if not str(guild_id).isdigit() or not isinstance(overrides, dict):
+                problems.append(f"guild_overrides.{guild_id}: must be a guild id mapped to an object")
+                continue
+            merged = {name: values[name] for name in settings_names}
+            merged.update(overrides)
+            guild_problems: List[str] = []
+            guild_values = _validated(GuildSettings, merged, guild_problems)
+            problems += [f"guild_overrides.{guild_id}.{problem}" for problem in guild_problems]
+            if len(guild_problems) == 0:
+                guild_overrides[int(guild_id)] = GuildSettings(**guild_values)
+
+        if len(problems) > 0:
+            raise ValueError("Invalid bot config:\n- " + "\n- ".join(problems))
+
+        values['allowDmsInstructionsFilePaths'] = tuple(values['allowDmsInstructionsFilePaths'])
+        values['guild_overrides'] = MappingProxyType(guild_overrides)
+        return cls(**values)
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "BotConfig":
+        return cls.from_dict(load_bot_config(filepath))
+
+
+def _validated(config_cls: type, raw: Dict[str, Any], problems: List[str], allow_missing: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    '''
+    Checks `raw` against the fields of `config_cls`, appending a message to `problems` for every
+    missing, unknown or invalid key, and returns the values of its plain fields
+    '''
+    if not isinstance(raw, dict):
+        problems.append("must be a JSON object")
+        return {}
+
+    hints = typing.get_type_hints(config_cls)
+    known = {config_field.name for config_field in fields(config_cls) if config_field.init}
+    problems += [f"{key}: unknown key" for key in raw.keys() - known]
+
+    values: Dict[str, Any] = {}
+    for config_field in fields(config_cls):
+        if not config_field.init or config_field.name in allow_missing:
+            continue
+        if config_field.name not in raw:
+            problems.append(f"{config_field.name}: missing")
+            continue
+        value = raw[config_field.name]
+        if not _has_type(value, hints[config_field.name]):
+            problems.append(f"{config_field.name}: expected {_type_name(hints[config_field.name])}, got {value!r}")
+            continue
+        minimum = config_field.metadata.get('min')
+        if minimum is not None and value is not None and value < minimum:
+            problems.append(f"{config_field.name}: must be at least {minimum}, got {value!r}")
+            continue
+        choices = config_field.metadata.get('choices')
+        if choices is not None and value not in choices:
+            problems.append(f"{config_field.name}: must be one of {', '.join(choices)}, got {value!r}")
+            continue
+        values[config_field.name] = value
+    return values
+
+
+def _has_type(value: Any, expected: Any) -> bool:
+    origin = typing.get_origin(expected)
+    if origin in (typing.Union, types.UnionType):
+        return any(_has_type(value, arg) for arg in typing.get_args(expected))
+    if origin is tuple:
+        item_type = typing.get_args(expected)[0]
+        return isinstance(value, list) and all(_has_type(item, item_type) for item in value)
+    if expected is type(None):
+        return value is None
+    # JSON has no separate bool type, so keep true/false from passing as numbers
+    if isinstance(value, bool):
+        return expected is bool
+    if expected is float:
+        return isinstance(value, (int, float))
+    return isinstance(value, expected)
+
+
+def _type_name(expected: Any) -> str:
+    origin = typing.get_origin(expected)
+    if origin in (typing.Union, types.UnionType):
+        return " or ".join(_type_name(arg) for arg in typing.get_args(expected))
+    if origin is tuple:
+        return f"list of {_type_name(typing.get_args(expected)[0])}"
+    if expected is type(None):
+        return "null"
+    return expected.__name__
@@ -0,0 +1,90 @@
+'''
+Gateway intents and client caches of the bot's cache profiles
+'''
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from interactions import Intents
+from interactions.client.utils.cache import TTLCache
+
+CACHE_PROFILES = ('default', 'lean')
+
+# The lean profile still caches a few messages and roles, e.g. for the paginator's message edits
+LEAN_MESSAGE_CACHE_SIZE = 50
+LEAN_ROLE_CACHE_SIZE = 250
+LEAN_CACHE_TTL_SECS = 600
+
+# How many pinned entries an insert steps over looking for one to evict, so it stays O(1) when most are pinned
+EVICTION_SCAN_LIMIT = 8
+
+
+class PinnedLRUCache(OrderedDict):
+    '''
+    A dict that evicts its least recently used entries past `max_size`, except the ones `is_pinned` holds on to.
+
+    Stands in for the client's unbounded member and user caches. Pinning the people in voice channels keeps
+    candidate pools and DMs resolving from the cache, while everyone else is dropped after a while and
+    fetched again on demand.
+    '''
+
+    def __init__(self, max_size: int, is_pinned: Callable[[Hashable], bool]) -> None:
+        super().__init__()
+        self.max_size: int = max_size
+        self.is_pinned: Callable[[Hashable], bool] = is_pinned
+        self.evictions: int = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.max_size:
+            self._evict()
+
+    def _evict(self) -> None:
+        for _ in range(EVICTION_SCAN_LIMIT):
+            if len(self) <= self.max_size:
+                return
+            key = next(iter(self))
+            if self.is_pinned(key):
+                self.move_to_end(key)
+            else:
+                super().__delitem__(key)
+                self.evictions += 1
+
+
+def client_intents(profile: str) -> Intents:
+    '''
+    The lean profile only subscribes to guild and voice state events, which is all the commands react to
+    '''
+    if profile == 'lean':
+        return Intents.GUILDS | Intents.GUILD_VOICE_STATES
+    return Intents(Intents.DEFAULT + Intents.new(message_content=True))
+
+
+def client_cache_options(profile: str, max_size: int, in_voice: Callable[[int], bool]) -> Dict[str, Any]:
+    '''
+    Returns the cache keyword arguments of interactions.Client for `profile`
+
+    Args:
+        profile (str): One of CACHE_PROFILES
+        max_size (int): How many members, and how many users, the lean profile keeps besides the ones in voice channels
+        in_voice (Callable[[int], bool]): Whether a user id is in a voice channel
+
+    Returns:
+        Dict[str, Any]: Nothing for the default profile, i.e. the library's caches
+    '''
+    if profile != 'lean':
+        return {}
+    return {
+        # Keyed by (guild_id, user_id)
+        'member_cache': PinnedLRUCache(max_size, lambda key: in_voice(key[1])),
+        'user_cache': PinnedLRUCache(max_size, in_voice),
+        'message_cache': TTLCache(ttl=LEAN_CACHE_TTL_SECS, soft_limit=0, hard_limit=LEAN_MESSAGE_CACHE_SIZE),
+        'role_cache': TTLCache(ttl=LEAN_CACHE_TTL_SECS, soft_limit=0, hard_limit=LEAN_ROLE_CACHE_SIZE),
+    }
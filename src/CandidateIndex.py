@@ -0,0 +1,84 @@
+'''
+Incrementally maintained candidate pools of voice channels
+'''
+
+from typing import Dict, Set, Tuple
+
+from interactions import GuildVoice, Member
+
+from src.RemovedCandidatesStore import RemovedCandidatesStore
+
+
+class CandidateIndex:
+    '''
+    Tracks the eligible members of each voice channel, i.e. its voice members minus its removed candidates.
+
+    A channel is seeded from `voice_channel.voice_members` the first time its pool is requested,
+    then kept up to date from voice events and candidate-pool changes instead of being re-filtered
+    on every command. Pools are handed out as immutable tuples that are rebuilt only after the
+    channel changes, so a command can hold on to one consistent snapshot.
+    '''
+
+    def __init__(self, removed_candidates: RemovedCandidatesStore) -> None:
+        self._removed_candidates: RemovedCandidatesStore = removed_candidates
+        self._eligible: Dict[int, Dict[int, Member]] = {}
+        self._snapshots: Dict[int, Tuple[Member, ...]] = {}
+        self._generation: int = removed_candidates.generation
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._eligible
+
+    def channel_ids(self) -> Set[int]:
+        return set(self._eligible)
+
+    def snapshot(self, voice_channel: GuildVoice) -> Tuple[Member, ...]:
+        '''
+        Returns the candidate pool of `voice_channel`
+
+        Args:
+            voice_channel (GuildVoice): The voice channel
+
+        Returns:
+            Tuple[Member, ...]: The eligible members of the channel
+        '''
+        # Another shard process changed the removed candidates, so every pool has to be re-seeded
+        self._removed_candidates.sync()
+        if self._removed_candidates.generation != self._generation:
+            self._generation = self._removed_candidates.generation
+            self._eligible.clear()
+            self._snapshots.clear()
+
+        if voice_channel.id not in self._eligible:
+            removed = self._removed_candidates[voice_channel.id]
+            self._eligible[voice_channel.id] = {
+                member.id: member for member in voice_channel.voice_members
+                if member is not None and member.id not in removed
+            }
+
+        snapshot = self._snapshots.get(voice_channel.id)
+        if snapshot is None:
+            snapshot = tuple(self._eligible[voice_channel.id].values())
+            self._snapshots[voice_channel.id] = snapshot
+        return snapshot
+
+    def member_joined(self, channel_id: int, member: Member) -> None:
+        eligible = self._eligible.get(channel_id)
+        if eligible is not None and member.id not in self._removed_candidates[channel_id]:
+            eligible[member.id] = member
+            self._snapshots.pop(channel_id, None)
+
+    def member_removed(self, channel_id: int, member_id: int) -> None:
+        '''
+        Drops `member_id` from the pool of `channel_id`, whether they left the channel
+        or were removed from the candidate pool
+        '''
+        eligible = self._eligible.get(channel_id)
+        if eligible is not None and eligible.pop(member_id, None) is not None:
+            self._snapshots.pop(channel_id, None)
+
+    def drop_channel(self, channel_id: int) -> None:
+        '''
+        Forgets `channel_id`. It will be re-seeded from its voice members the next time it's requested
+        '''
+        self._eligible.pop(channel_id, None)
+        self._snapshots.pop(channel_id, None)
@@ -0,0 +1,96 @@
+'''
+Expires the candidate-pool state of voice channels that have been left idle
+'''
+
+import asyncio
+import heapq
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class ChannelExpiryScheduler:
+    '''
+    Calls `on_expire(channel_id)` once a channel has been idle for `timeout_secs`.
+
+    Deadlines live in a min-heap and a single event-loop timer is armed for the earliest one,
+    so each wake-up only touches the channels that actually expired. Rescheduled or cancelled
+    channels leave stale heap entries behind, which are skipped when popped and compacted away
+    once they outnumber the live ones.
+    '''
+
+    def __init__(self, timeout_secs: float, on_expire: Callable[[int], None]) -> None:
+        self.timeout_secs: float = timeout_secs
+        self.on_expire: Callable[[int], None] = on_expire
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, channel_id: int) -> bool:
+        return channel_id in self._deadlines
+
+    def schedule(self, channel_id: int, timeout_secs: Optional[float] = None) -> None:
+        '''
+        (Re)starts the idle countdown of `channel_id`, which lasts `timeout_secs` (default: `self.timeout_secs`)
+        '''
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout_secs if timeout_secs is None else timeout_secs)
+        self._deadlines[channel_id] = deadline
+        heapq.heappush(self._heap, (deadline, channel_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(live_deadline, live_id) for live_id, live_deadline in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        self._arm(loop)
+
+    def cancel(self, channel_id: int) -> None:
+        '''
+        Stops the idle countdown of `channel_id`, e.g. because someone joined it
+        '''
+        self._deadlines.pop(channel_id, None)
+
+    def remaining_secs(self) -> Dict[int, float]:
+        '''
+        Returns how long each pending channel has left before it expires, e.g. to carry it over a restart
+        '''
+        now = asyncio.get_running_loop().time()
+        return {channel_id: max(deadline - now, 0.0) for channel_id, deadline in self._deadlines.items()}
+
+    def expire_due(self, now: float) -> List[int]:
+        '''
+        Expires every channel whose deadline is at or before `now`
+
+        Args:
+            now (float): The current event loop time
+
+        Returns:
+            List[int]: The ids of the expired channels
+        '''
+        expired: List[int] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, channel_id = heapq.heappop(self._heap)
+            if self._deadlines.get(channel_id) == deadline:
+                del self._deadlines[channel_id]
+                self.on_expire(channel_id)
+                expired.append(channel_id)
+        return expired
+
+    def _arm(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Skip stale entries so the timer is armed for a live deadline
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            return
+
+        next_deadline = self._heap[0][0]
+        if self._timer is not None:
+            if self._timer.when() <= next_deadline:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_at(next_deadline, self._fire, loop)
+
+    def _fire(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._timer = None
+        self.expire_due(loop.time())
+        self._arm(loop)
@@ -0,0 +1,78 @@
+'''
+Serializes and deduplicates commands that act on the same voice channel
+'''
+
+import asyncio
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class ChannelLockManager:
+    '''
+    Hands out one asyncio.Lock per voice channel and coalesces identical in-flight requests.
+
+    Locks are only weakly referenced, so a channel's lock is garbage-collected as soon as
+    nobody holds or waits on it, and memory stays bounded by the number of busy channels.
+    '''
+
+    def __init__(self) -> None:
+        self._locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._inflight: Dict[Tuple[int, Hashable], asyncio.Event] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def lock(self, channel_id: int) -> asyncio.Lock:
+        '''
+        Returns the lock of `channel_id`. Keep a reference to it for as long as it's needed.
+        '''
+        lock = self._locks.get(channel_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[channel_id] = lock
+        return lock
+
+    def is_inflight(self, channel_id: int, request_key: Hashable) -> bool:
+        '''
+        Returns whether a `run` of an identical request is queued or running, i.e. whether `run` would coalesce
+        '''
+        return (channel_id, request_key) in self._inflight
+
+    async def run(self,
+                  channel_id: int,
+                  request_key: Hashable,
+                  request: Callable[[], Awaitable[Any]],
+                  on_queued: Optional[Callable[[], Awaitable[Any]]] = None) -> Tuple[Any, bool]:
+        '''
+        Runs `request` while holding the lock of `channel_id`.
+
+        If an identical request (same channel and `request_key`) is already queued or running,
+        `request` is not run at all. The call instead waits for the first one to finish.
+
+        Args:
+            channel_id (int): The voice channel the request acts on
+            request_key (Hashable): Identifies the request, e.g. the command name and its options
+            request (Callable[[], Awaitable[Any]]): Starts the request
+            on_queued (Optional[Callable[[], Awaitable[Any]]]): Called once the request is known not to be coalesced,
+            before it waits for the lock, e.g. to acknowledge an interaction
+
+        Returns:
+            Tuple[Any, bool]: The result of `request` (None if coalesced), and whether the call was coalesced
+        '''
+
+        key = (channel_id, request_key)
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            await inflight.wait()
+            return None, True
+
+        done = asyncio.Event()
+        self._inflight[key] = done
+        try:
+            if on_queued is not None:
+                await on_queued()
+            async with self.lock(channel_id):
+                return await request(), False
+        finally:
+            del self._inflight[key]
+            done.set()
@@ -0,0 +1,73 @@
+'''
+Reloads the bot config when its file changes
+'''
+
+import asyncio
+import os
+from typing import Callable, Optional, Tuple
+
+from src.BotConfig import BotConfig
+from src.StructuredLogger import get_logger
+
+logger = get_logger('config')
+
+
+class ConfigWatcher:
+    '''
+    Polls the config file's mtime and size every `interval_secs`, and passes a freshly validated BotConfig
+    to `on_change` whenever they change.
+
+    A file that fails to load or validate (e.g. one caught half-written) is logged and otherwise ignored,
+    so the running config stays in place and the file is retried on the next poll.
+    '''
+
+    def __init__(self, filepath: str, interval_secs: float, on_change: Callable[[BotConfig], None]) -> None:
+        self.filepath: str = filepath
+        self.interval_secs: float = interval_secs
+        self.on_change: Callable[[BotConfig], None] = on_change
+        self._stamp: Optional[Tuple[int, int]] = self._current_stamp()
+        self._failed_stamp: Optional[Tuple[int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _current_stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.filepath)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def check(self) -> bool:
+        '''
+        Reloads the config if the file changed since it was last loaded
+
+        Returns:
+            bool: Whether a new config was swapped in
+        '''
+        stamp = self._current_stamp()
+        if stamp is None or stamp == self._stamp or stamp == self._failed_stamp:
+            return False
+
+        try:
+            config = BotConfig.from_file(self.filepath)
+        except (OSError, ValueError) as err:
+            self._failed_stamp = stamp
+            logger.error("Not reloading the bot config", extra={"path": self.filepath, "error": str(err)})
+            return False
+
+        self._stamp = stamp
+        self.on_change(config)
+        return True
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_secs)
+            self.check()
+
+    def start(self) -> None:
+        if self._task is None and self.interval_secs > 0:
+            self._task = asyncio.create_task(self._poll())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,91 @@
+'''
+Bounded cache of members' DM channels
+'''
+
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from interactions import DMChannel, Member
+
+
+class DMChannelCache:
+    '''
+    LRU cache of DM channels keyed by user id, with entries expiring after `ttl_secs`
+
+    It sits in front of the library's own cache, which keeps the DM channel of every user it has seen for as long
+    as the process runs. An entry missing or expired here is taken from the library's cache when it's there, so
+    `misses` only counts the lookups that went to Discord. `force` skips both layers.
+    '''
+
+    def __init__(self, max_size: int = 256, ttl_secs: float = 3600) -> None:
+        self.max_size: int = max_size
+        self.ttl_secs: float = ttl_secs
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self._entries: "OrderedDict[int, Tuple[float, DMChannel]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, user_id: int) -> Optional[DMChannel]:
+        '''
+        Returns the cached DM channel of `user_id`, or None if it's missing or expired
+        '''
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+
+        expires_at, dm_channel = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return None
+
+        self._entries.move_to_end(user_id)
+        return dm_channel
+
+    def put(self, user_id: int, dm_channel: DMChannel) -> None:
+        self._entries[user_id] = (time.monotonic() + self.ttl_secs, dm_channel)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    async def fetch_dm(self, member: Member, force: bool = False) -> DMChannel:
+        '''
+        Returns the DM channel of `member`, only hitting Discord if neither this cache nor the library's has it
+
+        Args:
+            member (Member): The member to DM
+            force (bool): Skip both caches and fetch the channel from Discord
+
+        Returns:
+            DMChannel: The member's DM channel
+        '''
+
+        dm_channel = None if force else self.get(member.id)
+        if dm_channel is None and not force:
+            dm_channel = member.user.get_dm()
+            if dm_channel is not None:
+                self.put(member.id, dm_channel)
+        if dm_channel is not None:
+            self.hits += 1
+            return dm_channel
+
+        self.misses += 1
+        dm_channel = await member.user.fetch_dm(force=force)
+        self.put(member.id, dm_channel)
+        return dm_channel
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,390 @@
+'''
+Queued, retried delivery of DMs to multiple members
+'''
+
+import asyncio
+import contextvars
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import aiohttp
+from interactions import Message, Member, DMChannel
+from interactions.client.errors import HTTPException
+
+from src.DMChannelCache import DMChannelCache
+from src.Metrics import Metrics, current_handler
+from src.OutboundQueue import OutboundJob, OutboundQueue, SEND, DONE, BLOCKED, FAILED
+from src.StructuredLogger import get_logger, trace_id
+
+logger = get_logger('dm')
+
+DM_BLOCKED_TEXT = 'Cannot send messages to this user'
+UNKNOWN_CHANNEL_CODE = 10003
+
+
+def retry_after_secs(err: HTTPException, default: float = 1.0) -> float:
+    '''
+    Extracts how long Discord asked us to wait from a 429 response
+
+    Args:
+        err (HTTPException): The rate-limited exception
+        default (float): Fallback wait if the response has no usable header
+
+    Returns:
+        float: Seconds to wait before retrying
+    '''
+    try:
+        return float(err.response.headers.get('Retry-After', default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+
+def backoff_secs(attempt: int, base_secs: float, max_secs: float) -> float:
+    '''
+    Exponential backoff with full jitter, so jobs that failed together don't all retry together
+    '''
+    return random.uniform(0, min(max_secs, base_secs * 2 ** attempt))
+
+
+class DeliveryResult(NamedTuple):
+    '''
+    How a batch of DMs settled
+    '''
+    sent: List[Message]
+    # The ids of the members that don't accept DMs from this server
+    dms_closed: List[int]
+    # The ids of the members, or for deletes the messages, that still failed after every retry
+    failed: List[int]
+
+
+class _Batch:
+    def __init__(self, size: int, on_sent: Optional[Callable[[], None]]) -> None:
+        self.remaining: int = size
+        self.on_sent: Optional[Callable[[], None]] = on_sent
+        # The workers deliver on the command's behalf, so its API calls and logs are booked under it
+        self.trace_id: Optional[str] = trace_id.get()
+        self.handler: Optional[str] = current_handler.get()
+        self.result = DeliveryResult(sent=[], dms_closed=[], failed=[])
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class DMDispatcher:
+    '''
+    Delivers DMs through a durable OutboundQueue, with at most `max_concurrency` requests in flight.
+
+    Every command's DMs are enqueued as one batch, and the command awaits that batch's future for the
+    result. Workers take role DMs before deletes. A job that hits a 5xx or a network error is retried
+    up to `max_retries` times with jittered exponential backoff, so a flaky moment doesn't abort a game.
+
+    Per-route and global rate-limit buckets are tracked by the library's HTTP client.
+    If a 429 still makes it through, every worker pauses for the requested `Retry-After`
+    before the job is retried, so one bucket overflowing doesn't snowball into more 429s.
+
+    DM channels are looked up through `dm_channel_cache`. A cached channel that Discord
+    no longer recognises is dropped and re-fetched once.
+
+    The queue's SQLite writes run on one dedicated thread, so a large fan-out doesn't stall the event loop on fsyncs.
+
+    `dms_closed` remembers the ids of members whose DMs were closed on their last send.
+    '''
+
+    def __init__(self,
+                 dm_channel_cache: DMChannelCache,
+                 metrics: Metrics,
+                 queue: OutboundQueue,
+                 delete_message: Callable[[int, int], Awaitable[None]],
+                 max_concurrency: int = 5,
+                 max_retries: int = 3,
+                 retry_base_secs: float = 1.0,
+                 retry_max_secs: float = 30.0) -> None:
+        '''
+        Args:
+            delete_message (Callable[[int, int], Awaitable[None]]): Deletes a message by channel id and message id,
+            which is all a delete queued by an earlier run has to go on
+        '''
+        self.dm_channel_cache: DMChannelCache = dm_channel_cache
+        self.metrics: Metrics = metrics
+        self.queue: OutboundQueue = queue
+        self.delete_message: Callable[[int, int], Awaitable[None]] = delete_message
+        self.max_concurrency: int = max_concurrency
+        self.max_retries: int = max_retries
+        self.retry_base_secs: float = retry_base_secs
+        self.retry_max_secs: float = retry_max_secs
+        self.dms_closed: Set[int] = set()
+        self._not_rate_limited = asyncio.Event()
+        self._not_rate_limited.set()
+        self._work_available = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._batches: Dict[int, _Batch] = {}
+        # Batch ids are handed out here, so a batch is registered before any worker can claim its jobs
+        self._next_batch_id: int = queue.next_batch_id()
+        # Keyed by (batch_id, user_id). Only the sends of this run are ever attempted, so their members don't need to be on disk
+        self._members: Dict[Tuple[int, int], Member] = {}
+        self._refetch: Set[int] = set()
+        self._started: bool = False
+        self._db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='outbound-queue')
+
+    def recover(self) -> None:
+        '''
+        Takes over the jobs an earlier run left in the queue, rolling back the games it didn't finish sending.
+        Only safe before any worker ran, since it treats every job in the queue as abandoned.
+
+        Raises:
+            RuntimeError: If workers are already delivering from the queue
+        '''
+        if any(not worker.done() for worker in self._workers):
+            raise RuntimeError("Can't recover the outbound DM queue while its workers are running")
+        abandoned, queued = self.queue.recover()
+        self._next_batch_id = self.queue.next_batch_id()
+        if abandoned > 0 or queued > 0:
+            logger.info("Recovered the outbound DM queue", extra={"abandoned_sends": abandoned, "queued_jobs": queued})
+
+    async def _in_db_thread(self, method: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._db_thread, functools.partial(method, *args, **kwargs))
+
+    def start(self) -> None:
+        '''
+        Starts the workers, so the deletes taken over by `recover` go out without waiting for a command.
+        Only the first call does anything.
+        '''
+        if self._started:
+            return
+        self._started = True
+        self._ensure_workers()
+
+    async def stop(self) -> None:
+        '''
+        Stops the workers. Jobs they didn't get to stay in the queue for the next start.
+        '''
+        workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def _ensure_workers(self) -> None:
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.max_concurrency:
+            # A fresh context, rather than a copy of whichever command or listener happened to start the worker
+            self._workers.append(asyncio.create_task(self._work(), context=contextvars.Context()))
+        self._work_available.set()
+
+    async def _work(self) -> None:
+        while True:
+            # Lets `max_concurrency` be lowered by a config reload
+            if len(self._workers) > self.max_concurrency:
+                if asyncio.current_task() in self._workers:
+                    self._workers.remove(asyncio.current_task())
+                return
+
+            await self._not_rate_limited.wait()
+            # Cleared before looking, so a job enqueued in between still wakes this worker up
+            self._work_available.clear()
+            job = await self._in_db_thread(self.queue.claim, time.time())
+            if job is None:
+                next_due = await self._in_db_thread(self.queue.next_due)
+                timeout = None if next_due is None else max(0.0, next_due - time.time())
+                try:
+                    await asyncio.wait_for(self._work_available.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Another idle worker may be able to take the next job
+            self._work_available.set()
+            batch = self._batches.get(job.batch_id)
+            trace_token = trace_id.set(batch.trace_id if batch is not None else None)
+            handler_token = current_handler.set(batch.handler if batch is not None else None)
+            try:
+                await self._attempt(job)
+            finally:
+                trace_id.reset(trace_token)
+                current_handler.reset(handler_token)
+
+    async def _pause_for(self, secs: float) -> None:
+        logger.warning("Rate limited, pausing every DM worker", extra={"retry_after_secs": secs})
+        self.metrics.record_rate_limit_wait(secs)
+        self._not_rate_limited.clear()
+        try:
+            await asyncio.sleep(secs)
+        finally:
+            self._not_rate_limited.set()
+
+    async def _attempt(self, job: OutboundJob) -> None:
+        try:
+            if job.kind == SEND:
+                await self._send(job)
+            else:
+                await self.delete_message(job.channel_id, job.message_id)
+                logger.info("DM deleted", extra={"message_id": job.message_id})
+                await self._settle(job, DONE)
+        except HTTPException as err:
+            if job.kind == SEND and err.text == DM_BLOCKED_TEXT:
+                logger.info("Member doesn't accept DMs from this server", extra={"member_id": job.user_id})
+                await self._settle(job, BLOCKED)
+            elif job.kind != SEND and err.status == 404:
+                # Already gone, nothing left to roll back
+                await self._settle(job, DONE)
+            elif job.kind == SEND and (err.code == UNKNOWN_CHANNEL_CODE or err.status == 404) and job.job_id not in self._refetch:
+                self.dm_channel_cache.invalidate(job.user_id)
+                logger.info("Cached DM channel is gone, re-fetching it", extra={"member_id": job.user_id})
+                self._refetch.add(job.job_id)
+                await self._retry(job, err, delay_secs=0)
+            elif err.status == 429:
+                await self._pause_for(retry_after_secs(err))
+                await self._retry(job, err, delay_secs=0)
+            elif err.status >= 500:
+                await self._retry(job, err)
+            else:
+                logger.warning("Giving up on a DM job", extra={"job_id": job.job_id, "kind": job.kind, "status": err.status})
+                await self._settle(job, FAILED)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            await self._retry(job, err)
+        except Exception:
+            # Settled anyway, otherwise the command waiting on this job's batch would never hear back
+            logger.exception("Unexpected error delivering a DM job", extra={"job_id": job.job_id, "kind": job.kind})
+            await self._settle(job, FAILED)
+
+    async def _send(self, job: OutboundJob) -> None:
+        member = self._members[(job.batch_id, job.user_id)]
+        dm_channel: DMChannel = await self.dm_channel_cache.fetch_dm(member, force=job.job_id in self._refetch)
+        msg = await dm_channel.send(job.content)
+        logger.info("DM sent", extra={"member_id": member.id, "message_id": msg.id, "attempt": job.attempts})
+        await self._settle(job, DONE, msg=msg, channel_id=dm_channel.id)
+
+    async def _retry(self, job: OutboundJob, err: Exception, delay_secs: Optional[float] = None) -> None:
+        if job.attempts >= self.max_retries:
+            logger.warning("Giving up on a DM job after retrying it",
+                           extra={"job_id": job.job_id, "kind": job.kind, "attempts": job.attempts + 1, "error": repr(err)})
+            await self._settle(job, FAILED)
+            return
+
+        if delay_secs is None:
+            delay_secs = backoff_secs(job.attempts, self.retry_base_secs, self.retry_max_secs)
+        logger.info("Retrying a DM job", extra={"job_id": job.job_id, "kind": job.kind, "attempt": job.attempts,
+                                                "delay_secs": delay_secs, "error": repr(err)})
+        await self._in_db_thread(self.queue.retry, job.job_id, time.time() + delay_secs)
+        self._work_available.set()
+
+    async def _settle(self, job: OutboundJob, status: str, msg: Optional[Message] = None, channel_id: Optional[int] = None) -> None:
+        self._refetch.discard(job.job_id)
+        self._members.pop((job.batch_id, job.user_id), None)
+        if job.kind == SEND and status == DONE:
+            self.dms_closed.discard(job.user_id)
+        elif job.kind == SEND and status == BLOCKED:
+            self.dms_closed.add(job.user_id)
+
+        batch = self._batches.get(job.batch_id)
+        if batch is None:
+            # Left behind by an earlier run, so nobody is waiting on it
+            await self._in_db_thread(self.queue.forget_job, job.job_id)
+            return
+
+        if status == DONE and msg is not None:
+            batch.result.sent.append(msg)
+            if batch.on_sent is not None:
+                batch.on_sent()
+        elif status == BLOCKED:
+            batch.result.dms_closed.append(job.user_id)
+        elif status == FAILED:
+            batch.result.failed.append(job.user_id if job.kind == SEND else job.message_id)
+
+        # Counted down before the write is handed to the DB thread, so exactly one job sees its batch finish
+        # and that batch's writes reach the thread in order
+        batch.remaining -= 1
+        if batch.remaining > 0:
+            await self._in_db_thread(self.queue.finish, job.job_id, status,
+                                     channel_id=channel_id, message_id=msg.id if msg is not None else None)
+            return
+
+        del self._batches[job.batch_id]
+        # Nobody needs to know how the last job went once its batch is done with
+        await self._in_db_thread(self.queue.forget_batch, job.batch_id)
+        if not batch.future.done():
+            batch.future.set_result(batch.result)
+
+    def _new_batch(self, size: int, on_sent: Optional[Callable[[], None]]) -> Tuple[int, _Batch]:
+        batch_id = self._next_batch_id
+        self._next_batch_id += 1
+        batch = _Batch(size, on_sent)
+        if size == 0:
+            batch.future.set_result(batch.result)
+        else:
+            self._batches[batch_id] = batch
+        return batch_id, batch
+
+    async def submit_sends(self,
+                           memKeys: List[int],
+                           msgDict: Dict,
+                           on_sent: Optional[Callable[[], None]] = None) -> asyncio.Future:
+        '''
+        Queues a DM to each of `memKeys` as one batch, written to the queue in a single transaction
+
+        Returns:
+            asyncio.Future: Resolves to the batch's DeliveryResult once every DM settled
+        '''
+        batch_id, batch = self._new_batch(len(memKeys), on_sent)
+        if len(memKeys) > 0:
+            for memKey in memKeys:
+                self._members[(batch_id, memKey)] = msgDict[memKey]["member_obj"]
+            await self._in_db_thread(self.queue.enqueue_sends, batch_id,
+                                     [(memKey, msgDict[memKey]["message_to_send"]) for memKey in memKeys])
+            self._ensure_workers()
+        return batch.future
+
+    async def submit_deletes(self, messages: List[Message]) -> asyncio.Future:
+        '''
+        Queues the deletion of already-sent DMs as one batch, written to the queue in a single transaction
+
+        Returns:
+            asyncio.Future: Resolves to the batch's DeliveryResult once every delete settled
+        '''
+        batch_id, batch = self._new_batch(len(messages), None)
+        if len(messages) > 0:
+            await self._in_db_thread(self.queue.enqueue_deletes, batch_id, [(msg._channel_id, msg.id) for msg in messages])
+            self._ensure_workers()
+        return batch.future
+
+    async def send_all(self,
+                       msgDict: Dict,
+                       on_sent: Optional[Callable[[], None]] = None) -> DeliveryResult:
+        '''
+        Sends every message in `msgDict` and waits for all of them to settle.
+
+        Members known to have DMs closed are tried first. If any of them still can't be
+        reached, nobody else is messaged, so the usual failure case leaves little or
+        nothing to roll back.
+
+        Args:
+            msgDict (Dict): Same format as `GNCommands.__sendMassDM`
+            on_sent (Optional[Callable[[], None]]): Called after each successful send
+
+        Returns:
+            DeliveryResult: The sent messages, the members that don't accept DMs from this server,
+            and the members that couldn't be reached even after retrying
+        '''
+
+        probeKeys = [memKey for memKey in msgDict if memKey in self.dms_closed]
+        restKeys = [memKey for memKey in msgDict if memKey not in self.dms_closed]
+
+        probe: DeliveryResult = await (await self.submit_sends(probeKeys, msgDict, on_sent))
+        if len(probe.dms_closed) > 0 or len(probe.failed) > 0:
+            return probe
+
+        rest: DeliveryResult = await (await self.submit_sends(restKeys, msgDict, on_sent))
+        return DeliveryResult(sent=probe.sent + rest.sent, dms_closed=rest.dms_closed, failed=rest.failed)
+
+    async def delete_all(self, messages: List[Message]) -> DeliveryResult:
+        '''
+        Deletes already-sent DMs, retrying deletes that failed transiently
+
+        Args:
+            messages (List[Message]): The DMs to roll back
+
+        Returns:
+            DeliveryResult: With the ids of the messages that couldn't be deleted as `failed`
+        '''
+
+        return await (await self.submit_deletes(messages))
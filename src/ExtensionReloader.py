@@ -0,0 +1,81 @@
+'''
+Reloads only the extensions whose source changed
+'''
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Tuple
+
+import interactions
+from interactions.models.internal.application_commands import application_commands_to_dict
+
+
+class ExtensionReloader:
+    '''
+    Keeps a content hash of every extension module, so `/update` only reloads the ones that changed.
+
+    Commands are only pushed to Discord when the reloaded extensions actually changed a slash command's
+    signature, instead of once per reloaded extension.
+    '''
+
+    def __init__(self, client: interactions.Client, ext_dir: str = 'ext') -> None:
+        self.client: interactions.Client = client
+        self.ext_dir: str = ext_dir
+        self._hashes: Dict[str, str] = {}
+
+    def _current_hashes(self) -> Dict[str, str]:
+        hashes = {}
+        for ext_fp in sorted(os.listdir(self.ext_dir)):
+            if ext_fp.endswith('.py'):
+                with open(os.path.join(self.ext_dir, ext_fp), mode='rb') as fp:
+                    hashes[f'{self.ext_dir}.{ext_fp[:-3]}'] = hashlib.sha256(fp.read()).hexdigest()
+        return hashes
+
+    def _commands_signature(self) -> str:
+        commands = application_commands_to_dict(self.client.interactions_by_scope, self.client)
+        return hashlib.sha256(json.dumps(commands, sort_keys=True, default=str).encode('UTF-8')).hexdigest()
+
+    def record_loaded(self) -> None:
+        '''
+        Remembers the hashes of the extensions as they are right now, e.g. right after they were first loaded
+        '''
+        self._hashes = self._current_hashes()
+
+    async def reload_changed(self) -> Tuple[List[Tuple[str, float]], bool]:
+        '''
+        Loads new extensions, unloads deleted ones and reloads changed ones
+
+        Returns:
+            Tuple[List[Tuple[str, float]], bool]: The (extension, seconds taken) of every extension that was
+            (re/un)loaded, and whether the slash commands had to be synced with Discord
+        '''
+
+        current = self._current_hashes()
+        signature_before = self._commands_signature()
+        timings: List[Tuple[str, float]] = []
+
+        # Sync at most once at the end, rather than once per extension
+        sync_ext = self.client.sync_ext
+        self.client.sync_ext = False
+        try:
+            for ext in sorted(self._hashes.keys() - current.keys()):
+                start_time = time.perf_counter()
+                self.client.unload_extension(ext)
+                timings.append((ext, time.perf_counter() - start_time))
+                del self._hashes[ext]
+
+            for ext, content_hash in current.items():
+                if self._hashes.get(ext) != content_hash:
+                    start_time = time.perf_counter()
+                    self.client.reload_extension(ext)
+                    timings.append((ext, time.perf_counter() - start_time))
+                    self._hashes[ext] = content_hash
+        finally:
+            self.client.sync_ext = sync_ext
+
+        synced = signature_before != self._commands_signature()
+        if synced:
+            await self.client.synchronise_interactions()
+        return timings, synced
@@ -0,0 +1,85 @@
+'''
+Weighted sampling without replacement in O(log n) per draw
+'''
+
+import random
+from typing import List, Sequence
+
+
+class FenwickSampler:
+    '''
+    Fenwick (binary indexed) tree over non-negative weights.
+
+    Building it is O(n). Each draw finds the item owning a uniformly random point of the total weight by
+    descending the tree, then zeroes that item's weight, so drawing `k` items without replacement is
+    O(k log n) instead of the O(k n) of rebuilding the cumulative weights after every draw.
+    '''
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        self._n: int = len(weights)
+        self._weights: List[float] = [float(weight) for weight in weights]
+        # 1-based tree, built in place in linear time
+        self._tree: List[float] = [0.0] + self._weights
+        for i in range(1, self._n + 1):
+            parent = i + (i & -i)
+            if parent <= self._n:
+                self._tree[parent] += self._tree[i]
+        self._top_bit: int = 1 << (self._n.bit_length() - 1) if self._n > 0 else 0
+
+    def __len__(self) -> int:
+        return self._n
+
+    def total(self) -> float:
+        total = 0.0
+        i = self._n
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _add(self, index: int, delta: float) -> None:
+        i = index + 1
+        while i <= self._n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def set_weight(self, index: int, weight: float) -> None:
+        self._add(index, weight - self._weights[index])
+        self._weights[index] = weight
+
+    def find(self, point: float) -> int:
+        '''
+        Returns the index of the item whose share of the cumulative weight contains `point`
+        '''
+        pos = 0
+        bit = self._top_bit
+        while bit > 0:
+            nxt = pos + bit
+            if nxt <= self._n and self._tree[nxt] <= point:
+                pos = nxt
+                point -= self._tree[nxt]
+            bit >>= 1
+        # Floating point error can land past the last item with any weight left
+        while pos > 0 and (pos >= self._n or self._weights[pos] <= 0):
+            pos -= 1
+        return pos
+
+    def sample(self, k: int, rng: random.Random = random) -> List[int]:
+        '''
+        Draws `k` distinct indices, each draw proportional to the weights of the items not drawn yet.
+        Drawn items keep a weight of 0 afterwards.
+
+        Raises:
+            ValueError: If fewer than `k` items have a positive weight
+        '''
+        if k > sum(1 for weight in self._weights if weight > 0):
+            raise ValueError(f"Cannot draw {k} items, fewer have a positive weight")
+
+        drawn: List[int] = []
+        total = self.total()
+        for _ in range(k):
+            index = self.find(rng.random() * total)
+            total -= self._weights[index]
+            self.set_weight(index, 0.0)
+            drawn.append(index)
+        return drawn
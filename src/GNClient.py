@@ -2,12 +2,51 @@
 Loads in the bot's configuration    
 '''
 
-from typing import Any, Dict
+import asyncio
+import atexit
+import glob
+import importlib
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
 import interactions
-from interactions import Intents, Member, GuildVoice
+from aiohttp import web
+from interactions import Intents, Member, GuildVoice, Listener, SlashCommand
+from interactions.api.http.route import Route
 
-from src.myUtils import load_bot_config, load_txt_file_contents
+from src.myUtils import preload_lazy_modules
+from src.BotConfig import BotConfig, GuildSettings, RESTART_REQUIRED_KEYS
+from src.CacheProfile import client_cache_options, client_intents
+from src.ConfigWatcher import ConfigWatcher
+from src.DMDispatcher import DMDispatcher
+from src.DMChannelCache import DMChannelCache
+from src.OutboundQueue import OutboundQueue
+from src.RemovedCandidatesStore import RemovedCandidatesStore
+from src.RolePresetStore import RolePresetStore
+from src.SelectionHistory import SelectionHistory
+from src.ChannelExpiryScheduler import ChannelExpiryScheduler
+from src.CandidateIndex import CandidateIndex
+from src.ChannelLockManager import ChannelLockManager
+from src.HelpFile import HelpFile
+from src.InstructionAttachments import InstructionAttachments
+from src.ExtensionReloader import ExtensionReloader
+from src.Metrics import Metrics
+from src.ShutdownCoordinator import ShutdownCoordinator
+from src.StructuredLogger import StructuredLogWriter, get_logger, trace_id
+
+logger = get_logger('client')
+
+
+def per_shard_path(path: str, shard_id: int, total_shards: int) -> str:
+    '''
+    Gives each shard process its own copy of a file, e.g. "data/startup_report.json" -> "data/startup_report.shard1.json"
+    '''
+    if total_shards == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard_id}{ext}"
 
 
 class GNClient(interactions.Client):
@@ -19,38 +58,356 @@ class GNClient(interactions.Client):
         self,
         bot_config_path: str,
         token: str,
-        intents: Intents = Intents.DEFAULT,
+        intents: Optional[Intents] = None,
+        shard_id: int = 0,
+        total_shards: int = 1,
         **options: Any,
     ) -> None:
         """...
         """
-        self.bot_config: dict = load_bot_config(bot_config_path)
-        self.delete_after_time_secs: int = self.bot_config['delete_after_time_secs']
-        self.timeout_mins: int = self.bot_config['timeout_mins']
-        self.debug_scope: int = self.bot_config['debug_scope']
-        self.label_max_len: int = self.bot_config['label_max_len']
-        self._removed_candidates: Dict = {}
-        super().__init__(token=token, debug_scope=self.debug_scope, intents=intents, **options)
-
-        self.load_extensions('ext', recursive=True)
-        print('bot about to start')
+        start_time = time.perf_counter()
+        self.started_at: float = time.time()
+        # Replaced as a whole when the file changes, never mutated. Read it through `self.bot_config` every time.
+        self.bot_config: BotConfig = BotConfig.from_file(bot_config_path)
+        self.config_watcher = ConfigWatcher(bot_config_path,
+                                            interval_secs=self.bot_config.config_reload_interval_secs,
+                                            on_change=self.swap_config)
+        self.shard_id: int = shard_id
+        self.log_writer = StructuredLogWriter(path=per_shard_path(self.bot_config.log_path, shard_id, total_shards),
+                                              max_bytes=self.bot_config.log_max_bytes,
+                                              backup_count=self.bot_config.log_backup_count,
+                                              to_stdout=self.bot_config.log_to_stdout)
+        self.log_writer.start()
+        atexit.register(self.log_writer.stop)
+        self.help_file = HelpFile(self.bot_config.helpFilePath)
+        self.allow_dms_instructions = InstructionAttachments(self.bot_config.allowDmsInstructionsFilePaths)
+        self.allow_dms_instructions.preload()
+        self.metrics = Metrics()
+        self._metrics_runner: web.AppRunner = None
+        self._removed_candidates = RemovedCandidatesStore(self.bot_config.removed_candidates_db_path)
+        self.candidate_index = CandidateIndex(self._removed_candidates)
+        self.role_presets = RolePresetStore(self.bot_config.role_presets_db_path)
+        self.selection_history = SelectionHistory(self.bot_config.selection_history_db_path,
+                                                  half_life_secs=self.bot_config.fairness_half_life_hours * 3600)
+        self.channel_locks = ChannelLockManager()
+        self.channel_expiry = ChannelExpiryScheduler(timeout_secs=self.bot_config.timeout_mins * 60,
+                                                     on_expire=self.expire_channel)
+        self.dm_channel_cache = DMChannelCache(max_size=self.bot_config.dm_cache_max_size,
+                                               ttl_secs=self.bot_config.dm_cache_ttl_mins * 60)
+        # Each shard has its own queue, so one shard never rolls back a game another is still sending
+        self.outbound_queue = OutboundQueue(per_shard_path(self.bot_config.outbound_queue_db_path, shard_id, total_shards))
+        self.dm_dispatcher = DMDispatcher(dm_channel_cache=self.dm_channel_cache,
+                                          metrics=self.metrics,
+                                          queue=self.outbound_queue,
+                                          delete_message=lambda channel_id, message_id: self.http.delete_message(channel_id, message_id),
+                                          max_concurrency=self.bot_config.dm_max_concurrency,
+                                          max_retries=self.bot_config.dm_max_retries,
+                                          retry_base_secs=self.bot_config.dm_retry_base_secs,
+                                          retry_max_secs=self.bot_config.dm_retry_max_secs)
+        # Before any worker exists, i.e. once per process
+        self.dm_dispatcher.recover()
+        self.shutdown_coordinator = ShutdownCoordinator()
+        self.restart_report: Optional[Dict] = None
+        self.shutdown_task: Optional[asyncio.Task] = None
+        self._snapshot_path: str = per_shard_path(self.bot_config.shutdown_snapshot_path, shard_id, total_shards)
+        self._resume_snapshot: Optional[Dict] = self.__load_snapshot()
+
+        # Lets the bot run against a local Discord stand-in instead of discord.com.
+        # The gateway URL is whatever that stand-in's /gateway/bot route returns.
+        if self.bot_config.api_base_url is not None:
+            Route.BASE = self.bot_config.api_base_url
+
+        # Every shard registers the same commands, so only one of them pushes them to Discord
+        options.setdefault('sync_interactions', shard_id == 0)
+        # Without explicit intents or caches, the cache profile decides which events and objects the client keeps
+        cache_options = client_cache_options(self.bot_config.cache_profile,
+                                             max_size=self.bot_config.lean_cache_max_size,
+                                             in_voice=lambda user_id: user_id in self.cache.voice_state_cache)
+        options = {**cache_options, **options}
+        super().__init__(token=token,
+                         debug_scope=self.bot_config.debug_scope,
+                         intents=intents if intents is not None else client_intents(self.bot_config.cache_profile),
+                         shard_id=shard_id,
+                         total_shards=total_shards,
+                         **options)
+        self.__count_http_calls()
+
+        extension_timings = self.__load_extensions_profiled('ext')
+        self.extension_reloader = ExtensionReloader(self, 'ext')
+        self.extension_reloader.record_loaded()
+        self.__write_startup_report(extension_timings, time.perf_counter() - start_time)
+        logger.info('bot about to start')
         self.start()
 
+    def __load_extensions_profiled(self, package: str) -> List[Dict]:
+        '''
+        Loads every extension in `package` (recursively) like `load_extensions`, timing the import and setup of each.
+        Heavy dependencies deferred with LazyModule are only imported here if `lazy_extension_imports` is off.
+
+        Returns:
+            List[Dict]: The name, import time and setup time of each extension
+        '''
+        timings: List[Dict] = []
+        for ext_fp in sorted(glob.glob(os.path.join(package, '**', '*.py'), recursive=True)):
+            ext = ext_fp[:-3].replace(os.path.sep, '.')
+
+            import_start = time.perf_counter()
+            importlib.import_module(ext)
+            setup_start = time.perf_counter()
+            self.load_extension(ext)
+            setup_end = time.perf_counter()
+
+            timings.append({
+                "extension": ext,
+                "import_secs": setup_start - import_start,
+                "setup_secs": setup_end - setup_start,
+            })
+
+        if not self.bot_config.lazy_extension_imports:
+            preload_start = time.perf_counter()
+            preload_lazy_modules()
+            timings.append({
+                "extension": "(lazy modules)",
+                "import_secs": time.perf_counter() - preload_start,
+                "setup_secs": 0.0,
+            })
+        return timings
+
+    def __write_startup_report(self, extension_timings: List[Dict], total_secs: float) -> None:
+        report = {
+            "total_secs": total_secs,
+            "lazy_extension_imports": self.bot_config.lazy_extension_imports,
+            "cache_profile": self.bot_config.cache_profile,
+            "extensions": extension_timings,
+        }
+        report_path = per_shard_path(self.bot_config.startup_report_path, self.shard_id, self.total_shards)
+        with open(report_path, mode='w', encoding="UTF-8") as fp:
+            json.dump(report, fp, indent=4)
+        logger.info(f'Loaded {len(extension_timings)} extensions in {total_secs * 1000:.0f} ms, '
+                    f'see {report_path}',
+                    extra={"total_secs": total_secs})
+
+    def __count_http_calls(self) -> None:
+        '''
+        Attributes every REST request to the command or listener it was made for
+        '''
+        request = self.http.request
+
+        async def counted_request(*args, **kwargs):
+            self.metrics.record_http_call()
+            return await request(*args, **kwargs)
+
+        self.http.request = counted_request
+
+    async def _run_slash_command(self, command: SlashCommand, ctx: interactions.InteractionContext) -> Any:
+        # Every record logged while handling this interaction, including from the tasks it starts, carries its id
+        token = trace_id.set(str(ctx.id))
+        try:
+            logger.info(f"/{command.resolved_name} invoked",
+                        extra={"command": command.resolved_name, "user_id": ctx.author_id, "guild_id": ctx.guild_id})
+            if not self.shutdown_coordinator.accepting:
+                self.shutdown_coordinator.reject()
+                logger.info(f"/{command.resolved_name} rejected, the bot is shutting down")
+                await ctx.send("I'm restarting, please try again in a few seconds.", ephemeral=True)
+                return None
+            return await self.shutdown_coordinator.run(
+                self.metrics.run_timed(f"/{command.resolved_name}", super()._run_slash_command(command, ctx))
+            )
+        finally:
+            trace_id.reset(token)
+
+    async def graceful_shutdown(self, before_stop: Optional[Callable[[], Awaitable[Any]]] = None) -> None:
+        '''
+        Stops accepting commands, waits up to `shutdown_drain_timeout_secs` for the running ones (e.g. DM fan-outs)
+        to finish, snapshots the in-memory state that isn't already on disk, then stops the bot.
+
+        Args:
+            before_stop (Optional[Callable[[], Awaitable[Any]]]): Last thing to do while still connected, e.g. deleting a response
+        '''
+        shutdown_started_at = time.time()
+        abandoned = await self.shutdown_coordinator.drain(self.bot_config.shutdown_drain_timeout_secs)
+        logger.info("Drained in-flight commands", extra={"drain_secs": time.time() - shutdown_started_at,
+                                                          "abandoned_commands": abandoned,
+                                                          "rejected_commands": self.shutdown_coordinator.rejected})
+        # Deletes the workers didn't get to are picked up from the outbound queue on the next start
+        await self.dm_dispatcher.stop()
+        self.__write_snapshot(shutdown_started_at, abandoned)
+        if before_stop is not None:
+            await before_stop()
+        await self.stop()
+
+    def __write_snapshot(self, shutdown_started_at: float, abandoned: int) -> None:
+        '''
+        Saves what the next start needs to pick up where this one left off.
+        Candidate pools themselves are already in the removed candidates database.
+        '''
+        snapshot = {
+            "shutdown_started_at": shutdown_started_at,
+            "rejected_commands": self.shutdown_coordinator.rejected,
+            "abandoned_commands": abandoned,
+            "channel_expiry_remaining_secs": {
+                str(channel_id): remaining for channel_id, remaining in self.channel_expiry.remaining_secs().items()
+            },
+            "dms_closed": sorted(self.dm_dispatcher.dms_closed),
+            "allow_dms_instructions": self.allow_dms_instructions.snapshot(),
+        }
+        # Written next to the old one and renamed over it, so a crash can't leave half a snapshot behind
+        tmp_path = f"{self._snapshot_path}.tmp"
+        with open(tmp_path, mode='w', encoding="UTF-8") as fp:
+            json.dump(snapshot, fp)
+        os.replace(tmp_path, self._snapshot_path)
+
+    def __load_snapshot(self) -> Optional[Dict]:
+        '''
+        Restores the state saved by the last graceful shutdown, if there was one.
+        The snapshot is consumed, so a later crash doesn't resume from stale state.
+        '''
+        try:
+            with open(self._snapshot_path, encoding="UTF-8") as fp:
+                snapshot = json.load(fp)
+        except FileNotFoundError:
+            return None
+        except ValueError as err:
+            logger.warning("Ignoring an unreadable shutdown snapshot", extra={"error": str(err)})
+            return None
+        finally:
+            if os.path.exists(self._snapshot_path):
+                os.remove(self._snapshot_path)
+
+        self.dm_dispatcher.dms_closed.update(snapshot["dms_closed"])
+        self.allow_dms_instructions.restore(snapshot["allow_dms_instructions"])
+        return snapshot
+
+    def finish_resume(self) -> None:
+        '''
+        Restarts the idle countdowns carried over from the last shutdown, and reports how long the restart took.
+        Needs the event loop, so it runs once the bot is ready.
+        '''
+        snapshot, self._resume_snapshot = self._resume_snapshot, None
+        if snapshot is None:
+            return
+
+        # The countdowns kept running while the bot was down
+        downtime_secs = self.started_at - snapshot["shutdown_started_at"]
+        for channel_id, remaining in snapshot["channel_expiry_remaining_secs"].items():
+            self.channel_expiry.schedule(int(channel_id), max(remaining - downtime_secs, 0.0))
+
+        self.restart_report = {
+            "restart_to_ready_secs": time.time() - snapshot["shutdown_started_at"],
+            "start_to_ready_secs": time.time() - self.started_at,
+            "dropped_commands": snapshot["rejected_commands"] + snapshot["abandoned_commands"],
+        }
+        logger.info(f"Restarted in {self.restart_report['restart_to_ready_secs']:.1f} s, "
+                    f"{self.restart_report['dropped_commands']} commands dropped", extra=self.restart_report)
+
+    def add_listener(self, listener: Listener) -> None:
+        if not listener.is_default_listener and not getattr(listener.callback, 'is_timed', False):
+            listener.callback = self.metrics.timed(f"listener:{listener.event}", listener.callback)
+        super().add_listener(listener)
+
+    async def start_metrics_endpoint(self) -> None:
+        '''
+        Serves the metrics in Prometheus format on 127.0.0.1:`metrics_port`, if a port is configured.
+        Each shard process listens on `metrics_port + shard_id`.
+        '''
+        if self.bot_config.metrics_port is None or self._metrics_runner is not None:
+            return
+
+        async def serve_metrics(_request: web.Request) -> web.Response:
+            return web.Response(text=self.metrics.render_prometheus(), content_type='text/plain')
+
+        app = web.Application()
+        app.router.add_get('/metrics', serve_metrics)
+        self._metrics_runner = web.AppRunner(app)
+        await self._metrics_runner.setup()
+        await web.TCPSite(self._metrics_runner, host='127.0.0.1', port=self.bot_config.metrics_port + self.shard_id).start()
+
+    def guild_config(self, guild_id: Optional[int]) -> GuildSettings:
+        '''
+        Returns the settings of `guild_id`, with its overrides from the config applied
+        '''
+        return self.bot_config.for_guild(guild_id)
+
+    @property
+    def delete_after_time_secs(self) -> int:
+        return self.bot_config.delete_after_time_secs
+
     @property
-    def removed_candidates(self) -> Dict:
+    def timeout_mins(self) -> int:
+        return self.bot_config.timeout_mins
+
+    @property
+    def label_max_len(self) -> int:
+        return self.bot_config.label_max_len
+
+    def swap_config(self, config: BotConfig) -> None:
+        '''
+        Swaps in a reloaded config and hands its new values to the components that keep their own copy
+        '''
+        previous = self.bot_config
+        self.bot_config = config
+
+        self.channel_expiry.timeout_secs = config.timeout_mins * 60
+        self.dm_dispatcher.max_concurrency = config.dm_max_concurrency
+        self.dm_dispatcher.max_retries = config.dm_max_retries
+        self.dm_dispatcher.retry_base_secs = config.dm_retry_base_secs
+        self.dm_dispatcher.retry_max_secs = config.dm_retry_max_secs
+        self.dm_channel_cache.max_size = config.dm_cache_max_size
+        self.dm_channel_cache.ttl_secs = config.dm_cache_ttl_mins * 60
+        self.selection_history.half_life_secs = config.fairness_half_life_hours * 3600
+        if config.helpFilePath != previous.helpFilePath:
+            self.help_file = HelpFile(config.helpFilePath)
+        if config.allowDmsInstructionsFilePaths != previous.allowDmsInstructionsFilePaths:
+            self.allow_dms_instructions = InstructionAttachments(config.allowDmsInstructionsFilePaths)
+            self.allow_dms_instructions.preload()
+
+        needs_restart = [key for key in RESTART_REQUIRED_KEYS if getattr(config, key) != getattr(previous, key)]
+        logger.info("Reloaded the bot config", extra={"needs_restart": needs_restart})
+        if len(needs_restart) > 0:
+            logger.warning(f"Restart the bot to apply the new {', '.join(needs_restart)}")
+
+    @property
+    def removed_candidates(self) -> RemovedCandidatesStore:
         return self._removed_candidates
 
     def helpFileContents(self) -> str:
-        return load_txt_file_contents(self.bot_config["helpFilePath"])
+        return self.help_file.contents
 
     def add_removed_candidate(self, member: Member) -> None:
-        if member.voice.channel.id not in self._removed_candidates:
-            self._removed_candidates[member.voice.channel.id] = {}
-        self._removed_candidates[member.voice.channel.id][member.id] = member
+        self._removed_candidates.add(member.voice.channel.id, member.id)
+        self.candidate_index.member_removed(member.voice.channel.id, member.id)
 
     def remove_member_from_removed_candidates(self, channel: GuildVoice, member: Member) -> None:
-        if channel.id in self._removed_candidates:
-            self._removed_candidates[channel.id].pop(member.id, None)
+        self._removed_candidates.discard(channel.id, member.id)
+
+    async def fetch_uncached_voice_members(self, voice_channel: GuildVoice) -> None:
+        '''
+        Fetches the members of `voice_channel` that aren't cached, e.g. because the lean cache profile dropped them,
+        so `voice_channel.voice_members` resolves all of them again
+        '''
+        # voice_members has a None for every member id that isn't cached
+        missing = [member_id for member_id, member in zip(voice_channel._voice_member_ids, voice_channel.voice_members)
+                   if member is None]
+        if len(missing) > 0:
+            await asyncio.gather(*[self.fetch_member(member_id, voice_channel.guild.id) for member_id in missing])
 
     def remove_channel_from_removed_candidates(self, voiceChannel: GuildVoice) -> None:
-        self._removed_candidates.pop(voiceChannel.id, None)
+        self._removed_candidates.clear_channel(voiceChannel.id)
+        self.candidate_index.drop_channel(voiceChannel.id)
+
+    def expire_channel(self, channel_id: int) -> None:
+        self._removed_candidates.clear_channel(channel_id)
+        self.candidate_index.drop_channel(channel_id)
+
+    def schedule_idle_channels(self) -> None:
+        '''
+        Starts the idle countdown of every channel that has removed candidates or a candidate pool but nobody in it,
+        e.g. because everyone left while the bot was down. Needs the guilds' voice states, so it runs once the bot is ready.
+        '''
+        for channel_id in self._removed_candidates.channel_ids() | self.candidate_index.channel_ids():
+            channel = self.cache.get_channel(channel_id)
+            # Channels of another shard's guilds aren't cached, and countdowns carried over a restart keep their deadline
+            if not isinstance(channel, GuildVoice) or channel_id in self.channel_expiry:
+                continue
+            if len(channel.voice_members) == 0:
+                self.channel_expiry.schedule(channel_id, self.guild_config(channel.guild.id).timeout_mins * 60)
@@ -0,0 +1,114 @@
+'''
+Cached, pre-paginated contents of the help file
+'''
+
+import hashlib
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from interactions.client.const import EMBED_MAX_DESC_LENGTH
+
+from src.myUtils import load_txt_file_contents
+
+SECTION_SEPARATOR = re.compile(r'^---\s*$', re.MULTILINE)
+COMMAND_HEADING = re.compile(r'^/([\w-]+)', re.MULTILINE)
+
+
+class HelpFile:
+    '''
+    The help file, split into pages at its `---` separators and indexed by command name.
+
+    The file is only re-read when its mtime or size changes, and only re-parsed when its content hash changes.
+    '''
+
+    def __init__(self, filepath: str, page_max_len: int = EMBED_MAX_DESC_LENGTH) -> None:
+        self.filepath: str = filepath
+        self.page_max_len: int = page_max_len
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._content_hash: Optional[str] = None
+        self._contents: str = ""
+        self._pages: List[str] = []
+        self._commands: Dict[str, List[str]] = {}
+
+    def _refresh(self) -> None:
+        stat = os.stat(self.filepath)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return
+        self._stamp = stamp
+
+        contents = load_txt_file_contents(self.filepath)
+        content_hash = hashlib.sha256(contents.encode("UTF-8")).hexdigest()
+        if content_hash == self._content_hash:
+            return
+        self._content_hash = content_hash
+
+        sections = [section.strip() for section in SECTION_SEPARATOR.split(contents)]
+        sections = [section for section in sections if section]
+        self._contents = contents
+        self._pages = self._paginate(sections)
+        self._commands = {}
+        for section in sections:
+            for command_name in COMMAND_HEADING.findall(section):
+                self._commands.setdefault(command_name.lower(), self._split_long(section))
+
+    def _paginate(self, sections: List[str]) -> List[str]:
+        '''
+        Packs whole sections into pages of at most `page_max_len` characters.
+        Sections that are too long on their own are split between lines.
+        '''
+        pages: List[str] = []
+        page = ""
+        for section in sections:
+            for chunk in self._split_long(section):
+                candidate = f"{page}\n\n{chunk}" if page else chunk
+                if len(candidate) <= self.page_max_len:
+                    page = candidate
+                else:
+                    pages.append(page)
+                    page = chunk
+        if page:
+            pages.append(page)
+        return pages
+
+    def _split_long(self, section: str) -> List[str]:
+        if len(section) <= self.page_max_len:
+            return [section]
+
+        chunks: List[str] = []
+        chunk = ""
+        for line in section.splitlines():
+            while len(line) > self.page_max_len:
+                if chunk:
+                    chunks.append(chunk)
+                    chunk = ""
+                chunks.append(line[:self.page_max_len])
+                line = line[self.page_max_len:]
+            candidate = f"{chunk}\n{line}" if chunk else line
+            if len(candidate) <= self.page_max_len:
+                chunk = candidate
+            else:
+                chunks.append(chunk)
+                chunk = line
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @property
+    def contents(self) -> str:
+        self._refresh()
+        return self._contents
+
+    @property
+    def pages(self) -> List[str]:
+        self._refresh()
+        return self._pages
+
+    def command_help(self, command_name: str) -> Optional[List[str]]:
+        '''
+        Returns the help section of `command_name` (with or without the leading `/`) split into pages,
+        or None if there isn't one
+        '''
+        self._refresh()
+        return self._commands.get(command_name.strip().lstrip('/').lower())
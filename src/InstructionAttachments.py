@@ -0,0 +1,115 @@
+'''
+In-memory copies of the allow-DMs instruction images, and the CDN URLs they were last uploaded to
+'''
+
+import io
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from interactions import Embed, File, Message
+
+from src.StructuredLogger import get_logger
+
+logger = get_logger('attachments')
+
+# Re-upload rather than embed a CDN URL that expires within this many seconds
+URL_EXPIRY_MARGIN_SECS = 600
+
+
+def url_expires_at(url: str) -> Optional[float]:
+    '''
+    Returns when a signed Discord CDN URL stops working (its hex `ex` query parameter), or None if it isn't signed
+    '''
+    try:
+        return float(int(parse_qs(urlparse(url).query)['ex'][0], 16))
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+class InstructionAttachments:
+    '''
+    The instruction images, each read once into an immutable bytes buffer and re-read only when its mtime or size changes.
+
+    Uploads wrap the buffers in BytesIO, which shares rather than copies them. Once an upload succeeds, the
+    CDN URLs Discord assigned are remembered and later responses embed them instead of uploading again,
+    until an image changes on disk or its URL is about to expire.
+    '''
+
+    def __init__(self, filepaths: Sequence[str]) -> None:
+        self.filepaths: Tuple[str, ...] = tuple(filepaths)
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        self._contents: Dict[str, bytes] = {}
+        self._urls: Optional[Tuple[str, ...]] = None
+        self._urls_expire_at: float = float('inf')
+
+    def _refresh(self) -> None:
+        for filepath in self.filepaths:
+            stat = os.stat(filepath)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._stamps.get(filepath) != stamp:
+                with open(filepath, mode='rb') as fp:
+                    self._contents[filepath] = fp.read()
+                self._stamps[filepath] = stamp
+                # The uploaded copies are out of date
+                self._urls = None
+
+    def preload(self) -> None:
+        '''
+        Reads every image now, so the first DM failure doesn't have to. Missing images are only logged.
+        '''
+        try:
+            self._refresh()
+        except OSError as err:
+            logger.warning("Could not preload the allow-DMs instructions", extra={"error": str(err)})
+
+    def files(self) -> List[File]:
+        self._refresh()
+        return [File(io.BytesIO(self._contents[filepath]), file_name=os.path.basename(filepath))
+                for filepath in self.filepaths]
+
+    def embeds(self) -> Optional[List[Embed]]:
+        '''
+        Returns embeds of the already-uploaded images, or None if they have to be uploaded (again)
+        '''
+        self._refresh()
+        if self._urls is None or time.time() + URL_EXPIRY_MARGIN_SECS >= self._urls_expire_at:
+            return None
+        return [Embed().set_image(url=url) for url in self._urls]
+
+    def snapshot(self) -> Dict:
+        '''
+        Returns the uploaded URLs and the file stamps they belong to, so they can be reused after a restart
+        '''
+        return {
+            "stamps": [self._stamps.get(filepath) for filepath in self.filepaths],
+            "urls": self._urls,
+            "urls_expire_at": self._urls_expire_at if self._urls_expire_at != float('inf') else None,
+        }
+
+    def restore(self, snapshot: Dict) -> None:
+        '''
+        Reuses the URLs of a `snapshot()` taken before a restart, unless an image changed since
+        '''
+        if snapshot.get("urls") is None:
+            return
+        try:
+            self._refresh()
+        except OSError:
+            return
+        stamps = [tuple(stamp) if stamp is not None else None for stamp in snapshot["stamps"]]
+        if stamps == [self._stamps.get(filepath) for filepath in self.filepaths]:
+            self._urls = tuple(snapshot["urls"])
+            expire_at = snapshot.get("urls_expire_at")
+            self._urls_expire_at = float('inf') if expire_at is None else expire_at
+
+    def remember_upload(self, message: Message) -> None:
+        '''
+        Keeps the CDN URLs of the images attached to `message`, which was sent with `files()`
+        '''
+        if message is None or len(message.attachments) != len(self.filepaths):
+            return
+        self._urls = tuple(attachment.url for attachment in message.attachments)
+        expiries = [url_expires_at(url) for url in self._urls]
+        self._urls_expire_at = min((expiry for expiry in expiries if expiry is not None), default=float('inf'))
@@ -0,0 +1,58 @@
+'''
+Builds messages out of lists of lines without going over Discord's length limits
+'''
+
+from typing import List, Sequence
+
+MESSAGE_MAX_LEN = 2000
+
+
+def _truncate(line: str, max_len: int) -> str:
+    return line if len(line) <= max_len else line[:max_len - 1] + "…"
+
+
+def paginate_lines(lines: Sequence[str], max_len: int = MESSAGE_MAX_LEN, header: str = "") -> List[str]:
+    '''
+    Packs `header` and `lines` into as few newline-joined pages of at most `max_len` characters as possible.
+    Every page's lines are joined once, so building the pages is linear in the total length.
+    A single line that is too long on its own is truncated.
+
+    Args:
+        lines (Sequence[str]): The lines, e.g. "- @member"
+        max_len (int): The length limit of a page, e.g. MESSAGE_MAX_LEN or EMBED_MAX_DESC_LENGTH
+        header (str): Starts the first page
+
+    Returns:
+        List[str]: At least one page
+    '''
+    pages: List[str] = []
+    page_lines: List[str] = [_truncate(header, max_len)] if header else []
+    page_len = len(page_lines[0]) if header else 0
+    for line in lines:
+        line = _truncate(line, max_len)
+        # +1 for the newline joining it to the previous line
+        added_len = len(line) + (1 if page_lines else 0)
+        if page_lines and page_len + added_len > max_len:
+            pages.append("\n".join(page_lines))
+            page_lines, page_len, added_len = [], 0, len(line)
+        page_lines.append(line)
+        page_len += added_len
+    if page_lines or not pages:
+        pages.append("\n".join(page_lines))
+    return pages
+
+
+def fit_lines(lines: Sequence[str], max_len: int = MESSAGE_MAX_LEN, header: str = "") -> str:
+    '''
+    Like `paginate_lines`, but for a single message that can't be paged (e.g. a DM).
+    Lines that don't fit are summarised as "…and N more".
+    '''
+    pages = paginate_lines(lines, max_len, header)
+    if len(pages) == 1:
+        return pages[0]
+
+    # Leave room for the summary, sized for the worst case of every line being left out
+    summary_room = len(f"\n…and {len(lines)} more")
+    kept = paginate_lines(lines, max_len - summary_room, header)[0]
+    kept_count = kept.count("\n") - header.count("\n") + (0 if header else 1)
+    return f"{kept}\n…and {len(lines) - kept_count} more"
@@ -0,0 +1,162 @@
+'''
+Latency, error, HTTP-call and rate-limit metrics for commands and listeners
+'''
+
+import functools
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Name of the command or listener the current task is working for, so HTTP calls can be attributed to it
+current_handler: ContextVar[Optional[str]] = ContextVar('current_handler', default=None)
+
+BACKGROUND = '(background)'
+
+
+class LatencyHistogram:
+    '''
+    Fixed-bucket latency histogram. Buckets are allocated up front and observing only increments
+    a counter, so recording costs a bisect and an add rather than any allocation or I/O.
+    '''
+
+    BOUNDS_SECS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    __slots__ = ('counts', 'count', 'total_secs')
+
+    def __init__(self) -> None:
+        # The last bucket catches everything above the largest bound
+        self.counts: List[int] = [0] * (len(self.BOUNDS_SECS) + 1)
+        self.count: int = 0
+        self.total_secs: float = 0.0
+
+    def observe(self, secs: float) -> None:
+        self.counts[bisect_left(self.BOUNDS_SECS, secs)] += 1
+        self.count += 1
+        self.total_secs += secs
+
+    def quantile(self, q: float) -> float:
+        '''
+        Returns the upper bound of the bucket holding the `q` quantile (inf if it's in the overflow bucket)
+        '''
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.BOUNDS_SECS, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class HandlerMetrics:
+    '''
+    Metrics of a single slash command or listener
+    '''
+
+    __slots__ = ('latency', 'errors', 'http_calls', 'rate_limit_waits', 'rate_limit_wait_secs')
+
+    def __init__(self) -> None:
+        self.latency = LatencyHistogram()
+        self.errors: int = 0
+        self.http_calls: int = 0
+        self.rate_limit_waits: int = 0
+        self.rate_limit_wait_secs: float = 0.0
+
+
+class Metrics:
+    '''
+    Registry of HandlerMetrics, keyed by "/command" or "listener:event" name
+    '''
+
+    def __init__(self) -> None:
+        self.handlers: Dict[str, HandlerMetrics] = {}
+
+    def handler(self, name: Optional[str]) -> HandlerMetrics:
+        if name is None:
+            name = BACKGROUND
+        handler_metrics = self.handlers.get(name)
+        if handler_metrics is None:
+            handler_metrics = self.handlers[name] = HandlerMetrics()
+        return handler_metrics
+
+    async def run_timed(self, name: str, coro: Awaitable[Any]) -> Any:
+        '''
+        Awaits `coro`, recording its latency, whether it raised, and every HTTP call made on its behalf under `name`
+        '''
+        handler_metrics = self.handler(name)
+        token = current_handler.set(name)
+        start_time = time.perf_counter()
+        try:
+            return await coro
+        except Exception:
+            handler_metrics.errors += 1
+            raise
+        finally:
+            handler_metrics.latency.observe(time.perf_counter() - start_time)
+            current_handler.reset(token)
+
+    def timed(self, name: str, callback: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        '''
+        Wraps the coroutine function `callback` with `run_timed`
+        '''
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            return await self.run_timed(name, callback(*args, **kwargs))
+        wrapper.is_timed = True
+        return wrapper
+
+    def record_http_call(self) -> None:
+        self.handler(current_handler.get()).http_calls += 1
+
+    def record_rate_limit_wait(self, secs: float) -> None:
+        handler_metrics = self.handler(current_handler.get())
+        handler_metrics.rate_limit_waits += 1
+        handler_metrics.rate_limit_wait_secs += secs
+
+    def render_text(self) -> List[str]:
+        '''
+        Returns a summary line of every handler, for the `/stats` command to paginate. Empty if nothing was recorded yet.
+        '''
+        lines: List[str] = []
+        for name in sorted(self.handlers):
+            handler_metrics = self.handlers[name]
+            latency = handler_metrics.latency
+            line = f"**{name}**: {latency.count} runs, {handler_metrics.errors} errors, "
+            line += f"p50 ≤ {latency.quantile(0.5) * 1000:.0f} ms, p95 ≤ {latency.quantile(0.95) * 1000:.0f} ms, "
+            line += f"{handler_metrics.http_calls} HTTP calls"
+            if handler_metrics.rate_limit_waits > 0:
+                line += f", {handler_metrics.rate_limit_waits} rate-limit waits ({handler_metrics.rate_limit_wait_secs:.1f} s)"
+            lines.append(line)
+        return lines
+
+    def render_prometheus(self) -> str:
+        '''
+        Returns every metric in the Prometheus text exposition format
+        '''
+        labels = {name: name.replace('\\', '\\\\').replace('"', '\\"') for name in sorted(self.handlers)}
+
+        lines = ["# TYPE gnbot_handler_latency_seconds histogram"]
+        for name, label in labels.items():
+            latency = self.handlers[name].latency
+            cumulative = 0
+            for bound, bucket_count in zip(LatencyHistogram.BOUNDS_SECS, latency.counts):
+                cumulative += bucket_count
+                lines.append(f'gnbot_handler_latency_seconds_bucket{{handler="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'gnbot_handler_latency_seconds_bucket{{handler="{label}",le="+Inf"}} {latency.count}')
+            lines.append(f'gnbot_handler_latency_seconds_sum{{handler="{label}"}} {latency.total_secs}')
+            lines.append(f'gnbot_handler_latency_seconds_count{{handler="{label}"}} {latency.count}')
+
+        counters = (
+            ("gnbot_handler_errors_total", "errors"),
+            ("gnbot_handler_http_calls_total", "http_calls"),
+            ("gnbot_handler_rate_limit_waits_total", "rate_limit_waits"),
+            ("gnbot_handler_rate_limit_wait_seconds_total", "rate_limit_wait_secs"),
+        )
+        for metric_name, attr in counters:
+            lines.append(f"# TYPE {metric_name} counter")
+            for name, label in labels.items():
+                lines.append(f'{metric_name}{{handler="{label}"}} {getattr(self.handlers[name], attr)}')
+
+        return "\n".join(lines) + "\n"
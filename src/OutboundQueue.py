@@ -0,0 +1,191 @@
+'''
+Durable queue of the DMs the bot still has to send or delete
+'''
+
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from src.SharedDatabase import SharedDatabase
+
+SEND = 'send'
+DELETE = 'delete'
+
+# Lower goes first, so role DMs aren't held up behind the cleanup of an earlier game
+PRIORITIES = {SEND: 0, DELETE: 1}
+
+PENDING = 'pending'
+INFLIGHT = 'inflight'
+DONE = 'done'
+BLOCKED = 'blocked'
+FAILED = 'failed'
+
+
+class OutboundJob(NamedTuple):
+    job_id: int
+    batch_id: int
+    kind: str
+    user_id: Optional[int]
+    channel_id: Optional[int]
+    message_id: Optional[int]
+    content: Optional[str]
+    attempts: int
+
+
+class OutboundQueue:
+    '''
+    Jobs that send a DM to a user or delete a sent DM, written to a SQLite file before they are attempted.
+
+    Jobs are enqueued in batches, one per command, and claimed in priority order once their `not_before`
+    time has passed. A batch's rows are kept until the batch is forgotten, so the DMs a batch already sent
+    can still be found after a crash.
+
+    Every method does blocking SQLite writes, so the bot calls them from a single worker thread
+    rather than from the event loop.
+    '''
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path: str = db_path
+        self._db = SharedDatabase(db_path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS outbound ('
+            'job_id INTEGER PRIMARY KEY, '
+            'batch_id INTEGER NOT NULL, '
+            'kind TEXT NOT NULL, '
+            'priority INTEGER NOT NULL, '
+            'user_id INTEGER, '
+            'channel_id INTEGER, '
+            'message_id INTEGER, '
+            'content TEXT, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'not_before REAL NOT NULL DEFAULT 0, '
+            'status TEXT NOT NULL'
+            ')'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbound_due ON outbound (status, priority, job_id)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS outbound_batch ON outbound (batch_id)')
+
+    def __len__(self) -> int:
+        '''
+        The number of jobs that haven't been attempted successfully yet
+        '''
+        return self._db.execute('SELECT COUNT(*) FROM outbound WHERE status IN (?, ?)', (PENDING, INFLIGHT)).fetchone()[0]
+
+    def next_batch_id(self) -> int:
+        '''
+        Returns a batch id that no job in the queue has
+        '''
+        return self._db.execute('SELECT COALESCE(MAX(batch_id), 0) + 1 FROM outbound').fetchone()[0]
+
+    def _enqueue(self, batch_id: int, kind: str, rows: List[Tuple]) -> List[int]:
+        job_ids: List[int] = []
+        self._db.execute('BEGIN')
+        try:
+            for user_id, channel_id, message_id, content in rows:
+                cursor = self._db.execute(
+                    'INSERT INTO outbound (batch_id, kind, priority, user_id, channel_id, message_id, content, status) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (batch_id, kind, PRIORITIES[kind], user_id, channel_id, message_id, content, PENDING)
+                )
+                job_ids.append(cursor.lastrowid)
+            self._db.execute('COMMIT')
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        return job_ids
+
+    def enqueue_sends(self, batch_id: int, messages: Iterable[Tuple[int, str]]) -> List[int]:
+        '''
+        Adds every DM to `batch_id` in a single transaction
+
+        Args:
+            batch_id (int): From `next_batch_id`
+            messages (Iterable[Tuple[int, str]]): The user id and text of every DM
+
+        Returns:
+            List[int]: A job id per DM in the same order
+        '''
+        return self._enqueue(batch_id, SEND, [(user_id, None, None, content) for user_id, content in messages])
+
+    def enqueue_deletes(self, batch_id: int, messages: Iterable[Tuple[int, int]]) -> List[int]:
+        '''
+        Adds the deletion of every DM to `batch_id` in a single transaction
+
+        Args:
+            batch_id (int): From `next_batch_id`
+            messages (Iterable[Tuple[int, int]]): The channel id and message id of every DM
+
+        Returns:
+            List[int]: A job id per DM in the same order
+        '''
+        return self._enqueue(batch_id, DELETE, [(None, channel_id, message_id, None) for channel_id, message_id in messages])
+
+    def claim(self, now: float) -> Optional[OutboundJob]:
+        '''
+        Marks the most urgent job that is due at `now` as in flight and returns it, or None if no job is due
+        '''
+        row = self._db.execute(
+            'SELECT job_id, batch_id, kind, user_id, channel_id, message_id, content, attempts FROM outbound '
+            'WHERE status = ? AND not_before <= ? ORDER BY priority, job_id LIMIT 1',
+            (PENDING, now)
+        ).fetchone()
+        if row is None:
+            return None
+        self._db.execute('UPDATE outbound SET status = ? WHERE job_id = ?', (INFLIGHT, row[0]))
+        return OutboundJob(*row)
+
+    def next_due(self) -> Optional[float]:
+        '''
+        Returns when the earliest pending job is due, or None if there are no pending jobs
+        '''
+        return self._db.execute('SELECT MIN(not_before) FROM outbound WHERE status = ?', (PENDING,)).fetchone()[0]
+
+    def retry(self, job_id: int, not_before: float) -> None:
+        self._db.execute('UPDATE outbound SET status = ?, attempts = attempts + 1, not_before = ? WHERE job_id = ?',
+                         (PENDING, not_before, job_id))
+
+    def finish(self, job_id: int, status: str, channel_id: Optional[int] = None, message_id: Optional[int] = None) -> None:
+        '''
+        Records the final `status` of a job, and for a sent DM where it was sent
+        '''
+        self._db.execute(
+            'UPDATE outbound SET status = ?, channel_id = COALESCE(?, channel_id), message_id = COALESCE(?, message_id) '
+            'WHERE job_id = ?',
+            (status, channel_id, message_id, job_id)
+        )
+
+    def forget_job(self, job_id: int) -> None:
+        self._db.execute('DELETE FROM outbound WHERE job_id = ?', (job_id,))
+
+    def forget_batch(self, batch_id: int) -> None:
+        self._db.execute('DELETE FROM outbound WHERE batch_id = ?', (batch_id,))
+
+    def recover(self) -> Tuple[int, int]:
+        '''
+        Picks up the jobs a previous run left behind.
+
+        Deletes are resumed. Sends are not, since the command waiting on them is gone and a role arriving
+        long after the game started is worse than none. Instead, the DMs their batch did send are
+        queued for deletion, so no game is left with only some players knowing their roles.
+
+        Returns:
+            Tuple[int, int]: The number of abandoned sends and the number of deletes queued up
+        '''
+        self._db.execute('UPDATE outbound SET status = ? WHERE status = ?', (PENDING, INFLIGHT))
+        # Like the command would have, roll back batches that some players didn't get their DM from
+        unfinished_batches = [row[0] for row in self._db.execute(
+            'SELECT DISTINCT batch_id FROM outbound WHERE kind = ? AND status IN (?, ?, ?)', (SEND, PENDING, BLOCKED, FAILED)
+        )]
+        abandoned = 0
+        for batch_id in unfinished_batches:
+            abandoned += self._db.execute('SELECT COUNT(*) FROM outbound WHERE batch_id = ? AND status = ?',
+                                          (batch_id, PENDING)).fetchone()[0]
+            sent = self._db.execute('SELECT channel_id, message_id FROM outbound WHERE batch_id = ? AND status = ?',
+                                    (batch_id, DONE)).fetchall()
+            if len(sent) > 0:
+                self.enqueue_deletes(self.next_batch_id(), sent)
+            self.forget_batch(batch_id)
+        # What's left settled in full, so nothing else needs it
+        self._db.execute('DELETE FROM outbound WHERE status != ?', (PENDING,))
+        return abandoned, len(self)
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,68 @@
+'''
+Throttled progress updates for long-running slash commands
+'''
+
+import asyncio
+from typing import Optional
+
+from interactions import SlashContext
+from interactions.client.errors import HTTPException
+
+
+class ProgressReporter:
+    '''
+    Edits the original response of a deferred command with "done/total label" while work runs in the background.
+
+    Edits happen at most once every `min_interval_secs`, and only when the count changed, so the number
+    of API calls depends on how long the work runs rather than on `total`. The final count is always
+    reported on exit. Use as an async context manager and call `advance()` as items complete.
+    Counting never awaits, so it doesn't slow the work being reported on.
+    '''
+
+    def __init__(self,
+                 ctx: SlashContext,
+                 total: int,
+                 label: str,
+                 min_interval_secs: float = 1.0) -> None:
+        self.ctx: SlashContext = ctx
+        self.total: int = total
+        self.label: str = label
+        self.min_interval_secs: float = min_interval_secs
+        self.done: int = 0
+        self.edits: int = 0
+        self._last_reported: Optional[int] = None
+        self._failed: bool = False
+        self._task: Optional[asyncio.Task] = None
+
+    def advance(self, count: int = 1) -> None:
+        self.done += count
+
+    async def _report(self) -> None:
+        done = self.done
+        if self._failed or done == self._last_reported:
+            return
+        self.edits += 1
+        try:
+            await self.ctx.edit(content=f"{done}/{self.total} {self.label}")
+            # Only once it went through, so an edit cut short on exit is made again with the final count
+            self._last_reported = done
+        except HTTPException:
+            # Progress is best effort, never let it fail the command
+            self._failed = True
+
+    async def _report_periodically(self) -> None:
+        while not self._failed:
+            await asyncio.sleep(self.min_interval_secs)
+            await self._report()
+
+    async def __aenter__(self) -> "ProgressReporter":
+        self._task = asyncio.create_task(self._report_periodically())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self._report()
@@ -0,0 +1,117 @@
+'''
+Persistent store of the members removed from each voice channel's candidate pool
+'''
+
+from typing import Dict, Set
+
+from src.SharedDatabase import SharedDatabase
+
+
+class RemovedCandidatesStore:
+    '''
+    Maps voice channel ids to the set of member ids removed from that channel's candidate pool.
+
+    Only integer ids are kept. Every change is written through to a SQLite file so the
+    pools survive restarts, and a channel's ids are read from disk the first time that
+    channel is looked up rather than all at startup.
+
+    The file can be shared by several shard processes. When another one writes to it, every cached
+    channel is dropped and `generation` goes up, so caches derived from this one know to rebuild too.
+    '''
+
+    def __init__(self, db_path: str, compact_every: int = 1000) -> None:
+        '''
+        Args:
+            db_path (str): Path to the SQLite file, created if missing
+            compact_every (int): Number of deleted rows after which the file is vacuumed
+        '''
+        self.db_path: str = db_path
+        self.compact_every: int = compact_every
+        self._channels: Dict[int, Set[int]] = {}
+        self._deletes_since_compaction: int = 0
+        self.generation: int = 0
+
+        self._db = SharedDatabase(db_path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS removed_candidates ('
+            'channel_id INTEGER NOT NULL, '
+            'member_id INTEGER NOT NULL, '
+            'PRIMARY KEY (channel_id, member_id)'
+            ') WITHOUT ROWID'
+        )
+
+    def __contains__(self, channel_id: int) -> bool:
+        return len(self.channel(channel_id)) > 0
+
+    def __getitem__(self, channel_id: int) -> Set[int]:
+        return self.channel(channel_id)
+
+    def sync(self) -> None:
+        '''
+        Drops every cached channel if another process changed the file since the last check
+        '''
+        if self._db.changed_elsewhere():
+            self._channels.clear()
+            self.generation += 1
+
+    def channel(self, channel_id: int) -> Set[int]:
+        '''
+        Returns the removed member ids of `channel_id`, loading them from disk on first use
+        '''
+        self.sync()
+        channel_id = int(channel_id)
+        if channel_id not in self._channels:
+            rows = self._db.execute(
+                'SELECT member_id FROM removed_candidates WHERE channel_id = ?', (channel_id,)
+            )
+            self._channels[channel_id] = {member_id for (member_id,) in rows}
+        return self._channels[channel_id]
+
+    def channel_ids(self) -> Set[int]:
+        '''
+        Returns every channel that has removed candidates on disk, including the ones not looked up yet
+        '''
+        return {channel_id for (channel_id,) in self._db.execute('SELECT DISTINCT channel_id FROM removed_candidates')}
+
+    def add(self, channel_id: int, member_id: int) -> None:
+        channel_id, member_id = int(channel_id), int(member_id)
+        removed = self.channel(channel_id)
+        if member_id not in removed:
+            removed.add(member_id)
+            self._db.execute(
+                'INSERT OR IGNORE INTO removed_candidates (channel_id, member_id) VALUES (?, ?)',
+                (channel_id, member_id)
+            )
+
+    def discard(self, channel_id: int, member_id: int) -> None:
+        channel_id, member_id = int(channel_id), int(member_id)
+        removed = self.channel(channel_id)
+        if member_id in removed:
+            removed.discard(member_id)
+            self._db.execute(
+                'DELETE FROM removed_candidates WHERE channel_id = ? AND member_id = ?',
+                (channel_id, member_id)
+            )
+            self._record_deletes(1)
+
+    def clear_channel(self, channel_id: int) -> None:
+        channel_id = int(channel_id)
+        removed = self._channels.pop(channel_id, None)
+        cursor = self._db.execute('DELETE FROM removed_candidates WHERE channel_id = ?', (channel_id,))
+        self._record_deletes(cursor.rowcount if removed is None else len(removed))
+
+    def _record_deletes(self, count: int) -> None:
+        self._deletes_since_compaction += count
+        if self._deletes_since_compaction >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        '''
+        Reclaims the space left behind by deleted rows
+        '''
+        self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self._db.execute('VACUUM')
+        self._deletes_since_compaction = 0
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,99 @@
+'''
+Persistent store of each guild's saved role setups
+'''
+
+from typing import Dict, NamedTuple, Optional
+
+from src.SharedDatabase import SharedDatabase
+
+
+class RolePreset(NamedTuple):
+    name: str
+    roles: str
+    rest_role: str
+
+
+class RolePresetStore:
+    '''
+    Maps guild ids to their saved role setups, keyed by lower-cased preset name.
+
+    Presets are written through to a SQLite table whose primary key is (guild_id, name), so loading
+    one guild's presets is a single index range scan. A guild's presets are read from disk the first
+    time that guild is looked up and served from memory afterwards, e.g. for autocomplete.
+    '''
+
+    def __init__(self, db_path: str, max_per_guild: int = 25) -> None:
+        '''
+        Args:
+            db_path (str): Path to the SQLite file, created if missing
+            max_per_guild (int): Number of presets a guild can save, at most 25 so they all fit in an autocomplete
+        '''
+        self.db_path: str = db_path
+        self.max_per_guild: int = max_per_guild
+        self._guilds: Dict[int, Dict[str, RolePreset]] = {}
+
+        self._db = SharedDatabase(db_path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS role_presets ('
+            'guild_id INTEGER NOT NULL, '
+            'name TEXT NOT NULL, '
+            'display_name TEXT NOT NULL, '
+            'roles TEXT NOT NULL, '
+            'rest_role TEXT NOT NULL, '
+            'PRIMARY KEY (guild_id, name)'
+            ') WITHOUT ROWID'
+        )
+
+    def guild(self, guild_id: int) -> Dict[str, RolePreset]:
+        '''
+        Returns the presets of `guild_id` keyed by lower-cased name, loading them from disk on first use
+        '''
+        # Another shard process saved or deleted presets
+        if self._db.changed_elsewhere():
+            self._guilds.clear()
+        guild_id = int(guild_id)
+        if guild_id not in self._guilds:
+            rows = self._db.execute(
+                'SELECT name, display_name, roles, rest_role FROM role_presets WHERE guild_id = ?', (guild_id,)
+            )
+            self._guilds[guild_id] = {
+                name: RolePreset(name=display_name, roles=roles, rest_role=rest_role)
+                for (name, display_name, roles, rest_role) in rows
+            }
+        return self._guilds[guild_id]
+
+    def get(self, guild_id: int, name: str) -> Optional[RolePreset]:
+        return self.guild(guild_id).get(name.strip().lower())
+
+    def put(self, guild_id: int, preset: RolePreset) -> None:
+        '''
+        Saves `preset`, replacing any preset of the same name
+
+        Raises:
+            ValueError: If the guild already has `max_per_guild` other presets
+        '''
+        guild_id = int(guild_id)
+        presets = self.guild(guild_id)
+        key = preset.name.strip().lower()
+        if key not in presets and len(presets) >= self.max_per_guild:
+            raise ValueError(f"This server already has {self.max_per_guild} role presets, delete one first")
+
+        presets[key] = preset
+        self._db.execute(
+            'INSERT OR REPLACE INTO role_presets (guild_id, name, display_name, roles, rest_role) VALUES (?, ?, ?, ?, ?)',
+            (guild_id, key, preset.name, preset.roles, preset.rest_role)
+        )
+
+    def delete(self, guild_id: int, name: str) -> bool:
+        '''
+        Returns whether there was a preset called `name` to delete
+        '''
+        guild_id = int(guild_id)
+        key = name.strip().lower()
+        if self.guild(guild_id).pop(key, None) is None:
+            return False
+        self._db.execute('DELETE FROM role_presets WHERE guild_id = ? AND name = ?', (guild_id, key))
+        return True
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,108 @@
+'''
+Parsing and assignment of multi-role game setups, e.g. "2 Werewolf+, 1 Seer, 1 Doctor"
+'''
+
+import random
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from interactions import Member
+
+from src.MessageBuilder import fit_lines
+
+TEAM_KNOWLEDGE_MARKER = '+'
+
+
+class RoleSpec(NamedTuple):
+    '''
+    A role of a setup: its name, how many people get it, and whether they learn who their teammates are
+    '''
+    name: str
+    count: int
+    knows_team: bool = False
+
+
+def parse_roles(text: str, name_max_len: int = 80) -> Tuple[RoleSpec, ...]:
+    '''
+    Parses a comma-separated list of `<count> <role name>` entries.
+    A role name ending in `+` reveals everyone holding that role to each other.
+
+    Raises:
+        ValueError: With a message that can be shown to the user as is
+    '''
+    specs: List[RoleSpec] = []
+    seen = set()
+    for entry in text.split(','):
+        entry = entry.strip()
+        if entry == "":
+            continue
+        count_text, _, name = entry.partition(' ')
+        name = name.strip()
+        knows_team = name.endswith(TEAM_KNOWLEDGE_MARKER)
+        if knows_team:
+            name = name[:-len(TEAM_KNOWLEDGE_MARKER)].rstrip()
+
+        if not count_text.isdigit() or int(count_text) < 1:
+            raise ValueError(f"`{entry}` must start with a positive number of people, e.g. `2 Werewolf`")
+        if name == "":
+            raise ValueError(f"`{entry}` is missing a role name")
+        if len(name) > name_max_len:
+            raise ValueError(f"Role names can be at most {name_max_len} characters long")
+        if name.lower() in seen:
+            raise ValueError(f"`{name}` is listed more than once")
+
+        seen.add(name.lower())
+        specs.append(RoleSpec(name=name, count=int(count_text), knows_team=knows_team))
+
+    if len(specs) == 0:
+        raise ValueError("Give at least one role, e.g. `2 Werewolf+, 1 Seer`")
+    return tuple(specs)
+
+
+def format_roles(specs: Sequence[RoleSpec]) -> str:
+    '''
+    Inverse of `parse_roles`
+    '''
+    return ", ".join(f"{spec.count} {spec.name}{TEAM_KNOWLEDGE_MARKER if spec.knows_team else ''}" for spec in specs)
+
+
+def assign_roles(candidate_pool: Sequence[Member],
+                 specs: Sequence[RoleSpec],
+                 rest_role: str) -> Dict[str, List[Member]]:
+    '''
+    Hands out every role with a single shuffle of the candidate pool. Everyone left over gets `rest_role`.
+
+    Returns:
+        Dict[str, List[Member]]: The members holding each role, in the order of `specs` followed by `rest_role`
+    '''
+    shuffled = random.sample(candidate_pool, len(candidate_pool))
+    assignment: Dict[str, List[Member]] = {}
+    start = 0
+    for spec in specs:
+        assignment[spec.name] = shuffled[start:start + spec.count]
+        start += spec.count
+    if start < len(shuffled):
+        assignment[rest_role] = shuffled[start:]
+    return assignment
+
+
+def role_DMs(assignment: Dict[str, List[Member]], specs: Sequence[RoleSpec]) -> Dict[int, Dict]:
+    '''
+    Builds one DM per member with their role, and their teammates if their role knows its team
+
+    Returns:
+        Dict[int, Dict]: In the `msgDict` format of `GNCommands.__sendMassDM`
+    '''
+    knows_team = {spec.name for spec in specs if spec.knows_team}
+    msgDict = {}
+    for role_name, members in assignment.items():
+        vowel = 'n' if role_name[0].lower() in ['a', 'e', 'i', 'o', 'u'] else ''
+        for member in members:
+            message_to_send = f":performing_arts: You're a{vowel} {role_name}!"
+            if role_name in knows_team and len(members) > 1:
+                message_to_send = fit_lines([f"- {teammate.mention}" for teammate in members if teammate.id != member.id],
+                                            header=f"{message_to_send}\nYour fellow {role_name}s are:")
+            msgDict[member.id] = {
+                "member_obj": member,
+                "message_to_send": message_to_send
+            }
+    return msgDict
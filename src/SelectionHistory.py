@@ -0,0 +1,97 @@
+'''
+Persistent, decaying record of how often members were selected in each voice channel
+'''
+
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from interactions import Member
+
+from src.FenwickSampler import FenwickSampler
+from src.SharedDatabase import SharedDatabase
+
+
+class SelectionHistory:
+    '''
+    Keeps a score per (voice channel, member) that goes up by 1 every time the member is selected and
+    halves every `half_life_secs`, so old selections count for less and less.
+
+    Only the score and the time it was last updated are stored, and decay is applied when a score is
+    read or bumped, so nothing has to tick in the background. Scores are written through to a SQLite
+    file and a channel's scores are loaded the first time that channel is looked up.
+    '''
+
+    def __init__(self, db_path: str, half_life_secs: float) -> None:
+        '''
+        Args:
+            db_path (str): Path to the SQLite file, created if missing
+            half_life_secs (float): Time after which a selection counts half as much
+        '''
+        self.db_path: str = db_path
+        self.half_life_secs: float = half_life_secs
+        self._channels: Dict[int, Dict[int, Tuple[float, float]]] = {}
+
+        self._db = SharedDatabase(db_path)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS selection_history ('
+            'channel_id INTEGER NOT NULL, '
+            'member_id INTEGER NOT NULL, '
+            'score REAL NOT NULL, '
+            'updated_at REAL NOT NULL, '
+            'PRIMARY KEY (channel_id, member_id)'
+            ') WITHOUT ROWID'
+        )
+
+    def channel(self, channel_id: int) -> Dict[int, Tuple[float, float]]:
+        '''
+        Returns the (score, updated_at) of every member selected in `channel_id`, loading them from disk on first use
+        '''
+        # Another shard process recorded selections
+        if self._db.changed_elsewhere():
+            self._channels.clear()
+        channel_id = int(channel_id)
+        if channel_id not in self._channels:
+            rows = self._db.execute(
+                'SELECT member_id, score, updated_at FROM selection_history WHERE channel_id = ?', (channel_id,)
+            )
+            self._channels[channel_id] = {member_id: (score, updated_at) for (member_id, score, updated_at) in rows}
+        return self._channels[channel_id]
+
+    def score(self, channel_id: int, member_id: int, now: float = None) -> float:
+        '''
+        Returns the decayed number of times `member_id` was selected in `channel_id`
+        '''
+        return self._decayed(self.channel(channel_id).get(int(member_id)), time.time() if now is None else now)
+
+    def _decayed(self, entry: Tuple[float, float], now: float) -> float:
+        if entry is None:
+            return 0.0
+        score, updated_at = entry
+        return score * 0.5 ** (max(now - updated_at, 0.0) / self.half_life_secs)
+
+    def record_selected(self, channel_id: int, member_ids: Sequence[int]) -> None:
+        channel_id = int(channel_id)
+        scores = self.channel(channel_id)
+        now = time.time()
+        rows = []
+        for member_id in member_ids:
+            member_id = int(member_id)
+            score = self._decayed(scores.get(member_id), now) + 1.0
+            scores[member_id] = (score, now)
+            rows.append((channel_id, member_id, score, now))
+        self._db.executemany(
+            'INSERT OR REPLACE INTO selection_history (channel_id, member_id, score, updated_at) VALUES (?, ?, ?, ?)',
+            rows
+        )
+
+    def weighted_sample(self, channel_id: int, candidate_pool: Sequence[Member], n: int) -> List[Member]:
+        '''
+        Draws `n` distinct members, each with a chance proportional to 1 / (1 + their decayed selection score)
+        '''
+        scores = self.channel(channel_id)
+        now = time.time()
+        weights = [1.0 / (1.0 + self._decayed(scores.get(member.id), now)) for member in candidate_pool]
+        return [candidate_pool[index] for index in FenwickSampler(weights).sample(n)]
+
+    def close(self) -> None:
+        self._db.close()
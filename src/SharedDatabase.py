@@ -0,0 +1,46 @@
+'''
+SQLite connection shared by every shard process of the bot
+'''
+
+import sqlite3
+from typing import Any, Iterable, Sequence
+
+
+class SharedDatabase:
+    '''
+    An autocommit SQLite connection in WAL mode, which lets every shard process read while one of them writes.
+
+    Writers wait up to `busy_timeout_ms` for another process's write to finish instead of failing.
+    With `check_same_thread` off, the connection may be handed to another thread, as long as only one uses it at a time.
+    `changed_elsewhere()` tells the in-memory caches built on top of the file when another process
+    committed to it, so they can drop what they loaded and re-read it.
+    '''
+
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000, check_same_thread: bool = True) -> None:
+        self.db_path: str = db_path
+        self._db = sqlite3.connect(db_path, isolation_level=None, check_same_thread=check_same_thread)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        self._data_version: int = self._current_data_version()
+
+    def _current_data_version(self) -> int:
+        return self._db.execute('PRAGMA data_version').fetchone()[0]
+
+    def changed_elsewhere(self) -> bool:
+        '''
+        Returns whether another connection (e.g. another shard) committed to the file since the last call.
+        Commits made through this connection don't count.
+        '''
+        data_version = self._current_data_version()
+        changed = data_version != self._data_version
+        self._data_version = data_version
+        return changed
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()) -> sqlite3.Cursor:
+        return self._db.execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters: Iterable[Sequence[Any]]) -> sqlite3.Cursor:
+        return self._db.executemany(sql, parameters)
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,57 @@
+'''
+Stops accepting commands and waits for the in-flight ones before the bot shuts down
+'''
+
+import asyncio
+from typing import Any, Awaitable
+
+
+class ShutdownCoordinator:
+    '''
+    Counts the slash commands that are running, so shutting down can wait for exactly those.
+
+    Once `drain` is called, `accepting` turns false and callers are expected to `reject` new commands
+    instead of running them. `drain` returns as soon as the last in-flight command finishes, or at
+    its deadline with the number of commands that were still running.
+    '''
+
+    def __init__(self) -> None:
+        self.accepting: bool = True
+        self.rejected: int = 0
+        self._inflight: int = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def reject(self) -> None:
+        self.rejected += 1
+
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        '''
+        Awaits the command `coro`, counting it as in flight until it finishes
+        '''
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            return await coro
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def drain(self, timeout_secs: float) -> int:
+        '''
+        Stops accepting commands and waits up to `timeout_secs` for the running ones to finish
+
+        Returns:
+            int: The number of commands still running at the deadline
+        '''
+        self.accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout_secs)
+        except asyncio.TimeoutError:
+            pass
+        return self._inflight
@@ -0,0 +1,185 @@
+'''
+Non-blocking JSON-lines logging with per-interaction trace ids
+'''
+
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler
+from typing import List, Optional
+
+# Id of the interaction the current task is working for, so every record of one command can be followed.
+# Tasks started while handling the interaction (e.g. each DM send) inherit it.
+trace_id: ContextVar[Optional[str]] = ContextVar('trace_id', default=None)
+
+LOGGER_NAME = 'gnbot'
+
+# Attributes every LogRecord has. Anything else on a record was passed through `extra=` and is logged as a field.
+_STANDARD_RECORD_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'trace_id'}
+
+
+def get_logger(name: str) -> logging.Logger:
+    '''
+    Returns the logger of a part of the bot, e.g. `get_logger("dm")`
+    '''
+    return logging.getLogger(f'{LOGGER_NAME}.{name}')
+
+
+class JsonLinesFormatter(logging.Formatter):
+    '''
+    Formats a record as a single line of JSON, with any `extra=` fields as top-level keys
+    '''
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "trace_id": getattr(record, 'trace_id', None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        elif record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TracingQueueHandler(QueueHandler):
+    '''
+    Hands records to the writer thread without ever blocking the event loop.
+
+    The trace id is captured here, on the logging task, since the writer thread can't see the task's context.
+    If the queue is full the record is dropped and counted instead of waiting for the sink.
+    '''
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped: int = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.trace_id = trace_id.get()
+        # Render the traceback now rather than keeping its frames alive until the writer gets to it
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogWriter:
+    '''
+    Background thread that drains the log queue in batches and appends them to a JSON-lines file.
+
+    Every record that's already waiting is written with a single write and flush, so a slow disk costs one
+    syscall per batch instead of one per record. The file is rotated once it would grow past `max_bytes`,
+    keeping `backup_count` old files (`path.1` being the newest).
+    '''
+
+    _STOP = object()
+
+    def __init__(self,
+                 path: str,
+                 max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 5,
+                 to_stdout: bool = True,
+                 batch_size: int = 256,
+                 queue_max_size: int = 10_000) -> None:
+        self.path: str = path
+        self.max_bytes: int = max_bytes
+        self.backup_count: int = backup_count
+        self.to_stdout: bool = to_stdout
+        self.batch_size: int = batch_size
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_max_size)
+        self.handler = TracingQueueHandler(self.queue)
+        self.formatter = JsonLinesFormatter()
+        self._reported_dropped: int = 0
+        self._fp = open(self.path, mode='ab')
+        self._size: int = self._fp.tell()
+        self._thread = threading.Thread(target=self._run, name='structured-log-writer', daemon=True)
+
+    def start(self) -> None:
+        '''
+        Routes every `gnbot.*` logger through the queue and starts the writer thread
+        '''
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(logging.INFO)
+        logger.addHandler(self.handler)
+        logger.propagate = False
+        self._thread.start()
+
+    def stop(self) -> None:
+        '''
+        Writes out everything still queued, then stops the writer thread and closes the file
+        '''
+        if not self._thread.is_alive():
+            return
+        logging.getLogger(LOGGER_NAME).removeHandler(self.handler)
+        # Blocking here is fine, this only runs once the event loop is done
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self._fp.close()
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[logging.LogRecord] = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is self._STOP:
+                batch.pop()
+                stopping = True
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: List[logging.LogRecord]) -> None:
+        dropped = self.handler.dropped - self._reported_dropped
+        if dropped > 0:
+            self._reported_dropped += dropped
+            batch.append(logging.makeLogRecord({
+                "name": f"{LOGGER_NAME}.log", "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "Log queue was full, records were dropped", "dropped": dropped,
+            }))
+        if len(batch) == 0:
+            return
+
+        lines = [self.formatter.format(record) for record in batch]
+        payload = ("\n".join(lines) + "\n").encode('UTF-8')
+        if self._size > 0 and self._size + len(payload) > self.max_bytes:
+            self._rotate()
+        self._fp.write(payload)
+        self._fp.flush()
+        self._size += len(payload)
+
+        if self.to_stdout:
+            for record in batch:
+                trace = getattr(record, 'trace_id', None)
+                sys.stdout.write(f"{record.levelname} {f'[{trace}] ' if trace else ''}{record.getMessage()}\n")
+            sys.stdout.flush()
+
+    def _rotate(self) -> None:
+        self._fp.close()
+        if self.backup_count > 0:
+            for i in range(self.backup_count - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+            self._fp = open(self.path, mode='ab')
+        else:
+            self._fp = open(self.path, mode='wb')
+        self._size = 0
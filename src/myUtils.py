@@ -2,7 +2,10 @@
 Utility functions for the bot
 '''
 
+import importlib
 import json
+from types import ModuleType
+from typing import Dict
 # import asyncio
 # from asyncio import tasks
 
@@ -38,6 +41,38 @@ def load_txt_file_contents(filepath: str) -> str:
 
     return contents
 
+class LazyModule:
+    '''
+    Stands in for a module, which is only imported the first time one of its attributes is used.
+
+    Lets extensions register their commands without paying for heavy dependencies (e.g. NumPy)
+    until one of those commands actually runs.
+    '''
+
+    instances: Dict[str, "LazyModule"] = {}
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: ModuleType = None
+        LazyModule.instances[name] = self
+
+    def load(self) -> ModuleType:
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+
+def preload_lazy_modules() -> None:
+    '''
+    Imports every module that was deferred with LazyModule
+    '''
+    for lazy_module in LazyModule.instances.values():
+        lazy_module.load()
+
+
 # def wait(task_or_coroutine):
 #     '''
 #     DOESN'T WORK! :(
@@ -0,0 +1,148 @@
+import asyncio
+import tracemalloc
+from types import SimpleNamespace
+
+import src.ChannelExpiryScheduler
+from src.CandidateIndex import CandidateIndex
+from src.ChannelExpiryScheduler import ChannelExpiryScheduler
+from src.GNClient import GNClient
+from src.RemovedCandidatesStore import RemovedCandidatesStore
+
+NUM_OF_CHANNELS = 100_000
+
+
+def heap_bound(scheduler: ChannelExpiryScheduler) -> int:
+    # The compaction threshold of ChannelExpiryScheduler.schedule
+    return 2 * len(scheduler) + 64
+
+
+def test_expires_after_timeout():
+    async def scenario():
+        expired = []
+        scheduler = ChannelExpiryScheduler(0.01, expired.append)
+        scheduler.schedule(1)
+        await asyncio.sleep(0.05)
+        return expired, len(scheduler)
+
+    assert asyncio.run(scenario()) == ([1], 0)
+
+
+def test_reschedule_and_cancel_postpone_expiry():
+    async def scenario():
+        expired = []
+        scheduler = ChannelExpiryScheduler(0.02, expired.append)
+        scheduler.schedule(1)
+        scheduler.schedule(2)
+        scheduler.schedule(1, timeout_secs=10)
+        scheduler.cancel(2)
+        await asyncio.sleep(0.05)
+        return expired, scheduler.remaining_secs()
+
+    expired, remaining = asyncio.run(scenario())
+    assert expired == []
+    assert list(remaining) == [1]
+    assert 9 < remaining[1] <= 10
+
+
+def test_expire_due_only_pops_channels_past_their_deadline():
+    async def scenario():
+        expired = []
+        scheduler = ChannelExpiryScheduler(60, expired.append)
+        now = asyncio.get_running_loop().time()
+        for channel_id in range(10):
+            scheduler.schedule(channel_id, timeout_secs=channel_id)
+        return scheduler.expire_due(now + 4.5), expired, len(scheduler)
+
+    returned, expired, pending = asyncio.run(scenario())
+    assert returned == expired == [0, 1, 2, 3, 4]
+    assert pending == 5
+
+
+def test_soak_under_churn():
+    '''
+    100k channels rescheduled and cancelled over and over. Every live channel expires exactly once,
+    no cancelled one does, and the heap stays bounded instead of growing with every reschedule.
+    '''
+    async def scenario():
+        expired = []
+        scheduler = ChannelExpiryScheduler(60, expired.append)
+        now = asyncio.get_running_loop().time()
+        max_heap = 0
+        for round_num in range(5):
+            for channel_id in range(NUM_OF_CHANNELS):
+                scheduler.schedule(channel_id, timeout_secs=60 + round_num)
+            # Someone rejoins every third channel
+            for channel_id in range(round_num % 3, NUM_OF_CHANNELS, 3):
+                scheduler.cancel(channel_id)
+            max_heap = max(max_heap, len(scheduler._heap))
+
+        live = set(scheduler._deadlines)
+        assert scheduler.expire_due(now + 30) == []
+        returned = scheduler.expire_due(now + 120)
+        return live, returned, expired, scheduler, max_heap
+
+    live, returned, expired, scheduler, max_heap = asyncio.run(scenario())
+    assert len(live) == NUM_OF_CHANNELS - len(range(1, NUM_OF_CHANNELS, 3))
+    assert sorted(expired) == sorted(returned) == sorted(live)
+    assert len(scheduler) == 0
+    assert len(scheduler._heap) == 0
+    # 5 rounds of 100k reschedules would leave 500k entries without compaction
+    assert max_heap < 3 * NUM_OF_CHANNELS
+
+
+def test_soak_memory_stays_flat():
+    '''
+    The same 1000 channels rescheduled 200 times. Stale entries are compacted away, so the heap
+    never holds more than the compaction threshold allows, and the memory the scheduler allocated
+    in the last rounds is no more than in the first ones.
+    '''
+    def traced_bytes() -> int:
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, src.ChannelExpiryScheduler.__file__)])
+        return sum(stat.size for stat in snapshot.statistics('filename'))
+
+    async def scenario():
+        scheduler = ChannelExpiryScheduler(60, lambda channel_id: None)
+        sizes = []
+        traced = []
+        for round_num in range(200):
+            for channel_id in range(1000):
+                scheduler.schedule(channel_id)
+            sizes.append(len(scheduler._heap))
+            if round_num % 10 == 9:
+                traced.append(traced_bytes())
+        return scheduler, sizes, traced
+
+    tracemalloc.start()
+    try:
+        scheduler, sizes, traced = asyncio.run(scenario())
+    finally:
+        tracemalloc.stop()
+    assert len(scheduler) == 1000
+    assert max(sizes) <= heap_bound(scheduler) + 1
+    # A heap growing with every reschedule would hold 20x more in the last round than in the first
+    assert max(traced[10:]) <= max(traced[:10])
+
+
+def test_expiry_clears_removed_candidates_and_candidate_index(tmp_path):
+    '''
+    Expiry wired up as GNClient does it. Every expired channel is gone from the store, on disk too,
+    and from the index, while the channel that was rejoined keeps both.
+    '''
+    store = RemovedCandidatesStore(str(tmp_path / 'removed_candidates.sqlite3'))
+    bot = SimpleNamespace(_removed_candidates=store, candidate_index=CandidateIndex(store))
+
+    async def scenario():
+        scheduler = ChannelExpiryScheduler(0.01, lambda channel_id: GNClient.expire_channel(bot, channel_id))
+        for channel_id in range(1, 4):
+            store.add(channel_id, 100 + channel_id)
+            bot.candidate_index.snapshot(SimpleNamespace(id=channel_id, voice_members=[SimpleNamespace(id=200 + channel_id)]))
+            scheduler.schedule(channel_id)
+        scheduler.cancel(3)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert bot.candidate_index.channel_ids() == {3}
+    assert store.channel_ids() == {3}
+    assert 1 not in store and 2 not in store
+    store.close()
+    assert RemovedCandidatesStore(str(tmp_path / 'removed_candidates.sqlite3')).channel_ids() == {3}
@@ -0,0 +1,152 @@
+import asyncio
+import gc
+import random
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+import ext.GNCommands as GNCommands
+from src.ChannelLockManager import ChannelLockManager
+
+NUM_OF_CHANNELS = 50
+REQUESTS_PER_KEY = 20
+# /select's request key is its options, so a storm has a few distinct keys per channel
+KEYS = [('select', 1, False), ('select', 2, False), ('select', 1, True)]
+
+
+def test_select_storm_across_channels():
+    '''
+    Every (channel, key) runs exactly once per storm and the rest coalesce onto it. Requests of a channel
+    never overlap, different channels do, and every lock is collected once the storm is over.
+    '''
+    async def scenario():
+        manager = ChannelLockManager()
+        runs = Counter()
+        active = Counter()
+        max_active = Counter()
+        max_total = 0
+        rng = random.Random(7)
+
+        async def select(channel_id, key):
+            nonlocal max_total
+            runs[channel_id, key] += 1
+            active[channel_id] += 1
+            max_active[channel_id] = max(max_active[channel_id], active[channel_id])
+            max_total = max(max_total, sum(active.values()))
+            await asyncio.sleep(rng.uniform(0, 0.005))
+            active[channel_id] -= 1
+            return channel_id, key
+
+        requests = [(channel_id, key) for channel_id in range(NUM_OF_CHANNELS) for key in KEYS] * REQUESTS_PER_KEY
+        rng.shuffle(requests)
+        results = await asyncio.gather(*[
+            manager.run(channel_id, key, lambda channel_id=channel_id, key=key: select(channel_id, key))
+            for channel_id, key in requests
+        ])
+        return manager, runs, max_active, max_total, results
+
+    manager, runs, max_active, max_total, results = asyncio.run(scenario())
+
+    assert set(runs.values()) == {1}
+    assert len(runs) == NUM_OF_CHANNELS * len(KEYS)
+    ran = [result for result, was_coalesced in results if not was_coalesced]
+    assert sorted(ran) == sorted(runs)
+    coalesced = [result for result, was_coalesced in results if was_coalesced]
+    assert len(coalesced) == NUM_OF_CHANNELS * len(KEYS) * (REQUESTS_PER_KEY - 1)
+    assert set(coalesced) == {None}
+
+    assert set(max_active.values()) == {1}
+    assert max_total > 1
+
+    gc.collect()
+    assert len(manager) == 0
+    assert manager._inflight == {}
+
+
+def test_request_runs_again_after_the_first_finishes():
+    async def scenario():
+        manager = ChannelLockManager()
+        runs = []
+
+        async def select():
+            runs.append(1)
+
+        first = await manager.run(1, KEYS[0], select)
+        second = await manager.run(1, KEYS[0], select)
+        return first, second, len(runs)
+
+    assert asyncio.run(scenario()) == ((None, False), (None, False), 2)
+
+
+def test_failed_request_releases_the_channel():
+    async def scenario():
+        manager = ChannelLockManager()
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def select():
+            return "ran"
+
+        with pytest.raises(RuntimeError):
+            await manager.run(1, KEYS[0], fail)
+        return manager, await manager.run(1, KEYS[0], select)
+
+    manager, result = asyncio.run(scenario())
+    assert result == ("ran", False)
+    gc.collect()
+    assert len(manager) == 0
+    assert manager._inflight == {}
+
+
+class FakeContext:
+    def __init__(self, channel_id):
+        self.member = SimpleNamespace(voice=SimpleNamespace(channel=SimpleNamespace(id=channel_id)))
+        self.deferred = False
+        self.responded = False
+        self.replies = []
+
+    async def defer(self, ephemeral=False):
+        self.deferred = True
+
+    async def respond(self, content, ephemeral=False):
+        self.replies.append((content, ephemeral, self.deferred))
+        self.responded = True
+
+
+def test_queued_commands_are_deferred_and_duplicates_answered_privately():
+    '''
+    While one command holds the channel, a different one is deferred right away instead of waiting
+    past the interaction window, and a duplicate gets a private first response
+    '''
+    run_serialized = GNCommands.GNCommands._GNCommands__runSerializedPerChannel
+
+    async def scenario():
+        extension = SimpleNamespace(bot=SimpleNamespace(channel_locks=ChannelLockManager()))
+        release = asyncio.Event()
+        holder, queued, duplicate = FakeContext(1), FakeContext(1), FakeContext(1)
+
+        async def imposter():
+            await release.wait()
+            await holder.respond("imposters sent")
+
+        async def select():
+            await queued.respond("selected")
+
+        holding = asyncio.create_task(run_serialized(extension, holder, ('imposter',), imposter))
+        waiting = asyncio.create_task(run_serialized(extension, queued, ('select', 1), select))
+        await asyncio.sleep(0)
+        await run_serialized(extension, duplicate, ('select', 1), select)
+        deferred_while_waiting = queued.deferred
+
+        release.set()
+        await asyncio.gather(holding, waiting)
+        return holder, queued, duplicate, deferred_while_waiting
+
+    holder, queued, duplicate, deferred_while_waiting = asyncio.run(scenario())
+    assert deferred_while_waiting
+    assert queued.replies == [("selected", False, True)]
+    assert duplicate.deferred is False
+    assert duplicate.replies[0][1] is True
+    assert holder.replies == [("imposters sent", False, True)]
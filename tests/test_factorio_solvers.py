@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from ext.factorio_commands import (
+    F_PER_THRUSTER,
+    THRUSTER_WIDTH,
+    F_thrust_max,
+    F_thrust_required,
+    Quality,
+    mass_max,
+    max_mass_per_quality,
+    min_thrusters_per_quality,
+    v_max,
+    v_max_grid,
+)
+
+NUM_OF_CASES = 2000
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(10)
+
+
+def random_designs(rng):
+    '''
+    Thrusts, masses and widths of platforms that can move, i.e. where `v_max` is defined
+    '''
+    F_thrust_MN = rng.uniform(10, 10_000, NUM_OF_CASES)
+    mass = rng.uniform(100, 200_000, NUM_OF_CASES)
+    width = rng.integers(4, 200, NUM_OF_CASES)
+    v = v_max(F_thrust_MN=F_thrust_MN, mass=mass, width=width)
+    moves = ~np.isnan(v)
+    assert moves.sum() > NUM_OF_CASES // 2
+    return F_thrust_MN[moves], mass[moves], width[moves], v[moves]
+
+
+@pytest.fixture(autouse=True)
+def ignore_invalid_sqrt():
+    with np.errstate(invalid="ignore"):
+        yield
+
+
+def test_F_thrust_required_inverts_v_max(rng):
+    F_thrust_MN, mass, width, v = random_designs(rng)
+    np.testing.assert_allclose(F_thrust_required(v=v, mass=mass, width=width), F_thrust_MN, rtol=1e-9)
+
+
+def test_mass_max_inverts_v_max(rng):
+    F_thrust_MN, mass, width, v = random_designs(rng)
+    np.testing.assert_allclose(mass_max(v=v, F_thrust_MN=F_thrust_MN, width=width), mass, rtol=1e-9)
+
+
+def test_v_max_inverts_both_solvers(rng):
+    v = rng.uniform(0, 500, NUM_OF_CASES)
+    mass = rng.uniform(100, 200_000, NUM_OF_CASES)
+    width = rng.integers(4, 200, NUM_OF_CASES)
+
+    F_thrust_MN = F_thrust_required(v=v, mass=mass, width=width)
+    np.testing.assert_allclose(v_max(F_thrust_MN=F_thrust_MN, mass=mass, width=width), v, rtol=1e-9, atol=1e-9)
+
+    heaviest = mass_max(v=v, F_thrust_MN=F_thrust_MN * 2, width=width)
+    np.testing.assert_allclose(v_max(F_thrust_MN=F_thrust_MN * 2, mass=heaviest, width=width), v, rtol=1e-9, atol=1e-9)
+
+
+def test_min_thrusters_per_quality_is_the_fewest(rng):
+    for v_departure, mass, width in zip(rng.uniform(0, 300, 200), rng.uniform(100, 50_000, 200), rng.integers(4, 200, 200)):
+        counts = min_thrusters_per_quality(v_departure=v_departure, mass=mass, width=width)
+        for quality, count in zip(Quality, counts):
+            assert v_max(F_thrust_max(count, quality), mass, width) - 10 >= v_departure - 1e-9
+            if count > 1:
+                assert not v_max(F_thrust_max(count - 1, quality), mass, width) - 10 >= v_departure
+
+
+def test_max_mass_per_quality_reaches_the_target(rng):
+    for v_departure, num_of_thrusters, width in zip(rng.uniform(0, 300, 200), rng.integers(1, 50, 200), rng.integers(4, 200, 200)):
+        masses = max_mass_per_quality(v_departure=v_departure, num_of_thrusters=num_of_thrusters, width=width)
+        for quality, mass in zip(Quality, masses):
+            if mass > 0:
+                assert v_max(F_thrust_max(num_of_thrusters, quality), mass, width) - 10 == pytest.approx(v_departure)
+
+
+def test_v_max_grid_matches_v_max():
+    thruster_counts = np.arange(1, 8)
+    masses = np.array([500.0, 5_000.0, 50_000.0])
+    qualities = list(Quality)
+    width = 20
+    grid = v_max_grid(thruster_counts=thruster_counts, masses=masses, qualities=qualities, width=width)
+
+    assert grid.shape == (len(qualities), len(thruster_counts), len(masses))
+    for q, quality in enumerate(qualities):
+        for n, count in enumerate(thruster_counts):
+            for m, mass in enumerate(masses):
+                if THRUSTER_WIDTH * count > width:
+                    assert np.isnan(grid[q, n, m])
+                else:
+                    expected = v_max(F_PER_THRUSTER[quality] * count, mass, width)
+                    np.testing.assert_equal(grid[q, n, m], expected)
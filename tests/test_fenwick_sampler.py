@@ -0,0 +1,71 @@
+import itertools
+import random
+
+import pytest
+
+from src.FenwickSampler import FenwickSampler
+
+# Chi-square critical values at p = 0.001, by degrees of freedom
+CHI2_CRITICAL = {9: 27.877, 11: 31.264}
+
+
+def chi_square(observed, expected):
+    return sum((observed[key] - expected[key]) ** 2 / expected[key] for key in expected)
+
+
+def test_total_and_set_weight():
+    sampler = FenwickSampler([1, 2, 3, 4, 5])
+    assert sampler.total() == 15
+    sampler.set_weight(2, 0)
+    sampler.set_weight(4, 10)
+    assert sampler.total() == 17
+    assert [sampler.find(point) for point in (0, 0.99, 1, 2.99, 3, 6.99, 7, 16.99)] == [0, 0, 1, 1, 3, 3, 4, 4]
+
+
+def test_find_never_lands_on_a_drawn_item():
+    sampler = FenwickSampler([1, 1, 1, 0])
+    assert sampler.find(sampler.total()) == 2
+
+
+def test_sample_is_distinct_and_skips_zero_weights():
+    rng = random.Random(0)
+    for _ in range(200):
+        weights = [rng.choice((0, 0.5, 1, 3)) for _ in range(30)]
+        positive = sum(1 for weight in weights if weight > 0)
+        drawn = FenwickSampler(weights).sample(positive, rng)
+        assert len(set(drawn)) == positive
+        assert all(weights[index] > 0 for index in drawn)
+
+
+def test_sample_rejects_more_than_the_positive_weights():
+    with pytest.raises(ValueError):
+        FenwickSampler([1, 0, 2]).sample(3)
+
+
+def test_single_draw_matches_weights():
+    rng = random.Random(1)
+    weights = list(range(1, 11))
+    num_of_draws = 50_000
+    observed = {index: 0 for index in range(len(weights))}
+    for _ in range(num_of_draws):
+        observed[FenwickSampler(weights).sample(1, rng)[0]] += 1
+
+    expected = {index: num_of_draws * weight / sum(weights) for index, weight in enumerate(weights)}
+    assert chi_square(observed, expected) < CHI2_CRITICAL[len(weights) - 1]
+
+
+def test_draws_without_replacement_match_weights():
+    '''
+    The first two draws of a sample, where the second is proportional to the weights left after the first
+    '''
+    rng = random.Random(2)
+    weights = [1, 2, 3, 4]
+    total = sum(weights)
+    num_of_draws = 50_000
+    pairs = list(itertools.permutations(range(len(weights)), 2))
+    observed = {pair: 0 for pair in pairs}
+    for _ in range(num_of_draws):
+        observed[tuple(FenwickSampler(weights).sample(2, rng))] += 1
+
+    expected = {(i, j): num_of_draws * weights[i] / total * weights[j] / (total - weights[i]) for i, j in pairs}
+    assert chi_square(observed, expected) < CHI2_CRITICAL[len(pairs) - 1]
@@ -0,0 +1,136 @@
+'''
+Measures the client cache's memory per 1k guilds under each cache profile, filled from the fake Discord's guilds.
+
+Usage: python -m tools.loadtest.bench_cache_profile [--guilds 1000] [--members-per-guild 50] [--messages-per-guild 50]
+
+Every guild is placed in the cache as its GUILD_CREATE would be, with voice channels of members in them. On top
+of that, `--members-per-guild` members outside voice are cached, as interactions and messages bring them in, and
+`--messages-per-guild` messages if the profile's intents receive messages at all. Every profile runs in its own
+process, so their resident memory doesn't mix. Memory is the growth of RSS (Linux only) and, in a second run, of
+the Python heap traced by tracemalloc, from a baseline taken after the imports.
+'''
+
+import argparse
+import asyncio
+import copy
+import itertools
+import json
+import subprocess
+import sys
+import tracemalloc
+from typing import Any, Dict
+
+import interactions
+from interactions import Intents
+
+from src.CacheProfile import CACHE_PROFILES, client_cache_options, client_intents
+from tools.loadtest.bench_removed_candidates import REPO_ROOT, rss_bytes
+from tools.loadtest.fake_discord import FakeDiscord
+
+FIRST_OTHER_MEMBER_ID = 300_000_000_000_000_000
+FIRST_MESSAGE_ID = 400_000_000_000_000_000
+
+
+def member_data(user_id: int) -> Dict[str, Any]:
+    return {
+        "user": {"id": str(user_id), "username": f"player{user_id % 100_000}", "discriminator": "0",
+                 "global_name": f"Player {user_id % 100_000}", "avatar": "a" * 32, "public_flags": 0},
+        "nick": None, "roles": [], "joined_at": "2024-01-01T00:00:00.000000+00:00", "deaf": False, "mute": False, "flags": 0,
+    }
+
+
+def message_data(message_id: int, channel_id: int, guild_id: int, author_id: int) -> Dict[str, Any]:
+    member = member_data(author_id)
+    return {
+        "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(guild_id), "author": member.pop("user"),
+        "member": member, "content": "Who's in for another round of Among Us after this one? " * 2,
+        "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False, "mention_everyone": False,
+        "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "components": [], "pinned": False,
+        "type": 0, "flags": 0,
+    }
+
+
+async def fill(client: interactions.Client, fake: FakeDiscord, args: argparse.Namespace) -> None:
+    other_member_ids = itertools.count(FIRST_OTHER_MEMBER_ID)
+    message_ids = itertools.count(FIRST_MESSAGE_ID)
+    receives_messages = Intents.GUILD_MESSAGES in client.intents
+    for guild_id, guild in fake.guilds.items():
+        # Copied, since the cache rewrites the payload it's given in place
+        client.cache.place_guild_data(copy.deepcopy(guild))
+        # Lets the voice states the guild placed as tasks land, before more members push on the lean caches
+        await asyncio.sleep(0)
+        member_ids = [next(other_member_ids) for _ in range(args.members_per_guild)]
+        for user_id in member_ids:
+            client.cache.place_member_data(guild_id, member_data(user_id))
+        if receives_messages:
+            for message_num in range(args.messages_per_guild):
+                client.cache.place_message_data(message_data(next(message_ids), fake.text_channels[guild_id], guild_id,
+                                                             member_ids[message_num % len(member_ids)]))
+
+
+def run_profile(args: argparse.Namespace) -> None:
+    # Built before the baseline, its world isn't part of what's measured
+    fake = FakeDiscord(num_of_guilds=args.guilds, num_of_voice_channels=args.guilds * args.voice_channels_per_guild,
+                       members_per_channel=args.members_per_channel)
+    client: interactions.Client = None
+    cache_options = client_cache_options(args.profile, max_size=args.lean_max_size,
+                                         in_voice=lambda user_id: user_id in client.cache.voice_state_cache)
+    client = interactions.Client(intents=client_intents(args.profile), **cache_options)
+    if args.tracemalloc:
+        tracemalloc.start()
+        heap_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes()
+    asyncio.run(fill(client, fake, args))
+    result: Dict[str, Any] = {
+        "members": len(client.cache.member_cache),
+        "users": len(client.cache.user_cache),
+        "messages": len(client.cache.message_cache),
+        "voice_states": len(client.cache.voice_state_cache),
+    }
+    if args.tracemalloc:
+        result["heap_bytes"] = tracemalloc.get_traced_memory()[0] - heap_before
+    else:
+        result["rss_bytes"] = rss_bytes() - rss_before
+    print(json.dumps(result))
+
+
+def measure(profile: str, args: argparse.Namespace, tracemalloc_run: bool) -> Dict[str, Any]:
+    command = [sys.executable, '-m', 'tools.loadtest.bench_cache_profile', '--profile', profile,
+               '--guilds', str(args.guilds), '--voice-channels-per-guild', str(args.voice_channels_per_guild),
+               '--members-per-channel', str(args.members_per_channel), '--members-per-guild', str(args.members_per_guild),
+               '--messages-per-guild', str(args.messages_per_guild), '--lean-max-size', str(args.lean_max_size)]
+    if tracemalloc_run:
+        command.append('--tracemalloc')
+    output = subprocess.run(command, cwd=REPO_ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--guilds', type=int, default=1000)
+    parser.add_argument('--voice-channels-per-guild', type=int, default=2)
+    parser.add_argument('--members-per-channel', type=int, default=8, help='Members in each voice channel')
+    parser.add_argument('--members-per-guild', type=int, default=50, help='Members cached per guild besides the ones in voice')
+    parser.add_argument('--messages-per-guild', type=int, default=50)
+    parser.add_argument('--lean-max-size', type=int, default=1000, help="The bot's lean_cache_max_size")
+    parser.add_argument('--profile', choices=CACHE_PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument('--tracemalloc', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile is not None:
+        run_profile(args)
+        return
+
+    print(f"{args.guilds} guilds, each with {args.voice_channels_per_guild} voice channels of {args.members_per_channel} "
+          f"members, {args.members_per_guild} other members and {args.messages_per_guild} messages\n")
+    print(f"{'profile':<10}{'RSS MiB/1k guilds':>19}{'heap MiB/1k guilds':>20}{'members':>9}{'users':>8}{'messages':>10}")
+    for profile in CACHE_PROFILES:
+        result = measure(profile, args, tracemalloc_run=False)
+        heap = measure(profile, args, tracemalloc_run=True)["heap_bytes"]
+        per_1k_guilds = 1000 / args.guilds / 2**20
+        print(f"{profile:<10}{result['rss_bytes'] * per_1k_guilds:>19.1f}{heap * per_1k_guilds:>20.1f}"
+              f"{result['members']:>9}{result['users']:>8}{result['messages']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+'''
+Micro-benchmarks of CandidateIndex against re-filtering `voice_members` on every command, in large stage channels.
+
+Usage: python -m tools.loadtest.bench_candidate_index [--members 500] [--removed 50]
+
+The channel and its members are real interactions.py objects in a client's cache, so `voice_members`
+costs what it does in the bot. Each figure is the best of several repeats, in microseconds per call.
+'''
+
+import argparse
+import os
+import tempfile
+import timeit
+from typing import Any, Callable, Dict, List, Set
+
+import interactions
+from interactions import GuildStageVoice, Member
+
+from src.CandidateIndex import CandidateIndex
+from src.RemovedCandidatesStore import RemovedCandidatesStore
+
+GUILD_ID = 100_000_000_000_000_000
+CHANNEL_ID = 100_000_000_000_000_001
+FIRST_MEMBER_ID = 200_000_000_000_000_000
+
+
+def stage_channel(client: interactions.Client, num_of_members: int) -> GuildStageVoice:
+    channel = GuildStageVoice.from_dict({
+        "id": str(CHANNEL_ID), "guild_id": str(GUILD_ID), "type": 13, "name": "stage", "position": 0,
+        "bitrate": 64000, "user_limit": 0, "rtc_region": None, "permission_overwrites": [],
+    }, client)
+    for member_id in range(FIRST_MEMBER_ID, FIRST_MEMBER_ID + num_of_members):
+        client.cache.place_member_data(GUILD_ID, {
+            "user": {"id": str(member_id), "username": f"player{member_id % 100_000}", "discriminator": "0",
+                     "global_name": None, "avatar": None},
+            "roles": [], "joined_at": "2024-01-01T00:00:00.000000+00:00", "deaf": False, "mute": False, "flags": 0,
+        })
+        channel._voice_member_ids.append(member_id)
+    return channel
+
+
+def filtered_pool(voice_channel: GuildStageVoice, removed_candidates: Dict[int, Set[int]]) -> List[Member]:
+    '''
+    How GNCommands built the pool before the index, which /imposter did twice per run
+    '''
+    voice_members: List[Member] = voice_channel.voice_members
+    candidate_pool: List[Member] = []
+    if voice_channel.id in removed_candidates:
+        for member in voice_members:
+            if member.id not in removed_candidates[voice_channel.id]:
+                candidate_pool.append(member)
+    else:
+        candidate_pool = voice_members
+    return candidate_pool
+
+
+def best_usecs(callback: Callable[[], Any], number: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(callback, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--members', type=int, default=500, help='Members in the stage channel')
+    parser.add_argument('--removed', type=int, default=50, help='Of which removed from the candidate pool')
+    parser.add_argument('--number', type=int, default=2000, help='Calls per repeat')
+    args = parser.parse_args()
+
+    client = interactions.Client()
+    channel = stage_channel(client, args.members)
+    removed_ids = set(range(FIRST_MEMBER_ID, FIRST_MEMBER_ID + args.removed))
+
+    with tempfile.TemporaryDirectory(prefix='gnbot-bench-') as tmp_dir:
+        store = RemovedCandidatesStore(os.path.join(tmp_dir, 'removed_candidates.sqlite3'))
+        for member_id in removed_ids:
+            store.add(CHANNEL_ID, member_id)
+        index = CandidateIndex(store)
+        assert {member.id for member in index.snapshot(channel)} == \
+            {member.id for member in filtered_pool(channel, {CHANNEL_ID: removed_ids})}
+
+        joiner = client.cache.get_member(GUILD_ID, FIRST_MEMBER_ID + args.members - 1)
+
+        def join_and_leave():
+            index.member_removed(CHANNEL_ID, joiner.id)
+            index.snapshot(channel)
+            index.member_joined(CHANNEL_ID, joiner)
+            index.snapshot(channel)
+
+        def reseed():
+            index.drop_channel(CHANNEL_ID)
+            index.snapshot(channel)
+
+        results = [
+            ("filter voice_members once", best_usecs(lambda: filtered_pool(channel, {CHANNEL_ID: removed_ids}), args.number)),
+            ("old /imposter (filtered twice)", best_usecs(lambda: (filtered_pool(channel, {CHANNEL_ID: removed_ids}),
+                                                                   filtered_pool(channel, {CHANNEL_ID: removed_ids})), args.number)),
+            ("index snapshot, unchanged", best_usecs(lambda: index.snapshot(channel), args.number * 10)),
+            ("index snapshot after a join/leave", best_usecs(join_and_leave, args.number) / 2),
+            ("index seeding a channel", best_usecs(reseed, args.number)),
+        ]
+        store.close()
+
+    print(f"Stage channel with {args.members} members, {args.removed} of them removed from the candidate pool\n")
+    print(f"{'':<36}{'us/call':>10}")
+    for name, usecs in results:
+        print(f"{name:<36}{usecs:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
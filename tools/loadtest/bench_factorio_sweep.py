@@ -0,0 +1,70 @@
+'''
+Compares v_max_grid with calling v_max once per design, the way a sweep was computed before it, at several grid sizes.
+
+Usage: python -m tools.loadtest.bench_factorio_sweep [--cells 10000 1000000] [--width 400]
+
+Every grid tries all qualities and 1 to 100 thrusters, and as many masses as make up `--cells` cells. Both ways are
+checked to give the same speeds, then timed as the best of a few runs.
+'''
+
+import argparse
+import timeit
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from ext.factorio_commands import MAX_SWEEP_MASS, THRUSTER_WIDTH, F_thrust_max, Quality, v_max, v_max_grid
+
+MAX_THRUSTERS = 100
+
+
+def v_max_one_at_a_time(thruster_counts: np.ndarray, masses: np.ndarray, qualities: List[Quality], width: int) -> np.ndarray:
+    '''
+    The scalar loop v_max_grid replaced, one v_max call per (quality, num_of_thrusters, mass)
+    '''
+    grid = np.empty((len(qualities), len(thruster_counts), len(masses)))
+    with np.errstate(invalid="ignore"):
+        for i, quality in enumerate(qualities):
+            for j, num_of_thrusters in enumerate(thruster_counts.tolist()):
+                if THRUSTER_WIDTH * num_of_thrusters > width:
+                    grid[i, j, :] = np.nan
+                    continue
+                F_thrust_MN = F_thrust_max(num_of_thrusters, quality)
+                for k, mass in enumerate(masses.tolist()):
+                    grid[i, j, k] = v_max(F_thrust_MN=F_thrust_MN, mass=mass, width=width)
+    return grid
+
+
+def best_secs(callback: Callable[[], np.ndarray], repeat: int) -> float:
+    return min(timeit.repeat(callback, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cells', type=int, nargs='+', default=[10_000, 1_000_000], help='Grid sizes to time')
+    parser.add_argument('--width', type=int, default=THRUSTER_WIDTH * MAX_THRUSTERS,
+                        help='Platform width in tiles, the default fits every thruster count')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    qualities = list(Quality)
+    thruster_counts = np.arange(1, MAX_THRUSTERS + 1)
+    results: Dict[int, Dict[str, float]] = {}
+    for cells in args.cells:
+        masses = np.linspace(1000, MAX_SWEEP_MASS, max(cells // (len(qualities) * MAX_THRUSTERS), 1))
+        grid = v_max_grid(thruster_counts, masses, qualities, args.width)
+        assert np.allclose(grid, v_max_one_at_a_time(thruster_counts, masses, qualities, args.width), equal_nan=True)
+        results[grid.size] = {
+            "one_at_a_time": best_secs(lambda: v_max_one_at_a_time(thruster_counts, masses, qualities, args.width), args.repeat),
+            "grid": best_secs(lambda: v_max_grid(thruster_counts, masses, qualities, args.width), args.repeat),
+        }
+
+    print(f"{len(qualities)} qualities x {MAX_THRUSTERS} thruster counts x masses, width {args.width}\n")
+    print(f"{'cells':>10}{'one at a time ms':>18}{'v_max_grid ms':>15}{'speedup':>10}")
+    for cells, result in results.items():
+        print(f"{cells:>10}{result['one_at_a_time'] * 1000:>18.1f}{result['grid'] * 1000:>15.2f}"
+              f"{result['one_at_a_time'] / result['grid']:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
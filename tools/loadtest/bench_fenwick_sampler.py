@@ -0,0 +1,61 @@
+'''
+Compares FenwickSampler with rebuilding the cumulative weights for every draw, for weighted picks without replacement.
+
+Usage: python -m tools.loadtest.bench_fenwick_sampler [--pools 100 1000 5000] [--k 1000]
+
+Each pool gets random weights, like SelectionHistory's fairness weights, and `--k` members are drawn from it
+(all of them if the pool is smaller). Each figure is the best of several repeats.
+'''
+
+import argparse
+import random
+import timeit
+from typing import Callable, Dict, List
+
+from src.FenwickSampler import FenwickSampler
+
+
+def naive_sample(weights: List[float], k: int, rng: random.Random) -> List[int]:
+    '''
+    Rebuilds the cumulative weights for every draw, i.e. O(k n)
+    '''
+    weights = list(weights)
+    drawn = []
+    for _ in range(k):
+        index = rng.choices(range(len(weights)), weights=weights)[0]
+        weights[index] = 0.0
+        drawn.append(index)
+    return drawn
+
+
+def best_secs(callback: Callable[[], List[int]], repeat: int) -> float:
+    return min(timeit.repeat(callback, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pools', type=int, nargs='+', default=[100, 1000, 5000], help='Members weighted per run')
+    parser.add_argument('--k', type=int, default=1000, help='Members drawn per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results: Dict[int, Dict[str, float]] = {}
+    for pool_size in args.pools:
+        weights = [rng.uniform(0.1, 1) for _ in range(pool_size)]
+        k = min(args.k, pool_size)
+        results[pool_size] = {
+            "k": k,
+            "fenwick": best_secs(lambda: FenwickSampler(weights).sample(k, rng), args.repeat),
+            "naive": best_secs(lambda: naive_sample(weights, k, rng), args.repeat),
+        }
+
+    print(f"{'members':>8}{'drawn':>7}{'Fenwick ms':>12}{'rebuilding ms':>15}{'speedup':>9}")
+    for pool_size, result in results.items():
+        print(f"{pool_size:>8}{result['k']:>7}{result['fenwick'] * 1000:>12.2f}{result['naive'] * 1000:>15.2f}"
+              f"{result['naive'] / result['fenwick']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+'''
+Measures the event-loop lag of a coroutine logging in bursts, with logging off, with print() and with StructuredLogWriter.
+
+Usage: python -m tools.loadtest.bench_logging [--records 20000] [--burst 50] [--sink-delay-ms 1]
+
+stdout is swapped for a sink that takes `--sink-delay-ms` per write, like a pipe nobody is reading fast enough.
+print() pays that on the event loop, while StructuredLogWriter pays it on its writer thread.
+'''
+
+import argparse
+import asyncio
+import io
+import logging
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from src.StructuredLogger import LOGGER_NAME, StructuredLogWriter, get_logger
+from tools.loadtest.loop_lag import LoopLagProbe
+
+
+class SlowSink(io.TextIOBase):
+    '''
+    Discards everything written to it, blocking for `delay_secs` on every write
+    '''
+
+    def __init__(self, delay_secs: float) -> None:
+        self.delay_secs: float = delay_secs
+        self.writes: int = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        self.writes += 1
+        time.sleep(self.delay_secs)
+        return len(text)
+
+
+async def log_in_bursts(log: Callable[[int], None], records: int, burst: int, pause_secs: float = 0.005) -> None:
+    for start in range(0, records, burst):
+        for i in range(start, min(start + burst, records)):
+            log(i)
+        await asyncio.sleep(pause_secs)
+
+
+async def measure(log: Callable[[int], None], args: argparse.Namespace) -> Tuple[Dict[str, float], float]:
+    probe = LoopLagProbe(interval_secs=0.002)
+    probe.start()
+    start = time.perf_counter()
+    await log_in_bursts(log, args.records, args.burst)
+    elapsed_secs = time.perf_counter() - start
+    await probe.stop()
+    return probe.summary(), elapsed_secs
+
+
+async def run(args: argparse.Namespace, tmp_dir: str) -> List[Tuple[str, Dict[str, float], float, int]]:
+    logger = get_logger('bench')
+    root_logger = logging.getLogger(LOGGER_NAME)
+    results = []
+
+    def log_record(i: int) -> None:
+        logger.info("Members selected", extra={"channel_id": 100_000_000_000_000_000 + i % 200, "selected": 2})
+
+    def print_record(i: int) -> None:
+        print(f"Members selected in channel {100_000_000_000_000_000 + i % 200}: 2")
+
+    root_logger.setLevel(logging.WARNING)
+    lag, secs = await measure(log_record, args)
+    results.append(("logging off", lag, secs, 0))
+
+    lag, secs = await measure(print_record, args)
+    results.append(("print() to stdout", lag, secs, 0))
+
+    for name, to_stdout in (("structured, file + stdout", True), ("structured, file only", False)):
+        writer = StructuredLogWriter(os.path.join(tmp_dir, f'bench{int(to_stdout)}.log.jsonl'), to_stdout=to_stdout)
+        writer.start()
+        lag, secs = await measure(log_record, args)
+        # Blocks until the queue is written out, which is fine now the loop's lag is measured
+        writer.stop()
+        results.append((name, lag, secs, writer.handler.dropped))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=20_000, help='Records logged per variant')
+    parser.add_argument('--burst', type=int, default=50, help='Records logged back to back, with a 5 ms pause after each burst')
+    parser.add_argument('--sink-delay-ms', type=float, default=1, help='How long every write to stdout blocks')
+    args = parser.parse_args()
+
+    stdout = sys.stdout
+    sys.stdout = SlowSink(args.sink_delay_ms / 1000)
+    try:
+        with tempfile.TemporaryDirectory(prefix='gnbot-bench-') as tmp_dir:
+            results = asyncio.run(run(args, tmp_dir))
+    finally:
+        sys.stdout = stdout
+
+    print(f"{args.records} records in bursts of {args.burst}, stdout blocking {args.sink_delay_ms:g} ms per write\n")
+    print(f"{'':<28}{'lag p50 ms':>11}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'run s':>8}{'dropped':>9}")
+    for name, lag, secs, dropped in results:
+        print(f"{name:<28}{lag['p50'] * 1000:>11.2f}{lag['p95'] * 1000:>9.2f}{lag['p99'] * 1000:>9.2f}"
+              f"{lag['max'] * 1000:>9.2f}{secs:>8.2f}{dropped:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+'''
+Compares the wall-clock time of a mass DM sent one member at a time, as GNCommands used to, with DMDispatcher.send_all.
+
+Usage: python -m tools.loadtest.bench_mass_dm [--pools 10 50 200] [--latency-ms 50] [--concurrency 5]
+
+Every run gets a fresh FakeDiscord and client, so no DM channel is cached from an earlier run.
+'''
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+from interactions import DMChannel, Member, Message
+from interactions.client.errors import HTTPException
+
+from src.DMChannelCache import DMChannelCache
+from src.DMDispatcher import DMDispatcher
+from src.Metrics import Metrics
+from src.OutboundQueue import OutboundQueue
+from tools.loadtest.fake_discord import FakeDiscord
+from tools.loadtest.offline_client import connect, voice_members
+
+
+async def send_one_at_a_time(msgDict: Dict) -> List[Message]:
+    '''
+    The loop GNCommands.__sendMassDM ran before DMDispatcher
+    '''
+    failed_to_send_DM: List[int] = []
+    successful_DMs: List[Message] = []
+    for memKey in msgDict:
+        member: Member = msgDict[memKey]["member_obj"]
+        dm_channel: DMChannel = await member.user.fetch_dm()
+        try:
+            successful_DMs.append(await dm_channel.send(msgDict[memKey]["message_to_send"]))
+        except HTTPException as err:
+            if 'Cannot send messages to this user' == err.text:
+                failed_to_send_DM.append(memKey)
+            else:
+                raise err
+    return successful_DMs
+
+
+async def time_mass_dm(pool_size: int, use_dispatcher: bool, args: argparse.Namespace, tmp_dir: str) -> float:
+    fake = FakeDiscord(num_of_guilds=1, num_of_voice_channels=1, members_per_channel=pool_size,
+                       latency_secs=args.latency_ms / 1000)
+    await fake.start()
+    client = await connect(fake)
+    queue = OutboundQueue(os.path.join(tmp_dir, f'outbound_{pool_size}_{int(use_dispatcher)}.sqlite3'))
+    dispatcher = DMDispatcher(dm_channel_cache=DMChannelCache(),
+                              metrics=Metrics(),
+                              queue=queue,
+                              delete_message=lambda channel_id, message_id: client.http.delete_message(channel_id, message_id),
+                              max_concurrency=args.concurrency)
+    try:
+        msgDict = {member.id: {"member_obj": member, "message_to_send": "You are NOT the Imposter!"}
+                   for member in voice_members(client, fake, fake.voice_channels[0])}
+        start = time.perf_counter()
+        if use_dispatcher:
+            sent = (await dispatcher.send_all(msgDict)).sent
+        else:
+            sent = await send_one_at_a_time(msgDict)
+        wall_secs = time.perf_counter() - start
+        assert len(sent) == pool_size
+    finally:
+        await dispatcher.stop()
+        queue._db.close()
+        await client.http.close()
+        await fake.stop()
+    return wall_secs
+
+
+async def run(args: argparse.Namespace) -> Dict[int, Dict[str, float]]:
+    results: Dict[int, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix='gnbot-bench-') as tmp_dir:
+        for pool_size in args.pools:
+            results[pool_size] = {
+                "one_at_a_time": await time_mass_dm(pool_size, False, args, tmp_dir),
+                "dispatcher": await time_mass_dm(pool_size, True, args, tmp_dir),
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pools', type=int, nargs='+', default=[10, 50, 200], help='Members DMed per run')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Latency of every REST route')
+    parser.add_argument('--concurrency', type=int, default=5, help="The dispatcher's max_concurrency")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{args.latency_ms:g} ms per request, dispatcher concurrency {args.concurrency}\n")
+    print(f"{'members':>8}{'one at a time s':>17}{'dispatcher s':>14}{'speedup':>9}")
+    for pool_size, result in results.items():
+        print(f"{pool_size:>8}{result['one_at_a_time']:>17.2f}{result['dispatcher']:>14.2f}"
+              f"{result['one_at_a_time'] / result['dispatcher']:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
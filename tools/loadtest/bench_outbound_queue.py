@@ -0,0 +1,138 @@
+'''
+Measures DM delivery through DMDispatcher and its outbound queue while FakeDiscord injects 429s and 5xx errors.
+
+Usage: python -m tools.loadtest.bench_outbound_queue [--games 20] [--members 8] [--latency-ms 50]
+
+Every failure mix starts from a fresh FakeDiscord, client and queue file. All games are sent at once, each as one
+`send_all` batch, the way concurrent /imposter commands would. The report shows how fast the DMs settled, how many
+requests and dispatcher retries that took, and how every DM settled.
+'''
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Tuple
+
+from src.DMChannelCache import DMChannelCache
+from src.DMDispatcher import DMDispatcher, DeliveryResult
+from src.Metrics import Metrics
+from src.OutboundQueue import OutboundQueue
+from src.StructuredLogger import LOGGER_NAME
+from tools.loadtest.fake_discord import FakeDiscord
+from tools.loadtest.offline_client import connect, voice_members
+
+# (429 rate, 5xx rate) of each run
+FAILURE_MIXES: List[Tuple[float, float]] = [
+    (0.0, 0.0),
+    (0.02, 0.0),
+    (0.1, 0.0),
+    (0.0, 0.02),
+    (0.0, 0.1),
+    (0.05, 0.05),
+]
+
+
+class RecordCounter(logging.Handler):
+    '''
+    Counts the dispatcher's log records by message, e.g. how often it retried a job
+    '''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.counts: Dict[str, int] = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.counts[record.msg] = self.counts.get(record.msg, 0) + 1
+
+
+async def run_mix(rate_limit_rate: float, server_error_rate: float, args: argparse.Namespace, tmp_dir: str) -> Dict[str, Any]:
+    fake = FakeDiscord(num_of_guilds=1, num_of_voice_channels=args.games, members_per_channel=args.members,
+                       latency_secs=args.latency_ms / 1000, rate_limit_rate=rate_limit_rate,
+                       server_error_rate=server_error_rate, seed=args.seed)
+    await fake.start()
+    client = await connect(fake)
+    counter = RecordCounter()
+    logging.getLogger(LOGGER_NAME).addHandler(counter)
+    queue = OutboundQueue(os.path.join(tmp_dir, f'outbound_{rate_limit_rate}_{server_error_rate}.sqlite3'))
+    dispatcher = DMDispatcher(dm_channel_cache=DMChannelCache(),
+                              metrics=Metrics(),
+                              queue=queue,
+                              delete_message=lambda channel_id, message_id: client.http.delete_message(channel_id, message_id),
+                              max_concurrency=args.concurrency,
+                              max_retries=args.max_retries,
+                              retry_base_secs=args.retry_base_secs,
+                              retry_max_secs=args.retry_max_secs)
+    try:
+        msgDicts = []
+        for channel in fake.voice_channels:
+            msgDicts.append({member.id: {"member_obj": member, "message_to_send": "You are NOT the Imposter!"}
+                             for member in voice_members(client, fake, channel)})
+        fake.route_calls.clear()
+        start = time.perf_counter()
+        results: List[DeliveryResult] = await asyncio.gather(*[dispatcher.send_all(msgDict) for msgDict in msgDicts])
+        wall_secs = time.perf_counter() - start
+    finally:
+        await dispatcher.stop()
+        logging.getLogger(LOGGER_NAME).removeHandler(counter)
+        queue._db.close()
+        await client.http.close()
+        await fake.stop()
+
+    num_of_dms = sum(len(msgDict) for msgDict in msgDicts)
+    sent = sum(len(result.sent) for result in results)
+    return {
+        "rate_limit_rate": rate_limit_rate,
+        "server_error_rate": server_error_rate,
+        "dms": num_of_dms,
+        "wall_secs": wall_secs,
+        "sent_per_sec": sent / wall_secs,
+        "requests": sum(fake.route_calls.values()),
+        "injected_429s": sum(fake.rate_limited.values()),
+        "injected_5xx": sum(fake.server_errors.values()),
+        "retries": counter.counts.get("Retrying a DM job", 0),
+        "sent": sent,
+        "dms_closed": sum(len(result.dms_closed) for result in results),
+        "failed": sum(len(result.failed) for result in results),
+        "unexpected_errors": counter.counts.get("Unexpected error delivering a DM job", 0),
+    }
+
+
+async def run(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    # Only counted, nothing is printed
+    logger.propagate = False
+    with tempfile.TemporaryDirectory(prefix='gnbot-bench-') as tmp_dir:
+        return [await run_mix(rate_limit_rate, server_error_rate, args, tmp_dir)
+                for rate_limit_rate, server_error_rate in FAILURE_MIXES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--games', type=int, default=20, help='Games sent at once, each to its own voice channel')
+    parser.add_argument('--members', type=int, default=8, help='Members DMed per game')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Latency of every REST route')
+    parser.add_argument('--concurrency', type=int, default=5, help="The dispatcher's max_concurrency")
+    parser.add_argument('--max-retries', type=int, default=5)
+    parser.add_argument('--retry-base-secs', type=float, default=1)
+    parser.add_argument('--retry-max-secs', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"{args.games} games of {args.members} DMs at once, {args.latency_ms:g} ms latency, "
+          f"concurrency {args.concurrency}\n")
+    print(f"{'429s':>6}{'5xx':>6}{'wall s':>9}{'sent/s':>8}{'requests':>10}{'429s in':>9}{'5xx in':>8}"
+          f"{'retries':>9}{'sent':>6}{'closed':>8}{'failed':>8}{'unexpected':>12}")
+    for result in results:
+        print(f"{result['rate_limit_rate']:>6.0%}{result['server_error_rate']:>6.0%}{result['wall_secs']:>9.2f}"
+              f"{result['sent_per_sec']:>8.1f}{result['requests']:>10}{result['injected_429s']:>9}{result['injected_5xx']:>8}"
+              f"{result['retries']:>9}{result['sent']:>6}{result['dms_closed']:>8}{result['failed']:>8}"
+              f"{result['unexpected_errors']:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+'''
+Measures the memory and startup time of the removed candidates, the old dict of Members against RemovedCandidatesStore.
+
+Usage: python -m tools.loadtest.bench_removed_candidates [--channels 10000] [--removed-per-channel 5]
+
+Every variant runs in its own process, so their resident memory doesn't mix. Memory is measured as the growth of RSS
+(Linux only) and, in a second run, of the Python heap traced by tracemalloc, from a baseline taken after the imports.
+'''
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+import interactions
+
+from src.RemovedCandidatesStore import RemovedCandidatesStore
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_CHANNEL_ID = 100_000_000_000_000_000
+FIRST_MEMBER_ID = 200_000_000_000_000_000
+
+
+def rss_bytes() -> int:
+    with open('/proc/self/statm', mode='r') as fp:
+        return int(fp.read().split()[1]) * resource.getpagesize()
+
+
+def member_data(member_id: int) -> Dict[str, Any]:
+    return {
+        "user": {"id": str(member_id), "username": f"player{member_id % 100_000}", "discriminator": "0",
+                 "global_name": f"Player {member_id % 100_000}", "avatar": "a" * 32, "public_flags": 0},
+        "nick": None,
+        "roles": [str(FIRST_MEMBER_ID - 1), str(FIRST_MEMBER_ID - 2)],
+        "joined_at": "2024-01-01T00:00:00.000000+00:00",
+        "deaf": False,
+        "mute": False,
+        "flags": 0,
+    }
+
+
+def removed_ids(args: argparse.Namespace):
+    for channel in range(args.channels):
+        for member in range(args.removed_per_channel):
+            yield FIRST_CHANNEL_ID + channel, FIRST_MEMBER_ID + channel * args.removed_per_channel + member
+
+
+def build_dict_of_members(args: argparse.Namespace) -> Dict[str, Any]:
+    '''
+    What GNClient kept before: {channel_id: {member_id: Member}}, lost on every restart
+    '''
+    client = interactions.Client()
+    start = time.perf_counter()
+    removed_candidates: Dict[int, Dict[int, interactions.Member]] = {}
+    for channel_id, member_id in removed_ids(args):
+        guild_id = FIRST_CHANNEL_ID - 1 - channel_id % 4
+        member = client.cache.place_member_data(guild_id, member_data(member_id))
+        removed_candidates.setdefault(channel_id, {})[member_id] = member
+    build_secs = time.perf_counter() - start
+    # Removed members have usually left the channel, so the dict is all that keeps their Member objects alive
+    client.cache.member_cache.clear()
+    client.cache.user_cache.clear()
+    return {"build_secs": build_secs, "kept": removed_candidates}
+
+
+def open_store(args: argparse.Namespace) -> Dict[str, Any]:
+    '''
+    A restart: opening the store, then the first command in one channel
+    '''
+    start = time.perf_counter()
+    store = RemovedCandidatesStore(args.db)
+    store[FIRST_CHANNEL_ID]
+    return {"startup_secs": time.perf_counter() - start, "kept": store}
+
+
+def load_every_channel(args: argparse.Namespace) -> Dict[str, Any]:
+    '''
+    The worst case: every channel of the file looked up after a restart
+    '''
+    start = time.perf_counter()
+    store = RemovedCandidatesStore(args.db)
+    for channel in range(args.channels):
+        store[FIRST_CHANNEL_ID + channel]
+    return {"startup_secs": time.perf_counter() - start, "kept": store}
+
+
+VARIANTS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {
+    "dict-of-members": build_dict_of_members,
+    "store-startup": open_store,
+    "store-all-channels": load_every_channel,
+}
+
+
+def run_variant(args: argparse.Namespace) -> None:
+    if args.tracemalloc:
+        tracemalloc.start()
+        heap_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes()
+    result = VARIANTS[args.variant](args)
+    if args.tracemalloc:
+        result["heap_bytes"] = tracemalloc.get_traced_memory()[0] - heap_before
+    else:
+        result["rss_bytes"] = rss_bytes() - rss_before
+    # Only dropped once it's measured
+    del result["kept"]
+    print(json.dumps(result))
+
+
+def populate_db(args: argparse.Namespace) -> Dict[str, float]:
+    '''
+    Writes `args.channels` channels of removed candidates to `args.db`, timing the write-through of single adds on the way
+    '''
+    store = RemovedCandidatesStore(args.db)
+    pairs = list(removed_ids(args))
+    num_of_timed_adds = min(1000, len(pairs))
+    start = time.perf_counter()
+    for channel_id, member_id in pairs[:num_of_timed_adds]:
+        store.add(channel_id, member_id)
+    add_secs = (time.perf_counter() - start) / max(num_of_timed_adds, 1)
+    # The rest in one transaction, only the file's contents matter from here on
+    store._db.execute('BEGIN')
+    store._db.executemany('INSERT OR IGNORE INTO removed_candidates (channel_id, member_id) VALUES (?, ?)',
+                          pairs[num_of_timed_adds:])
+    store._db.execute('COMMIT')
+    store.compact()
+    store.close()
+    return {"add_secs": add_secs, "db_bytes": os.path.getsize(args.db)}
+
+
+def measure(variant: str, args: argparse.Namespace, tracemalloc_run: bool) -> Dict[str, Any]:
+    command = [sys.executable, '-m', 'tools.loadtest.bench_removed_candidates', '--variant', variant,
+               '--channels', str(args.channels), '--removed-per-channel', str(args.removed_per_channel), '--db', args.db]
+    if tracemalloc_run:
+        command.append('--tracemalloc')
+    output = subprocess.run(command, cwd=REPO_ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--channels', type=int, default=10_000)
+    parser.add_argument('--removed-per-channel', type=int, default=5)
+    parser.add_argument('--variant', choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--tracemalloc', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant is not None:
+        run_variant(args)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='gnbot-bench-') as tmp_dir:
+        args.db = os.path.join(tmp_dir, 'removed_candidates.sqlite3')
+        populated = populate_db(args)
+        print(f"{args.channels} channels, {args.removed_per_channel} removed candidates each")
+        print(f"SQLite file: {populated['db_bytes'] / 1024:.0f} KiB, one write-through add: {populated['add_secs'] * 1e6:.0f} us\n")
+        print(f"{'variant':<22}{'RSS MiB':>10}{'heap MiB':>10}{'build ms':>10}{'startup ms':>12}")
+        for variant in VARIANTS:
+            result = measure(variant, args, tracemalloc_run=False)
+            heap = measure(variant, args, tracemalloc_run=True)["heap_bytes"]
+            build = f"{result['build_secs'] * 1000:.0f}" if "build_secs" in result else "-"
+            # The dict of Members starts out empty after a restart, everything in it was lost
+            startup = f"{result['startup_secs'] * 1000:.1f}" if "startup_secs" in result else "lost"
+            print(f"{variant:<22}{result['rss_bytes'] / 2**20:>10.1f}{heap / 2**20:>10.1f}{build:>10}{startup:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+'''
+Runs the bot for a load test, with an event-loop lag probe served over HTTP.
+
+Usage: python -m tools.loadtest.bot_process --config <bot config> --probe-port <port> [--shard-id 0 --total-shards 1]
+
+GET /lag on the probe port returns the lag measured so far, and POST /lag/reset starts over.
+'''
+
+import argparse
+
+from aiohttp import web
+
+from src.GNClient import GNClient
+from tools.loadtest.loop_lag import LoopLagProbe
+
+
+class LoadTestClient(GNClient):
+    '''
+    GNClient that also measures its event-loop lag once it's running
+    '''
+
+    def __init__(self, *args, probe_port: int, **kwargs) -> None:
+        # Set before GNClient.__init__, which starts the bot and only returns once it stops
+        self.loop_lag = LoopLagProbe()
+        self._probe_port: int = probe_port
+        super().__init__(*args, **kwargs)
+
+    async def astart(self, token=None) -> None:
+        self.loop_lag.start()
+        await self.__serve_probe()
+        await super().astart(token)
+
+    async def __serve_probe(self) -> None:
+        async def get_lag(_request: web.Request) -> web.Response:
+            return web.json_response(self.loop_lag.summary())
+
+        async def reset_lag(_request: web.Request) -> web.Response:
+            self.loop_lag.reset()
+            return web.Response(status=204)
+
+        app = web.Application()
+        app.router.add_get('/lag', get_lag)
+        app.router.add_post('/lag/reset', reset_lag)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host='127.0.0.1', port=self._probe_port).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--config', required=True, help='The bot config, pointing `api_base_url` at the fake Discord')
+    parser.add_argument('--probe-port', type=int, required=True, help='The port to serve the loop lag on')
+    parser.add_argument('--shard-id', type=int, default=0)
+    parser.add_argument('--total-shards', type=int, default=1)
+    args = parser.parse_args()
+    LoadTestClient(bot_config_path=args.config, token='load.test.token', probe_port=args.probe_port,
+                   shard_id=args.shard_id, total_shards=args.total_shards)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+'''
+A local stand-in for Discord's REST API and gateway, so the bot can be load-tested offline
+'''
+
+import asyncio
+import collections
+import itertools
+import json
+import random
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Set
+
+from aiohttp import WSMsgType, web
+
+API_PREFIX = '/api/v10'
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+RESUME = 6
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+# Channel types
+GUILD_TEXT = 0
+DM = 1
+GUILD_VOICE = 2
+
+# Interaction option types, by the Python type of the value
+OPTION_TYPES = {str: 3, int: 4, bool: 5, float: 10}
+
+# Routes the bot needs to log in, connect and sync its commands. These are never delayed or rate limited.
+STARTUP_ROUTES = frozenset({
+    'GET /users/@me',
+    'GET /oauth2/applications/@me',
+    'GET /gateway',
+    'GET /gateway/bot',
+    'GET /applications/{app_id}/commands',
+    'PUT /applications/{app_id}/commands',
+    'GET /applications/{app_id}/guilds/{guild_id}/commands',
+    'PUT /applications/{app_id}/guilds/{guild_id}/commands',
+})
+
+# Requests to these routes answer an interaction, so they count towards its completion time
+RESPONSE_ROUTES = frozenset({
+    'POST /interactions/{interaction_id}/{token}/callback',
+    'POST /webhooks/{app_id}/{token}',
+    'GET /webhooks/{app_id}/{token}/messages/{message_id}',
+    'PATCH /webhooks/{app_id}/{token}/messages/{message_id}',
+})
+
+
+def shard_of(guild_id: int, total_shards: int) -> int:
+    '''
+    The shard Discord sends the events of `guild_id` to
+    '''
+    return (guild_id >> 22) % total_shards
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    # Without a charset, which the library's decoding requires to recognise the body as JSON
+    return web.Response(body=json.dumps(data).encode('utf-8'), status=status, headers=headers,
+                        content_type='application/json')
+
+
+class FakeVoiceChannel(NamedTuple):
+    guild_id: int
+    channel_id: int
+    member_ids: List[int]
+
+
+class InteractionRecord:
+    '''
+    One slash command sent to the bot, and when the bot answered it
+    '''
+
+    def __init__(self, interaction_id: int, token: str, command: str, channel_id: int, sent_at: float) -> None:
+        self.interaction_id: int = interaction_id
+        self.channel_id: int = channel_id
+        self.token: str = token
+        self.command: str = command
+        self.sent_at: float = sent_at
+        self.acked_at: Optional[float] = None
+        self.last_response_at: Optional[float] = None
+        self.num_of_responses: int = 0
+        self.acked = asyncio.Event()
+
+    @property
+    def ack_secs(self) -> Optional[float]:
+        return None if self.acked_at is None else self.acked_at - self.sent_at
+
+    @property
+    def completion_secs(self) -> Optional[float]:
+        return None if self.last_response_at is None else self.last_response_at - self.sent_at
+
+
+class FakeDiscord:
+    '''
+    Serves the REST routes and the gateway the bot uses, for a made-up set of guilds, voice channels and members.
+
+    Every guild has one text channel, which commands are sent from. The `num_of_voice_channels` voice channels are
+    spread as evenly as possible over the guilds, with `members_per_channel` members each.
+
+    REST requests are delayed by `latency_secs`, or the entry of `route_latency_secs` for their route
+    (e.g. "POST /channels/{channel_id}/messages"). A `rate_limit_rate` share of them are answered with a 429 instead,
+    and a `server_error_rate` share with a 503. With `global_rate_limit`, any request past that many in the last second
+    gets a global 429, like Discord's limit per bot across all of its shards. A `dms_closed_rate` share of the members
+    don't accept DMs.
+
+    Each gateway connection only gets the guilds of the shard it identified as, and commands are sent with `interact`
+    on the connection of their guild's shard, which records when the bot acknowledged and last answered them.
+    '''
+
+    def __init__(self,
+                 num_of_guilds: int = 1,
+                 num_of_voice_channels: int = 10,
+                 members_per_channel: int = 8,
+                 latency_secs: float = 0.0,
+                 route_latency_secs: Optional[Dict[str, float]] = None,
+                 rate_limit_rate: float = 0.0,
+                 rate_limit_retry_secs: float = 0.25,
+                 server_error_rate: float = 0.0,
+                 global_rate_limit: Optional[int] = None,
+                 dms_closed_rate: float = 0.0,
+                 seed: int = 0) -> None:
+        self.latency_secs: float = latency_secs
+        self.route_latency_secs: Dict[str, float] = dict(route_latency_secs or {})
+        self.rate_limit_rate: float = rate_limit_rate
+        self.rate_limit_retry_secs: float = rate_limit_retry_secs
+        self.server_error_rate: float = server_error_rate
+        self.global_rate_limit: Optional[int] = global_rate_limit
+        self._recent_requests: Deque[float] = collections.deque()
+        self._rng = random.Random(seed)
+        self._snowflakes = itertools.count(100_000_000_000_000_000)
+        # Steps over the bits Discord shards on, so consecutive guilds are on consecutive shards
+        self._guild_ids = itertools.count(500_000_000_000_000_000, 1 << 22)
+        self._message_ids = itertools.count(900_000_000_000_000_000)
+
+        self.base_url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._sockets: Set[web.WebSocketResponse] = set()
+        self._shard_sockets: Dict[int, web.WebSocketResponse] = {}
+        self.total_shards: int = 1
+        self._sequence = itertools.count(1)
+
+        self.route_calls: Dict[str, int] = {}
+        self.rate_limited: Dict[str, int] = {}
+        self.server_errors: Dict[str, int] = {}
+        self.globally_rate_limited: int = 0
+        self.unhandled: Dict[str, int] = {}
+        self.dms_sent: int = 0
+        self.dms_refused: int = 0
+        self.commands_synced = asyncio.Event()
+        self.interactions: Dict[str, InteractionRecord] = {}
+        self.last_request_at: float = time.perf_counter()
+
+        self.application_id: int = self._next_id()
+        self.bot_user: Dict[str, Any] = self._user(self.application_id, 'gnbot', bot=True)
+        self._commands: Dict[str, List[Dict[str, Any]]] = {}
+        self.users: Dict[int, Dict[str, Any]] = {self.application_id: self.bot_user}
+        self.guilds: Dict[int, Dict[str, Any]] = {}
+        self.text_channels: Dict[int, int] = {}
+        self.voice_channels: List[FakeVoiceChannel] = []
+        self.dms_closed: Set[int] = set()
+        self._dm_channels: Dict[int, int] = {}
+        self._dm_recipients: Dict[int, int] = {}
+        self._build_world(num_of_guilds, num_of_voice_channels, members_per_channel, dms_closed_rate)
+
+    def _next_id(self) -> int:
+        return next(self._snowflakes)
+
+    # ---- The made-up guilds ----
+
+    @staticmethod
+    def _user(user_id: int, username: str, bot: bool = False) -> Dict[str, Any]:
+        return {'id': str(user_id), 'username': username, 'global_name': username, 'discriminator': '0',
+                'avatar': None, 'bot': bot, 'flags': 0, 'public_flags': 0}
+
+    def _member(self, user_id: int) -> Dict[str, Any]:
+        return {'user': self.users[user_id], 'nick': None, 'roles': [], 'joined_at': '2024-01-01T00:00:00+00:00',
+                'deaf': False, 'mute': False, 'flags': 0, 'pending': False, 'permissions': '0'}
+
+    @staticmethod
+    def _channel(channel_id: int, channel_type: int, guild_id: int, name: str, position: int) -> Dict[str, Any]:
+        channel = {'id': str(channel_id), 'type': channel_type, 'guild_id': str(guild_id), 'name': name,
+                   'position': position, 'permission_overwrites': [], 'nsfw': False, 'parent_id': None}
+        if channel_type == GUILD_VOICE:
+            channel.update({'bitrate': 64000, 'user_limit': 0, 'rtc_region': None})
+        return channel
+
+    def _build_world(self, num_of_guilds: int, num_of_voice_channels: int, members_per_channel: int,
+                     dms_closed_rate: float) -> None:
+        for guild_num in range(num_of_guilds):
+            guild_id = next(self._guild_ids)
+            text_channel_id = self._next_id()
+            self.text_channels[guild_id] = text_channel_id
+            channels = [self._channel(text_channel_id, GUILD_TEXT, guild_id, 'general', 0)]
+            member_ids: List[int] = []
+            voice_states: List[Dict[str, Any]] = []
+            # The first guilds take one more channel each when they don't divide evenly
+            voice_channels_per_guild = num_of_voice_channels // num_of_guilds + (guild_num < num_of_voice_channels % num_of_guilds)
+            for channel_num in range(voice_channels_per_guild):
+                channel_id = self._next_id()
+                channels.append(self._channel(channel_id, GUILD_VOICE, guild_id, f'game-night-{channel_num}', channel_num + 1))
+                in_channel: List[int] = []
+                for _ in range(members_per_channel):
+                    user_id = self._next_id()
+                    self.users[user_id] = self._user(user_id, f'player{user_id % 100_000}')
+                    if self._rng.random() < dms_closed_rate:
+                        self.dms_closed.add(user_id)
+                    in_channel.append(user_id)
+                    voice_states.append({'guild_id': str(guild_id), 'channel_id': str(channel_id), 'user_id': str(user_id),
+                                         'session_id': secrets.token_hex(16), 'deaf': False, 'mute': False,
+                                         'self_deaf': False, 'self_mute': False, 'self_stream': False,
+                                         'self_video': False, 'suppress': False, 'request_to_speak_timestamp': None})
+                member_ids.extend(in_channel)
+                self.voice_channels.append(FakeVoiceChannel(guild_id, channel_id, in_channel))
+
+            self.guilds[guild_id] = {
+                'id': str(guild_id), 'name': f'Game Night {guild_num}', 'icon': None, 'owner_id': str(self.application_id),
+                'afk_timeout': 300, 'verification_level': 0, 'default_message_notifications': 0,
+                'explicit_content_filter': 0, 'features': [], 'mfa_level': 0, 'system_channel_flags': 0,
+                'premium_tier': 0, 'preferred_locale': 'en-US', 'nsfw_level': 0, 'premium_progress_bar_enabled': False,
+                'roles': [{'id': str(guild_id), 'name': '@everyone', 'color': 0, 'hoist': False, 'position': 0,
+                           'permissions': '104324673', 'managed': False, 'mentionable': False, 'flags': 0}],
+                'emojis': [], 'stickers': [], 'threads': [], 'stage_instances': [], 'guild_scheduled_events': [],
+                'large': False, 'unavailable': False, 'member_count': len(member_ids) + 1,
+                'joined_at': '2024-01-01T00:00:00+00:00', 'channels': channels,
+                'members': [self._member(user_id) for user_id in member_ids + [self.application_id]],
+                'voice_states': voice_states, 'presences': [],
+            }
+
+    def _message(self, channel_id: int, payload: Dict[str, Any], message_id: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            'id': str(message_id or next(self._message_ids)), 'channel_id': str(channel_id), 'author': self.bot_user,
+            'content': payload.get('content') or '', 'timestamp': '2024-01-01T00:00:00+00:00', 'edited_timestamp': None,
+            'tts': False, 'mention_everyone': False, 'mentions': [], 'mention_roles': [],
+            'attachments': [], 'embeds': payload.get('embeds') or [], 'components': [], 'pinned': False, 'type': 0,
+            'flags': payload.get('flags') or 0,
+        }
+
+    # ---- Serving ----
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        '''
+        Starts serving on `host`:`port` (any free port if 0)
+
+        Returns:
+            str: The REST base URL, i.e. what the bot's `api_base_url` should be set to
+        '''
+        app = web.Application(client_max_size=32 * 1024 ** 2)
+        app.router.add_get('/gateway-ws', self._gateway)
+        routes = [
+            ('GET', '/users/@me', self._get_me),
+            ('GET', '/oauth2/applications/@me', self._get_application),
+            ('GET', '/gateway', self._get_gateway),
+            ('GET', '/gateway/bot', self._get_gateway),
+            ('GET', '/applications/{app_id}/commands', self._get_commands),
+            ('PUT', '/applications/{app_id}/commands', self._put_commands),
+            ('GET', '/applications/{app_id}/guilds/{guild_id}/commands', self._get_commands),
+            ('PUT', '/applications/{app_id}/guilds/{guild_id}/commands', self._put_commands),
+            ('POST', '/interactions/{interaction_id}/{token}/callback', self._interaction_callback),
+            ('POST', '/webhooks/{app_id}/{token}', self._post_followup),
+            ('GET', '/webhooks/{app_id}/{token}/messages/{message_id}', self._get_response),
+            ('PATCH', '/webhooks/{app_id}/{token}/messages/{message_id}', self._get_response),
+            ('DELETE', '/webhooks/{app_id}/{token}/messages/{message_id}', self._no_content),
+            ('POST', '/users/@me/channels', self._create_dm),
+            ('POST', '/channels/{channel_id}/messages', self._create_message),
+            ('DELETE', '/channels/{channel_id}/messages/{message_id}', self._no_content),
+            ('GET', '/users/{user_id}', self._get_user),
+            ('GET', '/guilds/{guild_id}', self._get_guild),
+            ('GET', '/guilds/{guild_id}/members/{user_id}', self._get_member),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, API_PREFIX + path, self._serve(f'{method} {path}', handler))
+        app.router.add_route('*', API_PREFIX + '/{tail:.*}', self._unhandled)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host=host, port=port)
+        await site.start()
+        bound_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f'http://{host}:{bound_port}'
+        return self.base_url + API_PREFIX
+
+    async def stop(self) -> None:
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _serve(self, route: str, handler: Callable[[web.Request], Awaitable[web.Response]]):
+        '''
+        Wraps a route's handler with its latency, rate limiting and call counting
+        '''
+        async def serve(request: web.Request) -> web.Response:
+            self.last_request_at = time.perf_counter()
+            self.route_calls[route] = self.route_calls.get(route, 0) + 1
+            if route in RESPONSE_ROUTES:
+                self._record_response(request.match_info['token'], route)
+            if route not in STARTUP_ROUTES:
+                if self._over_global_rate_limit():
+                    self.globally_rate_limited += 1
+                    return self._globally_rate_limited()
+                delay = self.route_latency_secs.get(route, self.latency_secs)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.rate_limit_rate > 0 and self._rng.random() < self.rate_limit_rate:
+                    self.rate_limited[route] = self.rate_limited.get(route, 0) + 1
+                    return self._rate_limited(route)
+                # A 503 rather than a 500, which the library would retry by itself before the bot ever saw it
+                if self.server_error_rate > 0 and self._rng.random() < self.server_error_rate:
+                    self.server_errors[route] = self.server_errors.get(route, 0) + 1
+                    return json_response({'message': 'upstream connect error', 'code': 0}, status=503)
+            try:
+                response = await handler(request)
+            except ConnectionResetError:
+                # The bot went away mid-request, e.g. because the run is over
+                return web.Response(status=499)
+            response.headers.update(self._rate_limit_headers(route, remaining=49))
+            return response
+        return serve
+
+    def _rate_limit_headers(self, route: str, remaining: int) -> Dict[str, str]:
+        return {'x-ratelimit-bucket': format(hash(route) & 0xffffffff, 'x'), 'x-ratelimit-limit': '50',
+                'x-ratelimit-remaining': str(remaining), 'x-ratelimit-reset-after': str(self.rate_limit_retry_secs)}
+
+    def _rate_limited(self, route: str) -> web.Response:
+        return json_response({'message': 'You are being rate limited.', 'retry_after': self.rate_limit_retry_secs,
+                                  'global': False},
+                                 status=429, headers=self._rate_limit_headers(route, remaining=0))
+
+    def _over_global_rate_limit(self) -> bool:
+        if self.global_rate_limit is None:
+            return False
+        now = time.perf_counter()
+        while len(self._recent_requests) > 0 and self._recent_requests[0] <= now - 1:
+            self._recent_requests.popleft()
+        if len(self._recent_requests) >= self.global_rate_limit:
+            return True
+        self._recent_requests.append(now)
+        return False
+
+    def _globally_rate_limited(self) -> web.Response:
+        retry_after = max(self._recent_requests[0] + 1 - time.perf_counter(), 0.001)
+        return json_response({'message': 'You are being rate limited.', 'retry_after': retry_after, 'global': True},
+                             status=429, headers={'x-ratelimit-global': 'true', 'retry-after': str(retry_after)})
+
+    async def _unhandled(self, request: web.Request) -> web.Response:
+        route = f'{request.method} {request.path[len(API_PREFIX):]}'
+        self.unhandled[route] = self.unhandled.get(route, 0) + 1
+        return json_response({'message': '404: Not Found', 'code': 0}, status=404)
+
+    @staticmethod
+    async def _payload(request: web.Request) -> Dict[str, Any]:
+        if request.content_type.startswith('multipart/'):
+            form = await request.post()
+            return json.loads(form['payload_json']) if 'payload_json' in form else {}
+        if request.can_read_body:
+            return await request.json()
+        return {}
+
+    # ---- Gateway ----
+
+    async def _gateway(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._sockets.add(ws)
+        try:
+            await ws.send_json({'op': HELLO, 'd': {'heartbeat_interval': 41250}})
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                payload = json.loads(msg.data)
+                if payload['op'] == HEARTBEAT:
+                    await ws.send_json({'op': HEARTBEAT_ACK})
+                elif payload['op'] == IDENTIFY:
+                    shard_id, self.total_shards = payload['d'].get('shard', [0, 1])
+                    self._shard_sockets[shard_id] = ws
+                    guild_ids = [guild_id for guild_id in self.guilds if shard_of(guild_id, self.total_shards) == shard_id]
+                    await self._dispatch(ws, 'READY', {
+                        'v': 10, 'user': self._client_user(), 'session_id': secrets.token_hex(16),
+                        'resume_gateway_url': f"{self.base_url.replace('http', 'ws', 1)}/gateway-ws",
+                        'guilds': [{'id': str(guild_id), 'unavailable': True} for guild_id in guild_ids],
+                        'shard': [shard_id, self.total_shards],
+                        'application': {'id': str(self.application_id), 'flags': 0},
+                    })
+                    for guild_id in guild_ids:
+                        await self._dispatch(ws, 'GUILD_CREATE', self.guilds[guild_id])
+                elif payload['op'] == RESUME:
+                    await self._dispatch(ws, 'RESUMED', {})
+        finally:
+            self._sockets.discard(ws)
+            for shard_id, shard_ws in list(self._shard_sockets.items()):
+                if shard_ws is ws:
+                    del self._shard_sockets[shard_id]
+        return ws
+
+    async def _dispatch(self, ws: web.WebSocketResponse, event: str, data: Dict[str, Any]) -> None:
+        await ws.send_json({'op': DISPATCH, 't': event, 's': next(self._sequence), 'd': data})
+
+    async def interact(self, channel: FakeVoiceChannel, user_id: int, command: str, options: Dict[str, Any]) -> InteractionRecord:
+        '''
+        Sends the slash command `command` with `options` on behalf of `user_id`, from the text channel of `channel`'s guild
+
+        Returns:
+            InteractionRecord: Filled in as the bot answers
+        '''
+        ws = self._shard_sockets.get(shard_of(channel.guild_id, self.total_shards))
+        if ws is None:
+            raise RuntimeError("The shard of this guild isn't connected to the gateway")
+
+        interaction_id = self._next_id()
+        token = secrets.token_urlsafe(24)
+        text_channel_id = self.text_channels[channel.guild_id]
+        payload = {
+            'id': str(interaction_id), 'application_id': str(self.application_id), 'type': 2, 'token': token,
+            'version': 1, 'guild_id': str(channel.guild_id), 'channel_id': str(text_channel_id),
+            'channel': self._channel(text_channel_id, GUILD_TEXT, channel.guild_id, 'general', 0),
+            'member': self._member(user_id), 'app_permissions': '2147483647', 'locale': 'en-US',
+            'guild_locale': 'en-US', 'entitlements': [], 'authorizing_integration_owners': {}, 'context': 0,
+            'data': {
+                'id': str(self._command_id(command)), 'name': command, 'type': 1,
+                'options': [{'name': name, 'type': OPTION_TYPES[type(value)], 'value': value} for name, value in options.items()],
+            },
+        }
+        record = InteractionRecord(interaction_id, token, command, text_channel_id, time.perf_counter())
+        self.interactions[token] = record
+        await self._dispatch(ws, 'INTERACTION_CREATE', payload)
+        return record
+
+    def _command_id(self, name: str) -> int:
+        for commands in self._commands.values():
+            for command in commands:
+                if command['name'] == name:
+                    return int(command['id'])
+        return 0
+
+    def _record_response(self, token: str, route: str) -> None:
+        record = self.interactions.get(token)
+        if record is None:
+            return
+        now = time.perf_counter()
+        if route.endswith('/callback') and record.acked_at is None:
+            record.acked_at = now
+            record.acked.set()
+        record.last_response_at = now
+        record.num_of_responses += 1
+
+    # ---- REST routes ----
+
+    def _client_user(self) -> Dict[str, Any]:
+        return {**self.bot_user, 'verified': True, 'mfa_enabled': False, 'locale': 'en-US', 'premium_type': 0}
+
+    async def _get_me(self, _request: web.Request) -> web.Response:
+        return json_response(self._client_user())
+
+    async def _get_application(self, _request: web.Request) -> web.Response:
+        return json_response({'id': str(self.application_id), 'name': 'gnbot', 'icon': None, 'description': '', 'summary': '',
+                                  'bot_public': True, 'bot_require_code_grant': False, 'verify_key': '0' * 64,
+                                  'flags': 0, 'owner': self.bot_user, 'team': None})
+
+    async def _get_gateway(self, _request: web.Request) -> web.Response:
+        return json_response({'url': f"{self.base_url.replace('http', 'ws', 1)}/gateway-ws", 'shards': 1,
+                                  'session_start_limit': {'total': 1000, 'remaining': 1000, 'reset_after': 0,
+                                                          'max_concurrency': 1}})
+
+    def _scope(self, request: web.Request) -> str:
+        return request.match_info.get('guild_id', 'global')
+
+    async def _get_commands(self, request: web.Request) -> web.Response:
+        return json_response(self._commands.get(self._scope(request), []))
+
+    async def _put_commands(self, request: web.Request) -> web.Response:
+        commands = []
+        for command in await self._payload(request):
+            commands.append({**command, 'id': str(self._next_id()), 'application_id': str(self.application_id),
+                             'version': str(self._next_id())})
+        self._commands[self._scope(request)] = commands
+        self.commands_synced.set()
+        return json_response(commands)
+
+    async def _interaction_callback(self, request: web.Request) -> web.Response:
+        await self._payload(request)
+        return web.Response(status=204)
+
+    async def _post_followup(self, request: web.Request) -> web.Response:
+        record = self.interactions.get(request.match_info['token'])
+        channel_id = record.channel_id if record is not None else 0
+        return json_response(self._message(channel_id, await self._payload(request)))
+
+    async def _get_response(self, request: web.Request) -> web.Response:
+        record = self.interactions.get(request.match_info['token'])
+        if record is None:
+            return json_response({'message': 'Unknown Webhook', 'code': 10015}, status=404)
+        message_id = record.interaction_id if request.match_info['message_id'] == '@original' else None
+        return json_response(self._message(record.channel_id, await self._payload(request), message_id=message_id))
+
+    async def _no_content(self, _request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+    async def _create_dm(self, request: web.Request) -> web.Response:
+        user_id = int((await self._payload(request))['recipient_id'])
+        if user_id not in self._dm_channels:
+            channel_id = self._next_id()
+            self._dm_channels[user_id] = channel_id
+            self._dm_recipients[channel_id] = user_id
+        return json_response({'id': str(self._dm_channels[user_id]), 'type': DM, 'last_message_id': None,
+                                  'recipients': [self.users[user_id]], 'flags': 0})
+
+    async def _create_message(self, request: web.Request) -> web.Response:
+        channel_id = int(request.match_info['channel_id'])
+        payload = await self._payload(request)
+        recipient = self._dm_recipients.get(channel_id)
+        if recipient is not None:
+            if recipient in self.dms_closed:
+                self.dms_refused += 1
+                return json_response({'message': 'Cannot send messages to this user', 'code': 50007}, status=403)
+            self.dms_sent += 1
+        return json_response(self._message(channel_id, payload))
+
+    async def _get_user(self, request: web.Request) -> web.Response:
+        user = self.users.get(int(request.match_info['user_id']))
+        if user is None:
+            return json_response({'message': 'Unknown User', 'code': 10013}, status=404)
+        return json_response(user)
+
+    async def _get_guild(self, request: web.Request) -> web.Response:
+        guild = self.guilds.get(int(request.match_info['guild_id']))
+        if guild is None:
+            return json_response({'message': 'Unknown Guild', 'code': 10004}, status=404)
+        return json_response({key: value for key, value in guild.items()
+                                  if key not in ('members', 'voice_states', 'presences', 'channels', 'threads')})
+
+    async def _get_member(self, request: web.Request) -> web.Response:
+        user_id = int(request.match_info['user_id'])
+        if user_id not in self.users:
+            return json_response({'message': 'Unknown Member', 'code': 10007}, status=404)
+        return json_response(self._member(user_id))
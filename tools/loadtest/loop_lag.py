@@ -0,0 +1,67 @@
+'''
+Measures how late the event loop runs callbacks, i.e. how long something blocked it
+'''
+
+import asyncio
+import time
+from typing import Dict, List, Optional, Sequence
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    '''
+    Returns the nearest-rank `q` percentile (0 to 100) of `samples`, or 0 if there are none
+    '''
+    if len(samples) == 0:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(int(-(-q * len(ordered) // 100)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    '''
+    Returns the count, p50, p95, p99 and max of `samples`
+    '''
+    return {
+        "count": len(samples),
+        "p50": percentile(samples, 50),
+        "p95": percentile(samples, 95),
+        "p99": percentile(samples, 99),
+        "max": max(samples, default=0.0),
+    }
+
+
+class LoopLagProbe:
+    '''
+    Sleeps for `interval_secs` over and over, recording how much later than asked each sleep returned.
+    An idle loop stays within a millisecond or so. Anything more is time some callback held the loop.
+    '''
+
+    def __init__(self, interval_secs: float = 0.01) -> None:
+        self.interval_secs: float = interval_secs
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self) -> None:
+        self.samples = []
+
+    def summary(self) -> Dict[str, float]:
+        return summarize(self.samples)
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval_secs)
+            self.samples.append(max(time.perf_counter() - start - self.interval_secs, 0.0))
@@ -0,0 +1,40 @@
+'''
+An interactions.py client logged in to a FakeDiscord over REST only, for benchmarking parts of the bot in-process
+'''
+
+import copy
+import logging
+from typing import Dict, List
+
+import interactions
+from interactions import Member
+from interactions.api.http.route import Route
+
+from tools.loadtest.fake_discord import FakeDiscord, FakeVoiceChannel
+
+TOKEN = 'load.test.token'
+
+
+async def connect(fake: FakeDiscord) -> interactions.Client:
+    '''
+    Returns a client whose REST calls go to `fake`, which must already be started. No gateway connection is made.
+    Close it with `client.http.close()`.
+
+    The library's own rate-limit and error logging is silenced, since the fake counts what it injected.
+    '''
+    Route.BASE = fake.base_url + '/api/v10'
+    library_logger = logging.getLogger('loadtest.interactions')
+    library_logger.setLevel(logging.CRITICAL)
+    client = interactions.Client(token=TOKEN, logger=library_logger)
+    await client.http.login(TOKEN)
+    return client
+
+
+def voice_members(client: interactions.Client, fake: FakeDiscord, channel: FakeVoiceChannel) -> List[Member]:
+    '''
+    Places the members of `channel` in the client's cache, as GUILD_CREATE would, and returns them
+    '''
+    members_by_id: Dict[int, dict] = {int(member["user"]["id"]): member for member in fake.guilds[channel.guild_id]["members"]}
+    # Copied, since the cache rewrites the payload it's given in place
+    return [client.cache.place_member_data(channel.guild_id, copy.deepcopy(members_by_id[user_id]))
+            for user_id in channel.member_ids]
@@ -0,0 +1,439 @@
+'''
+Replays scripted game-night sessions against the bot on a fake Discord, and reports command latency,
+API calls per command and event-loop lag.
+
+Usage: python -m tools.loadtest.run [--channels 200] [--members 8] [--latency-ms 50] [--json report.json]
+
+Run it from the repository root. Every voice channel runs the session script concurrently, one command
+after another, each sent once the previous one was acknowledged. The bot runs in its own process, so the
+fake Discord doesn't share its event loop.
+
+With `--shards 1 2 4`, the run is repeated with the bot split over that many shard processes, and a table of
+interactions/sec per shard count is printed at the end. Use `--think-secs 0` for that, so the sessions send
+as fast as the bot answers, and `--global-rate-limit 50` to hold every shard to Discord's limit per bot.
+'''
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import aiohttp
+
+from tools.loadtest.fake_discord import FakeDiscord, FakeVoiceChannel, InteractionRecord, shard_of
+from tools.loadtest.loop_lag import summarize
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BOT_CONFIG_TEMPLATE_PATH = os.path.join(REPO_ROOT, 'data', 'bot_config_template.json')
+
+# Discord fails an interaction that isn't acknowledged within this long
+INTERACTION_WINDOW_SECS = 3
+
+DEFAULT_SESSION = [
+    {"command": "view-candidate-pool", "options": {}},
+    {"command": "select", "options": {"n": 2}},
+    {"command": "imposter", "options": {"n": 1}},
+    {"command": "select", "options": {"role-name": "Host", "remove-from-candidate-pool": True}},
+    {"command": "view-candidate-pool", "options": {}},
+]
+
+PROMETHEUS_LINE = re.compile(r'^(\w+)\{handler="((?:[^"\\]|\\.)*)"(?:,le="[^"]*")?\} (\S+)$')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def free_consecutive_ports(count: int) -> int:
+    '''
+    Returns the first of `count` consecutive free ports, since each shard serves its metrics on `metrics_port + shard_id`
+    '''
+    while True:
+        first_port = free_port()
+        try:
+            for port in range(first_port + 1, first_port + count):
+                with socket.socket() as sock:
+                    sock.bind(('127.0.0.1', port))
+            return first_port
+        except OSError:
+            continue
+
+
+def parse_route_latency(values: List[str]) -> Dict[str, float]:
+    '''
+    Parses "METHOD /route/{param}=milliseconds" arguments into seconds per route
+    '''
+    route_latency: Dict[str, float] = {}
+    for value in values:
+        route, _, millis = value.rpartition('=')
+        route_latency[route.strip()] = float(millis) / 1000
+    return route_latency
+
+
+def parse_prometheus(text: str) -> Dict[str, Dict[str, float]]:
+    '''
+    Returns the bot's per-handler counters as {metric: {handler: value}}, skipping histogram buckets
+    '''
+    metrics: Dict[str, Dict[str, float]] = {}
+    for line in text.splitlines():
+        match = PROMETHEUS_LINE.match(line)
+        if match is None or match.group(1).endswith('_bucket'):
+            continue
+        metrics.setdefault(match.group(1), {})[match.group(2)] = float(match.group(3))
+    return metrics
+
+
+def write_bot_config(tmp_dir: str, api_base_url: str, metrics_port: int, args: argparse.Namespace) -> str:
+    with open(BOT_CONFIG_TEMPLATE_PATH, mode='r', encoding='UTF-8') as fp:
+        config = json.load(fp)
+    config.update({
+        "api_base_url": api_base_url,
+        "metrics_port": metrics_port,
+        "allowDmsInstructionsFilePaths": [],
+        "helpFilePath": os.path.join(REPO_ROOT, config["helpFilePath"]),
+        # Long enough that no response is deleted during the run
+        "delete_after_time_secs": 3600,
+        "dm_max_concurrency": args.dm_concurrency,
+        "cache_profile": args.cache_profile,
+        "log_to_stdout": False,
+        "config_reload_interval_secs": 3600,
+    })
+    for key in ("removed_candidates_db_path", "role_presets_db_path", "selection_history_db_path",
+                "outbound_queue_db_path", "startup_report_path", "log_path", "shutdown_snapshot_path"):
+        config[key] = os.path.join(tmp_dir, os.path.basename(config[key]))
+    config_path = os.path.join(tmp_dir, 'bot_config.json')
+    with open(config_path, mode='w', encoding='UTF-8') as fp:
+        json.dump(config, fp, indent=4)
+    return config_path
+
+
+async def wait_for_sync(fake: FakeDiscord, bot: asyncio.subprocess.Process, timeout_secs: float) -> None:
+    '''
+    Waits until shard 0 pushed the commands, which the other shards fetch when they start
+    '''
+    synced = asyncio.ensure_future(fake.commands_synced.wait())
+    exited = asyncio.ensure_future(bot.wait())
+    await asyncio.wait({synced, exited}, timeout=timeout_secs, return_when=asyncio.FIRST_COMPLETED)
+    synced.cancel()
+    exited.cancel()
+
+
+async def wait_until_ready(fake: FakeDiscord, bots: List[asyncio.subprocess.Process],
+                           timeout_secs: float) -> List[InteractionRecord]:
+    '''
+    Waits until every shard answers a command in one of its guilds, since a shard ignores interactions until its startup finishes
+
+    Returns:
+        List[InteractionRecord]: The probe commands the bot acknowledged, which aren't part of the run
+    '''
+    deadline = time.perf_counter() + timeout_secs
+    probes: List[InteractionRecord] = []
+    unready = {shard_of(channel.guild_id, len(bots)): channel for channel in reversed(fake.voice_channels)}
+    while time.perf_counter() < deadline:
+        for shard_id, bot in enumerate(bots):
+            if bot.returncode is not None:
+                raise RuntimeError(f"Shard {shard_id} of the bot exited with code {bot.returncode}")
+        try:
+            shard_probes = {shard_id: await fake.interact(channel, channel.member_ids[0], 'view-candidate-pool', {})
+                            for shard_id, channel in unready.items()}
+        except RuntimeError:
+            # A shard whose gateway connection isn't up yet
+            await asyncio.sleep(0.5)
+            continue
+        probes.extend(shard_probes.values())
+        await asyncio.wait([asyncio.ensure_future(probe.acked.wait()) for probe in shard_probes.values()], timeout=1)
+        for shard_id, probe in shard_probes.items():
+            if probe.acked_at is not None:
+                del unready[shard_id]
+        if len(unready) == 0:
+            return [probe for probe in probes if probe.acked_at is not None]
+    raise TimeoutError("Not every shard of the bot answered a command in time")
+
+
+async def fetch_bot_metrics(session: aiohttp.ClientSession, metrics_port: int, timeout_secs: float = 10) -> Dict:
+    '''
+    Scrapes the bot's metrics endpoint, waiting for it to come up since the bot only starts it once ready
+    '''
+    deadline = time.perf_counter() + timeout_secs
+    while True:
+        try:
+            async with session.get(f'http://127.0.0.1:{metrics_port}/metrics') as response:
+                return parse_prometheus(await response.text())
+        except aiohttp.ClientConnectionError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+async def fetch_shard_metrics(session: aiohttp.ClientSession, metrics_port: int, total_shards: int) -> Dict:
+    '''
+    Scrapes every shard, which serves its metrics on `metrics_port + shard_id`, and sums their counters
+    '''
+    summed: Dict[str, Dict[str, float]] = {}
+    for shard_metrics in await asyncio.gather(*[fetch_bot_metrics(session, metrics_port + shard_id)
+                                                for shard_id in range(total_shards)]):
+        for metric, by_handler in shard_metrics.items():
+            for handler, value in by_handler.items():
+                summed.setdefault(metric, {})[handler] = summed.get(metric, {}).get(handler, 0) + value
+    return summed
+
+
+async def run_session(fake: FakeDiscord, channel: FakeVoiceChannel, script: List[Dict[str, Any]],
+                      rng: random.Random, args: argparse.Namespace) -> List[InteractionRecord]:
+    records: List[InteractionRecord] = []
+    await asyncio.sleep(rng.uniform(0, args.ramp_secs))
+    for step in script:
+        record = await fake.interact(channel, channel.member_ids[0], step["command"], step.get("options", {}))
+        records.append(record)
+        try:
+            await asyncio.wait_for(record.acked.wait(), args.ack_timeout_secs)
+        except asyncio.TimeoutError:
+            pass
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * args.think_secs)
+    return records
+
+
+async def wait_for_finished_commands(session: aiohttp.ClientSession, metrics_port: int, total_shards: int,
+                                     bot_metrics_before: Dict, records: List[InteractionRecord], timeout_secs: float) -> None:
+    '''
+    Waits until the bot finished as many runs of each command as were sent. A command can go quiet for a while
+    (e.g. a DM job backing off before its retry), so the requests stopping isn't enough to tell it's done
+    '''
+    sent: Dict[str, int] = {}
+    for record in records:
+        sent[f'/{record.command}'] = sent.get(f'/{record.command}', 0) + 1
+    deadline = time.perf_counter() + timeout_secs
+    while time.perf_counter() < deadline:
+        runs = (await fetch_shard_metrics(session, metrics_port, total_shards)).get('gnbot_handler_latency_seconds_count', {})
+        runs_before = bot_metrics_before.get('gnbot_handler_latency_seconds_count', {})
+        if all(runs.get(handler, 0) - runs_before.get(handler, 0) >= count for handler, count in sent.items()):
+            return
+        await asyncio.sleep(0.5)
+
+
+async def wait_for_quiet(fake: FakeDiscord, quiet_secs: float, timeout_secs: float) -> None:
+    '''
+    Waits until the bot has made no request for `quiet_secs`, so the work commands left behind (e.g. DM deletes) is done too
+    '''
+    deadline = time.perf_counter() + timeout_secs
+    while time.perf_counter() < deadline:
+        idle = time.perf_counter() - fake.last_request_at
+        if idle >= quiet_secs:
+            return
+        await asyncio.sleep(quiet_secs - idle)
+
+
+def build_report(records: List[InteractionRecord], bot_metrics_before: Dict, bot_metrics_after: Dict,
+                 loop_lags: List[Dict[str, float]], fake: FakeDiscord, wall_secs: float) -> Dict[str, Any]:
+    def counter_delta(metric: str, handler: str) -> float:
+        return bot_metrics_after.get(metric, {}).get(handler, 0) - bot_metrics_before.get(metric, {}).get(handler, 0)
+
+    commands: Dict[str, Any] = {}
+    for command in sorted({record.command for record in records}):
+        of_command = [record for record in records if record.command == command]
+        acks = [record.ack_secs for record in of_command if record.ack_secs is not None]
+        completions = [record.completion_secs for record in of_command if record.completion_secs is not None]
+        runs = counter_delta('gnbot_handler_latency_seconds_count', f'/{command}')
+        commands[command] = {
+            "sent": len(of_command),
+            "finished": runs,
+            "missed_window": sum(1 for record in of_command
+                                 if record.ack_secs is None or record.ack_secs > INTERACTION_WINDOW_SECS),
+            "ack_secs": summarize(acks),
+            "completion_secs": summarize(completions),
+            "bot_errors": counter_delta('gnbot_handler_errors_total', f'/{command}'),
+            "api_calls_per_run": counter_delta('gnbot_handler_http_calls_total', f'/{command}') / runs if runs else None,
+        }
+
+    other_handlers = {handler: counter_delta('gnbot_handler_http_calls_total', handler)
+                      for handler in bot_metrics_after.get('gnbot_handler_http_calls_total', {})
+                      if not handler.startswith('/')}
+    acks = [record.ack_secs for record in records if record.ack_secs is not None]
+    worst_shard = max(range(len(loop_lags)), key=lambda shard_id: loop_lags[shard_id]['p95'])
+    return {
+        "shards": len(loop_lags),
+        "wall_secs": wall_secs,
+        "sent": len(records),
+        "finished": sum(stats["finished"] for stats in commands.values()),
+        "missed_window": sum(stats["missed_window"] for stats in commands.values()),
+        "interactions_per_sec": len(records) / wall_secs,
+        "ack_secs": summarize(acks),
+        "commands": commands,
+        "api_calls_outside_commands": {handler: calls for handler, calls in other_handlers.items() if calls},
+        # Of the shard with the highest p95
+        "loop_lag_secs": {**loop_lags[worst_shard], "shard": worst_shard},
+        "requests_by_route": dict(sorted(fake.route_calls.items())),
+        "rate_limited_by_route": dict(sorted(fake.rate_limited.items())),
+        "globally_rate_limited": fake.globally_rate_limited,
+        "unhandled_routes": fake.unhandled,
+        "dms_sent": fake.dms_sent,
+        "dms_refused": fake.dms_refused,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    def millis(summary: Dict[str, float]) -> str:
+        return f"{summary['p50'] * 1000:7.1f} {summary['p95'] * 1000:7.1f} {summary['p99'] * 1000:7.1f}"
+
+    print(f"\nRan for {report['wall_secs']:.1f} s on {report['shards']} shard(s), "
+          f"{report['interactions_per_sec']:.1f} interactions/s\n")
+    print(f"{'command':<22}{'sent':>6}{'done':>6}{'missed':>8}{'errors':>8}   {'ack p50/p95/p99 ms':<24}"
+          f"{'last reply p50/p95/p99 ms':<27}{'API calls/run':>14}")
+    for command, stats in report["commands"].items():
+        calls = stats["api_calls_per_run"]
+        print(f"/{command:<21}{stats['sent']:>6}{stats['finished']:>6.0f}{stats['missed_window']:>8}{stats['bot_errors']:>8.0f}   "
+              f"{millis(stats['ack_secs']):<24}{millis(stats['completion_secs']):<27}"
+              f"{calls if calls is None else format(calls, '.1f'):>14}")
+
+    lag = report["loop_lag_secs"]
+    of_shard = f" of shard {lag['shard']}, the worst" if report['shards'] > 1 else ''
+    print(f"\nEvent-loop lag{of_shard}: p50 {lag['p50'] * 1000:.1f} ms, p95 {lag['p95'] * 1000:.1f} ms, "
+          f"p99 {lag['p99'] * 1000:.1f} ms, max {lag['max'] * 1000:.1f} ms ({lag['count']} samples)")
+    print(f"DMs: {report['dms_sent']} sent, {report['dms_refused']} refused")
+    if report["api_calls_outside_commands"]:
+        print("API calls outside commands: " + ", ".join(f"{handler} {calls:.0f}"
+                                                          for handler, calls in report["api_calls_outside_commands"].items()))
+    if report["rate_limited_by_route"]:
+        print("429s injected: " + ", ".join(f"{route} {count}" for route, count in report["rate_limited_by_route"].items()))
+    if report["globally_rate_limited"]:
+        print(f"Global 429s injected: {report['globally_rate_limited']}")
+    if report["unhandled_routes"]:
+        print("Routes the fake Discord doesn't serve: " + ", ".join(report["unhandled_routes"]))
+
+
+def print_scaling(reports: List[Dict[str, Any]]) -> None:
+    print(f"\n{'shards':>6}{'sent':>7}{'done':>7}{'missed':>8}{'wall s':>8}{'interactions/s':>16}"
+          f"{'ack p50 ms':>12}{'ack p95 ms':>12}{'global 429s':>13}")
+    for report in reports:
+        print(f"{report['shards']:>6}{report['sent']:>7}{report['finished']:>7.0f}{report['missed_window']:>8}"
+              f"{report['wall_secs']:>8.1f}{report['interactions_per_sec']:>16.1f}"
+              f"{report['ack_secs']['p50'] * 1000:>12.1f}{report['ack_secs']['p95'] * 1000:>12.1f}"
+              f"{report['globally_rate_limited']:>13}")
+
+
+async def load_test(args: argparse.Namespace, total_shards: int = 1) -> Dict[str, Any]:
+    fake = FakeDiscord(num_of_guilds=args.guilds,
+                       num_of_voice_channels=args.channels,
+                       members_per_channel=args.members,
+                       latency_secs=args.latency_ms / 1000,
+                       route_latency_secs=parse_route_latency(args.route_latency),
+                       rate_limit_rate=args.rate_limit_rate,
+                       global_rate_limit=args.global_rate_limit,
+                       dms_closed_rate=args.dms_closed_rate,
+                       seed=args.seed)
+    script = DEFAULT_SESSION
+    if args.script is not None:
+        with open(args.script, mode='r', encoding='UTF-8') as fp:
+            script = json.load(fp)
+
+    tmp_dir = tempfile.mkdtemp(prefix='gnbot-loadtest-')
+    api_base_url = await fake.start()
+    metrics_port = free_consecutive_ports(total_shards)
+    probe_ports = [free_port() for _ in range(total_shards)]
+    config_path = write_bot_config(tmp_dir, api_base_url, metrics_port, args)
+    bots: List[asyncio.subprocess.Process] = []
+    for shard_id, probe_port in enumerate(probe_ports):
+        bot_log_path = os.path.join(tmp_dir, f'bot_output.shard{shard_id}.txt' if total_shards > 1 else 'bot_output.txt')
+        with open(bot_log_path, mode='w', encoding='UTF-8') as bot_log:
+            bots.append(await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'tools.loadtest.bot_process', '--config', config_path, '--probe-port', str(probe_port),
+                '--shard-id', str(shard_id), '--total-shards', str(total_shards),
+                cwd=REPO_ROOT, stdout=bot_log, stderr=asyncio.subprocess.STDOUT,
+            ))
+        # Like main.py, which starts the next shard once the one before had time to identify
+        if shard_id == 0:
+            await wait_for_sync(fake, bots[0], args.startup_timeout_secs)
+    print(f"Bot started on {total_shards} shard(s), its output and data are in {tmp_dir}")
+
+    try:
+        probes = await wait_until_ready(fake, bots, args.startup_timeout_secs)
+        print(f"Bot ready, running {len(script)} commands in each of {len(fake.voice_channels)} voice channels")
+        async with aiohttp.ClientSession() as session:
+            # Otherwise a probe that finishes after the first scrape would be counted as part of the run
+            await wait_for_finished_commands(session, metrics_port, total_shards, {}, probes, args.startup_timeout_secs)
+            bot_metrics_before = await fetch_shard_metrics(session, metrics_port, total_shards)
+            for probe_port in probe_ports:
+                await session.post(f'http://127.0.0.1:{probe_port}/lag/reset')
+
+            rng = random.Random(args.seed)
+            start = time.perf_counter()
+            sessions = await asyncio.gather(*[run_session(fake, channel, script, random.Random(rng.random()), args)
+                                              for channel in fake.voice_channels])
+            drain_deadline = time.perf_counter() + args.drain_timeout_secs
+            await wait_for_finished_commands(session, metrics_port, total_shards, bot_metrics_before,
+                                             [record for records in sessions for record in records],
+                                             args.drain_timeout_secs)
+            await wait_for_quiet(fake, args.quiet_secs, max(drain_deadline - time.perf_counter(), 0))
+            wall_secs = time.perf_counter() - start
+
+            loop_lags: List[Dict[str, float]] = []
+            for probe_port in probe_ports:
+                async with session.get(f'http://127.0.0.1:{probe_port}/lag') as response:
+                    loop_lags.append(await response.json())
+            bot_metrics_after = await fetch_shard_metrics(session, metrics_port, total_shards)
+    finally:
+        for bot in bots:
+            if bot.returncode is None:
+                bot.terminate()
+                try:
+                    await asyncio.wait_for(bot.wait(), 10)
+                except asyncio.TimeoutError:
+                    bot.kill()
+        await fake.stop()
+
+    records = [record for records in sessions for record in records]
+    return build_report(records, bot_metrics_before, bot_metrics_after, loop_lags, fake, wall_secs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--channels', type=int, default=200, help='Voice channels, each running the session script')
+    parser.add_argument('--guilds', type=int, default=4, help='Guilds the voice channels are spread over')
+    parser.add_argument('--members', type=int, default=8, help='Members in each voice channel')
+    parser.add_argument('--script', help='A JSON list of {"command": ..., "options": {...}} to run in every channel')
+    parser.add_argument('--latency-ms', type=float, default=50, help='Latency of every REST route')
+    parser.add_argument('--route-latency', action='append', default=[], metavar='"METHOD /route=MS"',
+                        help='Latency of one route, e.g. "POST /channels/{channel_id}/messages=150". Repeatable')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Share of REST requests answered with a 429')
+    parser.add_argument('--global-rate-limit', type=int, help='REST requests per second, over every shard, before global 429s')
+    parser.add_argument('--dms-closed-rate', type=float, default=0.0, help="Share of members that don't accept DMs")
+    parser.add_argument('--dm-concurrency', type=int, default=5, help="The bot's dm_max_concurrency")
+    parser.add_argument('--cache-profile', default='default', help="The bot's cache_profile")
+    parser.add_argument('--ramp-secs', type=float, default=2, help='Sessions start at random within this long')
+    parser.add_argument('--think-secs', type=float, default=0.5, help='Average pause between the commands of a session')
+    parser.add_argument('--ack-timeout-secs', type=float, default=15, help='How long a session waits for an acknowledgement')
+    parser.add_argument('--quiet-secs', type=float, default=2,
+                        help='Once every command finished, the run is over when the bot makes no request for this long')
+    parser.add_argument('--drain-timeout-secs', type=float, default=300,
+                        help='How long to wait for every command to finish before reporting anyway')
+    parser.add_argument('--startup-timeout-secs', type=float, default=60)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1],
+                        help='Shard counts to run the bot with, one run each, e.g. 1 2 4')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Also writes the report to this file, a list of them with several shard counts')
+    args = parser.parse_args()
+    if max(args.shards) > args.guilds:
+        parser.error('--guilds must be at least the largest shard count, so every shard has a guild')
+
+    reports = []
+    for total_shards in args.shards:
+        reports.append(asyncio.run(load_test(args, total_shards)))
+        print_report(reports[-1])
+    if len(reports) > 1:
+        print_scaling(reports)
+    if args.json is not None:
+        with open(args.json, mode='w', encoding='UTF-8') as fp:
+            json.dump(reports[0] if len(reports) == 1 else reports, fp, indent=4)
+
+
+if __name__ == "__main__":
+    main()